@@ -3,6 +3,46 @@ xmls_path = './xmls'
 xml_schema = f'{xmls_path}/directed_graph_schema.xsd'
 xml_document = f'{xmls_path}/directed_graph.xml'
 png_image = f'{assets_path}/graph_with_cycles.png'
+indexes_path = './indexes'
+# Per graph indexes, {graph} is replaced by the graph id
+ch_index_path = indexes_path + '/contraction_hierarchy-{graph}.pickle'
+
+# Graph of queries without a "graph" field and of DatabaseClient without a graph id, the <graph><id> of xml_document
+default_graph = 'g0'
+# Graphs query_my_graph.py keeps in memory, the least recently queried one is evicted past this
+graph_cache_size = 8
+
+# Parse the XML with iterparse and write it in chunks instead of loading the whole tree
+load_streaming = False
+load_chunk_size = 10000
+
+# Write rows with batched INSERT ... ON CONFLICT (graph_id, id) DO UPDATE instead of SELECT-then-INSERT/UPDATE
+# per row
+load_bulk = False
+load_batch_size = 1000
+
+# Validate and load in one parse (validate_and_load, bulk upserts in load_batch_size batches, one transaction)
+# instead of validating first and loading with the loaders above
+load_single_pass = True
+# Documents given to my_graph.py on the command line are loaded by this many processes at once
+load_processes = 4
+
+# Cycles listed by my_graph.py: at most cycle_max_count cycles of at most cycle_max_length nodes,
+# enumerated per strongly connected component on cycle_processes processes
+cycle_enumerate = True
+cycle_max_length = 10
+cycle_max_count = 100
+cycle_processes = 1
+
+# How my_graph.py draws png_image: "detailed" (every edge an arrow with its cost), "batched" (edges in a few line
+# collections, labels only up to render_max_labels), "condensed" (one node per strongly connected component),
+# "auto" is "detailed" up to render_detailed_max_edges edges and "batched" above.
+# Layouts ("circular" or "spring", the condensation is always "layered") are cached in indexes_path per
+# graph and graph_changelog version.
+render_mode = "auto"
+render_detailed_max_edges = 500
+render_max_labels = 200
+render_layout = "circular"
 
 db_connection = dict(
     dbname="postgres",
@@ -12,4 +52,54 @@ db_connection = dict(
     port="5432"
 )
 
+# Rows fetched per round trip by the streaming reads of DatabaseClient (iter_nodes/iter_edges)
+db_chunk_size = 10000
+
 dsn = f'postgresql://{db_connection["user"]}:{db_connection["password"]}@{db_connection["host"]}:{db_connection["port"]}/{db_connection["dbname"]}'
+
+# Where query_my_graph.py answers "paths" and "cheapest" queries: "memory" loads the graph,
+# "sql" walks it inside PostgreSQL with recursive queries (sql_backend.py) for graphs too big for memory
+query_backend = "memory"
+
+# In-memory graph used by query_my_graph.py: "networkx" (nx.DiGraph) or "csr" (compact CSRGraph arrays)
+graph_engine = "networkx"
+# The "csr" engine maps this snapshot of the graph arrays at startup while the tables haven't changed (None disables it)
+graph_snapshot_path = indexes_path + '/graph-{graph}.snapshot'
+
+# python query_my_graph.py --serve listens on server_socket (a unix socket path) when set, on host:port otherwise
+server_host = "127.0.0.1"
+server_port = 8765
+server_socket = None
+
+# Number of single-source shortest path trees kept for "cheapest" queries (LRU, 0 disables caching)
+path_tree_cache_size = 128
+
+# Algorithm for "cheapest" queries without an "algorithm" field: "dijkstra", "bidirectional", "alt" or "ch"
+cheapest_algorithm = "dijkstra"
+# Landmarks picked when the graph is loaded, "alt" falls back to plain Dijkstra without them
+landmark_count = 0
+# Reachability index built on the first query needing it, answers "reachable" queries and rejects "paths" and
+# "cheapest" queries between unconnected nodes without searching. Its transitive closure is kept while it
+# takes at most reachability_max_bytes, bigger graphs answer with a search pruned by interval labels
+reachability_index = True
+reachability_max_bytes = 64 * 2 ** 20
+
+# Add a "stats" block (wall time, nodes expanded, edges relaxed, paths, peak path length) to every answer
+# and, when query_metrics_path is set, write the aggregated metrics there in the Prometheus text format
+query_stats = False
+query_metrics_path = None
+
+# How query_my_graph.py prints the answers: "indent" (the whole document once every query is answered,
+# indented), "json" (the same document in compact JSON, written while the answers and their paths are found)
+# or "ndjson" (one compact answer per line, written the same way)
+output_format = "indent"
+
+# Plan every batch before answering it: identical queries are answered once, "cheapest" Dijkstra queries from one
+# start share one shortest path tree and "paths" queries from one start one enumeration, answers keep their order.
+# query_plan_debug prints what each plan saves to stderr
+query_planner = True
+query_plan_debug = False
+
+# Processes answering query batches over a shared-memory copy of the graph (1 answers in-process)
+query_processes = 1
+query_batch_size = 16
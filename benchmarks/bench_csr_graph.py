@@ -0,0 +1,84 @@
+"""
+Memory and latency of CSRGraph against nx.DiGraph on a random graph.
+
+    python -m benchmarks.bench_csr_graph --nodes 100000 --edges 500000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import networkx as nx
+
+from csr_graph import CSRGraph
+from query_my_graph import find_cheapest_path
+
+
+def random_edges(nodes, edges, seed):
+    rnd = random.Random(seed)
+    return [(f"n{rnd.randrange(nodes)}", f"n{rnd.randrange(nodes)}", round(rnd.uniform(0, 10), 2))
+            for _ in range(edges)]
+
+
+def build_digraph(nodes, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    for from_node, to_node, cost in edges:
+        graph.add_edge(from_node, to_node, weight=cost)
+    return graph
+
+
+def measure_build(build, nodes, edges):
+    tracemalloc.start()
+    started = time.perf_counter()
+    graph = build(nodes, edges)
+    elapsed = time.perf_counter() - started
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return graph, elapsed, size, peak
+
+
+def reachable_count(graph, start):
+    seen = {start}
+    stack = [start]
+    while stack:
+        for neighbor in graph.successors(stack.pop()):
+            if neighbor not in seen:
+                seen.add(neighbor)
+                stack.append(neighbor)
+    return len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    nodes = [f"n{i}" for i in range(args.nodes)]
+    edges = random_edges(args.nodes, args.edges, args.seed)
+    rnd = random.Random(args.seed)
+    pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(args.queries)]
+
+    print(f"{args.nodes} nodes, {args.edges} edges, {args.queries} cheapest queries")
+    print(f"{'engine':<10} {'build s':>9} {'memory MiB':>11} {'peak MiB':>9} {'traverse s':>11} {'cheapest ms':>12}")
+    for name, build in (("networkx", build_digraph), ("csr", CSRGraph.from_edges)):
+        graph, build_time, size, peak = measure_build(build, nodes, edges)
+
+        started = time.perf_counter()
+        reachable_count(graph, pairs[0][0])
+        traverse_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for start, end in pairs:
+            find_cheapest_path(graph, start, end)
+        cheapest_time = (time.perf_counter() - started) / len(pairs)
+
+        print(f"{name:<10} {build_time:>9.2f} {size / 2 ** 20:>11.1f} {peak / 2 ** 20:>9.1f} "
+              f"{traverse_time:>11.3f} {cheapest_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Startup from a memory-mapped graph snapshot against building CSRGraph from edge rows.
+
+    python -m benchmarks.bench_graph_snapshot --nodes 1000000 --edges 10000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from csr_graph import CSRGraph
+from graph_snapshot import write_snapshot, load_snapshot
+from query_my_graph import find_cheapest_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=100000)
+    parser.add_argument("--edges", type=int, default=500000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    nodes = [f"n{i}" for i in range(args.nodes)]
+    edges = [(rnd.choice(nodes), rnd.choice(nodes), round(rnd.uniform(0, 10), 2)) for _ in range(args.edges)]
+
+    started = time.perf_counter()
+    graph = CSRGraph.from_edges(nodes, edges)
+    build_time = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.snapshot")
+        started = time.perf_counter()
+        write_snapshot(graph, path, source_version=1)
+        write_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        loaded, _ = load_snapshot(path)
+        load_time = time.perf_counter() - started
+
+        start, end = rnd.choice(nodes), rnd.choice(nodes)
+        started = time.perf_counter()
+        path_found = find_cheapest_path(loaded, start, end)
+        query_time = time.perf_counter() - started
+        assert path_found == find_cheapest_path(graph, start, end)
+
+        size = os.path.getsize(path)
+
+    print(f"{args.nodes} nodes, {args.edges} edges, snapshot {size / 2 ** 20:.1f} MiB")
+    print(f"build CSRGraph from rows  {build_time:>8.3f}s")
+    print(f"write snapshot            {write_time:>8.3f}s")
+    print(f"map snapshot              {load_time:>8.3f}s")
+    print(f"first cheapest query      {query_time:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
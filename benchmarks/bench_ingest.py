@@ -0,0 +1,81 @@
+"""
+Ingest of a generated graph document: validate_xml_with_xsd, is_valid_graph and load_into_database
+each parsing the document against the single pass of validate_and_load.
+
+Without --database only the parsing, validation and row building are timed, the rows go nowhere.
+With --database both flows write to the database of app_config.py. The rows of the generated graph
+(<kind>-<nodes>) are deleted before each run, other graphs are left alone.
+
+    python -m benchmarks.bench_ingest --nodes 10000 100000 1000000
+"""
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+from lxml import etree
+
+import my_graph
+from app_config import db_connection, xml_schema
+from benchmarks.bench_suite import delete_graph
+from benchmarks.graph_generators import write_graph
+
+
+def multi_pass_rows(xml_path):
+    # the rows load_into_database builds from its own parse of the document
+    my_graph.load_schema.cache_clear()
+    if not my_graph.validate_xml_with_xsd(xml_path, xml_schema) or not my_graph.is_valid_graph(xml_path)[0]:
+        raise ValueError("invalid document")
+    root = etree.parse(xml_path).getroot()
+    nodes = [my_graph.node_row(e) for e in root.findall("./nodes/node")]
+    edges = [my_graph.edge_row(e) for e in root.findall("./edges/edge")]
+    return len(nodes) + len(edges)
+
+
+def single_pass_rows(xml_path):
+    my_graph.load_schema.cache_clear()
+    schema = my_graph.load_schema(xml_schema, identity_constraints=False)
+    return sum(1 for _ in my_graph.iter_checked_elements(xml_path, schema))
+
+
+def multi_pass_load(xml_path):
+    if not my_graph.validate_xml_with_xsd(xml_path, xml_schema) or not my_graph.is_valid_graph(xml_path)[0]:
+        raise ValueError("invalid document")
+    my_graph.load_into_database(xml_path, db_connection, bulk=True)
+
+
+def single_pass_load(xml_path):
+    if not my_graph.validate_and_load(xml_path, xml_schema, db_connection):
+        raise ValueError("invalid document")
+
+
+def timed(function, xml_path, graph_id, database):
+    if database:
+        delete_graph(graph_id)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        function(xml_path)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--kind", default="scale-free")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", action="store_true")
+    args = parser.parse_args()
+
+    flows = (multi_pass_load, single_pass_load) if args.database else (multi_pass_rows, single_pass_rows)
+    print(f"{'nodes':>8} {'edges':>9} {'multi-pass s':>12} {'single-pass s':>14} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for nodes in args.nodes:
+            xml_path, _, edges = write_graph(directory, args.kind, nodes, args.seed)
+            graph_id = f"{args.kind}-{nodes}"
+            multi_pass, single_pass = (timed(flow, xml_path, graph_id, args.database) for flow in flows)
+            print(f"{nodes:>8} {edges:>9} {multi_pass:>12.2f} {single_pass:>14.2f} {multi_pass / single_pass:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Scaling of ParallelQueryExecutor from 1 to N processes on a batch of cheapest queries
+with distinct start nodes (so the per-process path tree caches don't help).
+
+    python -m benchmarks.bench_parallel_queries --nodes 50000 --edges 250000 --queries 64
+"""
+import argparse
+import os
+import random
+import time
+
+from csr_graph import CSRGraph
+from parallel_queries import ParallelQueryExecutor
+from query_my_graph import process_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    nodes = [f"n{i}" for i in range(args.nodes)]
+    edges = [(rnd.choice(nodes), rnd.choice(nodes), round(rnd.uniform(0, 10), 2)) for _ in range(args.edges)]
+    graph = CSRGraph.from_edges(nodes, edges)
+    starts = rnd.sample(nodes, args.queries)
+    queries = [{"cheapest": {"start": start, "end": rnd.choice(nodes)}} for start in starts]
+
+    started = time.perf_counter()
+    expected = process_queries(queries, graph)
+    baseline = time.perf_counter() - started
+
+    print(f"{args.nodes} nodes, {args.edges} edges, {args.queries} cheapest queries")
+    print(f"{'processes':>9} {'seconds':>8} {'speedup':>8}")
+    print(f"{'in-process':>9} {baseline:>8.2f} {1:>7.1f}x")
+    for processes in args.processes:
+        with ParallelQueryExecutor(graph, processes=processes, batch_size=args.batch_size) as executor:
+            started = time.perf_counter()
+            result = executor.process_queries(queries)
+            elapsed = time.perf_counter() - started
+        assert result == expected
+        print(f"{processes:>9} {elapsed:>8.2f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
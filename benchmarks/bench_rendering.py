@@ -0,0 +1,43 @@
+"""
+Rendering of a generated graph with the cyclic components in red, in the render modes of
+graph_rendering.py. "detailed" draws an arrow per edge and is skipped above --detailed-max-edges.
+
+    python -m benchmarks.bench_rendering --nodes 1000 25000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_suite import build_graph
+from benchmarks.graph_generators import GENERATORS
+from cycle_analysis import cyclic_components
+from graph_rendering import render_graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 25000])
+    parser.add_argument("--kind", choices=sorted(GENERATORS), default="scale-free")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--detailed-max-edges", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'edges':>9} {'mode':<10} {'seconds':>8} {'png KiB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for nodes in args.nodes:
+            graph = build_graph(args.kind, nodes, args.seed)
+            components = cyclic_components(graph)
+            edges = graph.number_of_edges()
+            for mode in ("detailed", "batched", "condensed"):
+                if mode == "detailed" and edges > args.detailed_max_edges:
+                    continue
+                output_file = os.path.join(directory, f"{nodes}-{mode}.png")
+                started = time.perf_counter()
+                render_graph(graph, output_file, components, [], mode=mode)
+                seconds = time.perf_counter() - started
+                print(f"{nodes:>8} {edges:>9} {mode:<10} {seconds:>8.2f} {os.path.getsize(output_file) / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
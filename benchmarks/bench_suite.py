@@ -0,0 +1,224 @@
+"""
+Benchmark suite over generated graphs (see graph_generators.py), results written as JSON
+so runs on different commits can be compared.
+
+For every graph kind and size it times writing the XML and edge list, validate_xml_with_xsd,
+is_valid_graph, and every path search of query_my_graph.py plus find_cheapest_path on --queries
+start/end pairs, an end being --hops random steps away from its start. A search running longer
+than --timeout seconds on a pair is stopped and counted as a timeout.
+
+With --database, load_into_database and create_graph_from_database are timed as well against the
+database of app_config.py. The rows of each generated graph (<kind>-<nodes>) are deleted before it is
+loaded again, other graphs are left alone.
+
+    python -m benchmarks.bench_suite --nodes 1000 10000 100000 --output bench_results.json
+    python -m benchmarks.bench_suite --nodes 1000 10000 --compare bench_results.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import tempfile
+import time
+
+import networkx as nx
+import psycopg2
+
+from app_config import db_connection, dsn, xml_schema
+from benchmarks.graph_generators import GENERATORS, edge_rows, node_ids, write_graph
+from my_graph import validate_xml_with_xsd, is_valid_graph, load_into_database
+from query_my_graph import (
+    create_graph_from_database,
+    find_dfs_paths,
+    find_dfs_paths_iterative,
+    find_bfs_paths,
+    find_all_paths,
+    find_cheapest_path,
+)
+
+SEARCHES = {
+    "find_dfs_paths": find_dfs_paths,
+    "find_dfs_paths_iterative": find_dfs_paths_iterative,
+    "find_bfs_paths": find_bfs_paths,
+    "find_all_paths": find_all_paths,
+    "find_cheapest_path": find_cheapest_path,
+}
+
+
+class Timeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise Timeout()
+
+
+def timed(function, *args):
+    """Seconds taken by function(*args) and its result, its prints are discarded."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        result = function(*args)
+        return time.perf_counter() - started, result
+
+
+def build_graph(kind, nodes, seed):
+    # the same nx.DiGraph create_graph_from_database builds from the tables
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_ids(nodes))
+    for _, from_node, to_node, cost in edge_rows(kind, nodes, seed):
+        graph.add_edge(from_node, to_node, weight=cost)
+    return graph
+
+
+def query_pairs(graph, count, hops, seed):
+    rnd = random.Random(seed)
+    nodes = list(graph)
+    pairs = []
+    for _ in range(count):
+        start = end = rnd.choice(nodes)
+        for _ in range(hops):
+            successors = list(graph.successors(end))
+            if not successors:
+                break
+            end = rnd.choice(successors)
+        pairs.append((start, end))
+    return pairs
+
+
+def time_search(search, graph, pairs, timeout):
+    seconds, paths, timeouts = 0.0, 0, 0
+    for start, end in pairs:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            elapsed, result = timed(search, graph, start, end)
+        except Timeout:
+            seconds += timeout
+            timeouts += 1
+            continue
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        seconds += elapsed
+        if search is find_cheapest_path:
+            paths += result is not None
+        else:
+            paths += len(result)
+    return {"seconds": seconds, "paths": paths, "timeouts": timeouts}
+
+
+def delete_graph(graph_id):
+    """Remove the rows of one generated graph, other graphs stay and the changelog triggers see the deletes."""
+    conn = psycopg2.connect(**db_connection)
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM edges WHERE graph_id = %s", (graph_id,))
+        cur.execute("DELETE FROM nodes WHERE graph_id = %s", (graph_id,))
+    conn.close()
+
+
+def run_graph(kind, nodes, args, directory):
+    timings = {}
+    started = time.perf_counter()
+    xml_path, _, edges = write_graph(directory, kind, nodes, args.seed)
+    timings["write_graph"] = time.perf_counter() - started
+
+    timings["validate_xml_with_xsd"], valid = timed(validate_xml_with_xsd, xml_path, xml_schema)
+    timings["is_valid_graph"], (semantic, _) = timed(is_valid_graph, xml_path)
+
+    if args.database:
+        # the generated document's <graph><id>
+        graph_id = f"{kind}-{nodes}"
+        delete_graph(graph_id)
+        timings["load_into_database"], _ = timed(load_into_database, xml_path, db_connection)
+        timings["create_graph_from_database"], graph = timed(lambda: create_graph_from_database(dsn, graph_id=graph_id))
+    else:
+        graph = build_graph(kind, nodes, args.seed)
+
+    pairs = query_pairs(graph, args.queries, args.hops, args.seed)
+    searches = {name: time_search(search, graph, pairs, args.timeout) for name, search in SEARCHES.items()}
+    os.remove(xml_path)
+
+    return {"graph": kind, "nodes": nodes, "edges": edges, "valid": valid and semantic,
+            "timings": timings, "searches": searches}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results):
+    """{(graph, nodes, measure): seconds} of a results document."""
+    flat = {}
+    for result in results["results"]:
+        key = (result["graph"], result["nodes"])
+        for name, seconds in result["timings"].items():
+            flat[key + (name,)] = seconds
+        for name, search in result["searches"].items():
+            flat[key + (name,)] = search["seconds"]
+    return flat
+
+
+def print_comparison(previous, current):
+    before, after = flatten(previous), flatten(current)
+    print(f"\nagainst {previous.get('commit')}")
+    print(f"{'graph':<13} {'nodes':>8} {'measure':<28} {'before s':>9} {'after s':>9} {'ratio':>7}")
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] else float("inf")
+        print(f"{key[0]:<13} {key[1]:>8} {key[2]:<28} {before[key]:>9.3f} {after[key]:>9.3f} {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=sorted(GENERATORS), nargs="+", default=sorted(GENERATORS))
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--hops", type=int, default=6)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", action="store_true")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    signal.signal(signal.SIGALRM, raise_timeout)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'graph':<13} {'nodes':>8} {'edges':>9} {'xsd s':>7} {'valid s':>8} "
+              + " ".join(f"{name.replace('find_', ''):>18}" for name in SEARCHES))
+        for kind in args.kind:
+            for nodes in args.nodes:
+                result = run_graph(kind, nodes, args, directory)
+                results.append(result)
+                timings, searches = result["timings"], result["searches"]
+                print(f"{kind:<13} {nodes:>8} {result['edges']:>9} {timings['validate_xml_with_xsd']:>7.2f} "
+                      f"{timings['is_valid_graph']:>8.2f} "
+                      + " ".join(f"{searches[name]['seconds']:>10.3f}s {searches[name]['timeouts']:>2}t/o"
+                                 for name in SEARCHES))
+
+    document = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if previous is not None:
+        print_comparison(previous, document)
+
+
+if __name__ == "__main__":
+    main()
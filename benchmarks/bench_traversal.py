@@ -0,0 +1,132 @@
+"""
+Copying searches (path + [neighbor], neighbor not in path, list.pop(0)) against the
+backtracking kernel in traversal.py on long paths.
+
+The graph is a chain of --depth edges with a bypass edge i -> i + 2 every --bypass
+nodes, so there are 2 ** (depth // bypass) paths of roughly depth edges each.
+
+With --fanout the start node also gets that many dead-end successors in front of a chain of
+--diamonds diamonds, 2 ** diamonds paths that the breadth-first search has to carry past all
+the nodes discovered before them. Only the kernel is timed there, list.pop(0) on a queue of
+that size would take the copying search minutes.
+
+    python -m benchmarks.bench_traversal --depth 50 100 200
+    python -m benchmarks.bench_traversal --depth 50 --fanout 200000 --diamonds 14
+"""
+import argparse
+import sys
+import time
+
+import networkx as nx
+
+from traversal import iter_dfs_paths, iter_bfs_paths
+
+
+def copying_dfs(graph, start, end):
+    paths = []
+
+    def dfs(current_node, path):
+        if current_node == end:
+            paths.append(path)
+        else:
+            for neighbor in graph.successors(current_node):
+                if neighbor not in path:
+                    dfs(neighbor, path + [neighbor])
+
+    dfs(start, [start])
+    return paths
+
+
+def copying_dfs_iterative(graph, start, end):
+    paths = []
+    stack = [(start, [start])]
+    while stack:
+        current_node, path = stack.pop()
+        if current_node == end:
+            paths.append(path)
+        else:
+            for neighbor in graph.successors(current_node):
+                if neighbor not in path:
+                    stack.append((neighbor, path + [neighbor]))
+    return paths
+
+
+def copying_bfs(graph, start, end):
+    paths = []
+    queue = [(start, [start])]
+    while queue:
+        current_node, path = queue.pop(0)
+        if current_node == end:
+            paths.append(path)
+        else:
+            for neighbor in graph.successors(current_node):
+                if neighbor not in path:
+                    queue.append((neighbor, path + [neighbor]))
+    return paths
+
+
+SEARCHES = [
+    ("dfs", copying_dfs, lambda graph, start, end: list(iter_dfs_paths(graph, start, end))),
+    ("dfs iterative", copying_dfs_iterative,
+     lambda graph, start, end: list(iter_dfs_paths(graph, start, end, reverse=True))),
+    ("bfs", copying_bfs, lambda graph, start, end: list(iter_bfs_paths(graph, start, end))),
+]
+
+
+def bypass_chain(depth, bypass):
+    graph = nx.path_graph(depth + 1, create_using=nx.DiGraph)
+    graph.add_edges_from((i, i + 2) for i in range(0, depth - 1, bypass))
+    return graph
+
+
+def fanout_diamonds(fanout, diamonds):
+    graph = nx.DiGraph()
+    graph.add_edges_from(("start", i) for i in range(fanout))
+    previous = "start"
+    for i in range(diamonds):
+        graph.add_edges_from([(previous, ("left", i)), (previous, ("right", i)),
+                              (("left", i), ("join", i)), (("right", i), ("join", i))])
+        previous = ("join", i)
+    return graph, previous
+
+
+def best_of(repeat, search, graph, start, end):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        paths = search(graph, start, end)
+        best = min(best, time.perf_counter() - started)
+    return best, paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--bypass", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=0)
+    parser.add_argument("--diamonds", type=int, default=14)
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(args.depth)))
+
+    print(f"{'search':<14} {'depth':>6} {'paths':>6} {'copying ms':>11} {'kernel ms':>10} {'speedup':>8}")
+    for depth in args.depth:
+        graph = bypass_chain(depth, args.bypass)
+        for name, copying, kernel in SEARCHES:
+            copying_time, expected = best_of(args.repeat, copying, graph, 0, depth)
+            kernel_time, paths = best_of(args.repeat, kernel, graph, 0, depth)
+            assert paths == expected, name
+            print(f"{name:<14} {depth:>6} {len(paths):>6} {copying_time * 1000:>11.2f} {kernel_time * 1000:>10.2f} "
+                  f"{copying_time / kernel_time:>7.1f}x")
+
+    if args.fanout:
+        graph, end = fanout_diamonds(args.fanout, args.diamonds)
+        kernel_time, paths = best_of(args.repeat, SEARCHES[2][2], graph, "start", end)
+        assert len(paths) == 2 ** args.diamonds
+        print(f"\nbfs with {args.fanout} dead ends and {args.diamonds} diamonds: {len(paths)} paths "
+              f"in {kernel_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
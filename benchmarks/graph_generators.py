@@ -0,0 +1,152 @@
+"""
+Synthetic graphs for the benchmark suite, written as graph XML (valid against the XSD)
+and as "from to cost" edge lists.
+
+    python -m benchmarks.graph_generators --kind grid --nodes 100000 --output ./bench_graphs
+
+Nodes are n0 .. n<nodes - 1>, edges e0, e1, ... and every generator is deterministic for a seed:
+  scale-free    preferential attachment, 2 edges per new node in a random direction, hubs and cycles
+  grid          right and down edges of a square grid, acyclic with many equal-length routes
+  layered-dag   about sqrt(nodes) layers, every node linked to 3 random nodes of the next layer
+  dense-cycles  rings of 8 nodes with chords, every node on many short cycles, rings chained
+"""
+import argparse
+import math
+import os
+import random
+
+from lxml import etree
+
+
+def random_cost(rnd):
+    return round(rnd.uniform(0, 10), 2)
+
+
+def scale_free_edges(nodes, seed, attach=2):
+    rnd = random.Random(seed)
+    # every node appears once per edge it has, so choices are proportional to degree
+    ends = []
+    for node in range(min(attach, nodes)):
+        if node > 0:
+            yield node - 1, node, random_cost(rnd)
+            ends += [node - 1, node]
+    for node in range(attach, nodes):
+        targets = set()
+        while len(targets) < attach:
+            targets.add(rnd.choice(ends) if ends else rnd.randrange(node))
+        for target in sorted(targets):
+            if rnd.random() < 0.5:
+                yield node, target, random_cost(rnd)
+            else:
+                yield target, node, random_cost(rnd)
+            ends += [node, target]
+
+
+def grid_edges(nodes, seed):
+    rnd = random.Random(seed)
+    side = math.ceil(math.sqrt(nodes))
+    for node in range(nodes):
+        if (node + 1) % side and node + 1 < nodes:
+            yield node, node + 1, random_cost(rnd)
+        if node + side < nodes:
+            yield node, node + side, random_cost(rnd)
+
+
+def layered_dag_edges(nodes, seed, fanout=3):
+    rnd = random.Random(seed)
+    width = max(1, math.isqrt(nodes))
+    for node in range(nodes):
+        next_layer = range((node // width + 1) * width, min((node // width + 2) * width, nodes))
+        for target in rnd.sample(next_layer, min(fanout, len(next_layer))):
+            yield node, target, random_cost(rnd)
+
+
+def dense_cycle_edges(nodes, seed, ring=8):
+    rnd = random.Random(seed)
+    for base in range(0, nodes, ring):
+        size = min(ring, nodes - base)
+        for offset in range(size):
+            for step in (1, 3):
+                if step < size:
+                    yield base + offset, base + (offset + step) % size, random_cost(rnd)
+        if base + ring < nodes:
+            yield base, base + ring, random_cost(rnd)
+
+
+GENERATORS = {
+    "scale-free": scale_free_edges,
+    "grid": grid_edges,
+    "layered-dag": layered_dag_edges,
+    "dense-cycles": dense_cycle_edges,
+}
+
+
+def node_ids(nodes):
+    return (f"n{node}" for node in range(nodes))
+
+
+def edge_rows(kind, nodes, seed):
+    """(id, from_node, to_node, cost) of every edge of a generated graph."""
+    for number, (from_node, to_node, cost) in enumerate(GENERATORS[kind](nodes, seed)):
+        yield f"e{number}", f"n{from_node}", f"n{to_node}", cost
+
+
+def write_xml(path, graph_id, nodes, edges):
+    """Write node ids and (id, from, to, cost) rows as graph XML without building the tree."""
+    with etree.xmlfile(path, encoding="utf-8") as xf:
+        with xf.element("graph"):
+            for tag, text in (("id", graph_id), ("name", graph_id)):
+                element = etree.Element(tag)
+                element.text = text
+                xf.write(element)
+            with xf.element("nodes"):
+                for node in nodes:
+                    element = etree.Element("node")
+                    etree.SubElement(element, "id").text = node
+                    etree.SubElement(element, "name").text = node
+                    xf.write(element)
+            with xf.element("edges"):
+                for edge_id, from_node, to_node, cost in edges:
+                    element = etree.Element("edge")
+                    etree.SubElement(element, "id").text = edge_id
+                    etree.SubElement(element, "from").text = from_node
+                    etree.SubElement(element, "to").text = to_node
+                    etree.SubElement(element, "cost").text = repr(cost)
+                    xf.write(element)
+
+
+def write_edge_list(path, edges):
+    """Write "from to cost" lines, the format of nx.write_weighted_edgelist. Returns the number of edges."""
+    count = 0
+    with open(path, "w") as f:
+        for _, from_node, to_node, cost in edges:
+            f.write(f"{from_node} {to_node} {cost!r}\n")
+            count += 1
+    return count
+
+
+def write_graph(directory, kind, nodes, seed):
+    """Write <kind>-<nodes>.xml and <kind>-<nodes>.edges into directory, returns (xml path, edge list path, edges)."""
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.join(directory, f"{kind}-{nodes}")
+    write_xml(f"{name}.xml", f"{kind}-{nodes}", node_ids(nodes), edge_rows(kind, nodes, seed))
+    edges = write_edge_list(f"{name}.edges", edge_rows(kind, nodes, seed))
+    return f"{name}.xml", f"{name}.edges", edges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=sorted(GENERATORS), nargs="+", default=sorted(GENERATORS))
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="./bench_graphs")
+    args = parser.parse_args()
+
+    for kind in args.kind:
+        for nodes in args.nodes:
+            xml_path, edge_list_path, edges = write_graph(args.output, kind, nodes, args.seed)
+            print(f"{kind:<13} {nodes:>8} nodes {edges:>9} edges  {xml_path}  {edge_list_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import pickle
+import sys
+import time
+from heapq import heapify, heappush, heappop
+from itertools import count
+
+import networkx as nx
+
+from app_config import dsn, ch_index_path, default_graph
+
+CH_FORMAT = "contraction-hierarchy"
+CH_VERSION = 1
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy index for point-to-point cheapest paths.
+
+    Every node has a rank (its contraction order) and edges holds the original edges plus the
+    shortcuts added while contracting, as {(from_node, to_node): (cost, middle)} where middle is
+    None for original edges and the contracted node a shortcut bypasses otherwise.
+    A query runs Dijkstra upwards (to higher ranks) from both ends and unpacks the shortcuts
+    of the cheapest meeting, so the answer is a path of the original graph.
+    """
+
+    def __init__(self, rank, edges):
+        self.rank = rank
+        self.edges = edges
+        self.up = {node: [] for node in rank}
+        self.down = {node: [] for node in rank}
+        for (from_node, to_node), (cost, _) in edges.items():
+            if rank[to_node] > rank[from_node]:
+                self.up[from_node].append((to_node, cost))
+            else:
+                # followed backwards from to_node by the search from the end of the path
+                self.down[to_node].append((from_node, cost))
+
+    @classmethod
+    def build(cls, nodes, edges, settle_limit=500):
+        """
+        Contract the graph given by node ids and (from_node, to_node, cost) tuples.
+        Nodes are ordered by edge difference with lazy updates, witness searches are
+        local Dijkstras stopped after settle_limit nodes, past that a shortcut is kept.
+        """
+        outgoing, incoming = {}, {}
+        for node in nodes:
+            outgoing.setdefault(node, {})
+            incoming.setdefault(node, {})
+        hierarchy = {}
+        for from_node, to_node, cost in edges:
+            outgoing.setdefault(from_node, {})
+            incoming.setdefault(from_node, {})
+            outgoing.setdefault(to_node, {})
+            incoming.setdefault(to_node, {})
+            # self-loops are never part of a cheapest path
+            if from_node != to_node:
+                # a repeated edge keeps its last cost, the same as nx.DiGraph.add_edge
+                hierarchy[(from_node, to_node)] = (cost, None)
+                outgoing[from_node][to_node] = cost
+                incoming[to_node][from_node] = cost
+
+        contracted_neighbors = dict.fromkeys(outgoing, 0)
+
+        def shortcuts(node):
+            needed = []
+            for u, in_cost in incoming[node].items():
+                targets = {w: in_cost + out_cost for w, out_cost in outgoing[node].items() if w != u}
+                if not targets:
+                    continue
+                witnessed = _witness_search(outgoing, u, node, targets, max(targets.values()), settle_limit)
+                needed.extend((u, w, cost) for w, cost in targets.items() if witnessed.get(w, cost + 1) > cost)
+            return needed
+
+        def priority(node):
+            edge_difference = len(shortcuts(node)) - len(incoming[node]) - len(outgoing[node])
+            return edge_difference + contracted_neighbors[node]
+
+        c = count()
+        queue = [(priority(node), next(c), node) for node in outgoing]
+        heapify(queue)
+        rank = {}
+
+        while queue:
+            _, _, node = heappop(queue)
+            # lazy update: contract only if the node is still the cheapest one to contract
+            current = priority(node)
+            if queue and current > queue[0][0]:
+                heappush(queue, (current, next(c), node))
+                continue
+
+            rank[node] = len(rank)
+            for u, w, cost in shortcuts(node):
+                if cost < outgoing[u].get(w, float("inf")):
+                    outgoing[u][w] = incoming[w][u] = cost
+                    hierarchy[(u, w)] = (cost, node)
+
+            for neighbor in set(incoming[node]) | set(outgoing[node]):
+                contracted_neighbors[neighbor] += 1
+            for u in incoming[node]:
+                del outgoing[u][node]
+            for w in outgoing[node]:
+                del incoming[w][node]
+            del outgoing[node], incoming[node]
+
+        return cls(rank, hierarchy)
+
+    def shortcut_count(self):
+        return sum(1 for _, middle in self.edges.values() if middle is not None)
+
+    def save(self, path, checksum=None):
+        """checksum identifies the graph the index was built from, see DatabaseClient.get_checksum."""
+        header = {"format": CH_FORMAT, "version": CH_VERSION, "checksum": checksum,
+                  "nodes": len(self.rank), "shortcuts": self.shortcut_count()}
+        with open(path, "wb") as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((self.rank, self.edges), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, returns (index, header). Raises ValueError for other formats or versions."""
+        with open(path, "rb") as file:
+            header = pickle.load(file)
+            if not isinstance(header, dict) or header.get("format") != CH_FORMAT:
+                raise ValueError(f"{path} is not a contraction hierarchy index")
+            if header.get("version") != CH_VERSION:
+                raise ValueError(f"{path} has index version {header.get('version')}, expected {CH_VERSION}")
+            rank, edges = pickle.load(file)
+        return cls(rank, edges), header
+
+    def query(self, start, end):
+        """Returns (path, settled) like the other cheapest path algorithms, path is None without a path."""
+        for node in (start, end):
+            if node not in self.rank:
+                raise nx.NodeNotFound(f"Node {node} not found in graph")
+        if start == end:
+            return [start], 1
+
+        adjacency = (self.up, self.down)
+        distances = ({}, {})
+        seen = ({start: 0}, {end: 0})
+        predecessors = ({start: None}, {end: None})
+        c = count()
+        fringes = ([(0, next(c), start)], [(0, next(c), end)])
+        best, meeting, settled = float("inf"), None, 0
+
+        while fringes[0] or fringes[1]:
+            # in an upward search the meeting node may be settled late, a side stops only once it can't improve
+            direction = 0 if fringes[0] and (not fringes[1] or fringes[0][0][0] <= fringes[1][0][0]) else 1
+            distance, _, node = heappop(fringes[direction])
+            if distance >= best:
+                fringes[direction].clear()
+                continue
+            if node in distances[direction]:
+                continue
+            distances[direction][node] = distance
+            settled += 1
+
+            if node in seen[1 - direction] and distance + seen[1 - direction][node] < best:
+                best = distance + seen[1 - direction][node]
+                meeting = node
+
+            for neighbor, cost in adjacency[direction][node]:
+                neighbor_distance = distance + cost
+                if neighbor not in seen[direction] or neighbor_distance < seen[direction][neighbor]:
+                    seen[direction][neighbor] = neighbor_distance
+                    predecessors[direction][neighbor] = node
+                    heappush(fringes[direction], (neighbor_distance, next(c), neighbor))
+
+        if meeting is None:
+            return None, settled
+
+        hops = []
+        node = meeting
+        while predecessors[0][node] is not None:
+            hops.append((predecessors[0][node], node))
+            node = predecessors[0][node]
+        hops.reverse()
+        node = meeting
+        while predecessors[1][node] is not None:
+            hops.append((node, predecessors[1][node]))
+            node = predecessors[1][node]
+
+        path = [start]
+        for from_node, to_node in hops:
+            path.extend(self._unpack(from_node, to_node))
+        return _cut_loops(path), settled
+
+    def _unpack(self, from_node, to_node):
+        """Original nodes after from_node on the edge or shortcut from_node -> to_node."""
+        nodes = []
+        stack = [(from_node, to_node)]
+        while stack:
+            u, w = stack.pop()
+            middle = self.edges[(u, w)][1]
+            if middle is None:
+                nodes.append(w)
+            else:
+                stack.append((middle, w))
+                stack.append((u, middle))
+        return nodes
+
+
+def _witness_search(outgoing, source, skipped, targets, max_cost, settle_limit):
+    """Distances from source to targets in the remaining graph without skipped, bounded by max_cost."""
+    distances = {}
+    found = {}
+    c = count()
+    fringe = [(0, next(c), source)]
+    while fringe and len(distances) < settle_limit:
+        distance, _, node = heappop(fringe)
+        if node in distances:
+            continue
+        if distance > max_cost:
+            break
+        distances[node] = distance
+        if node in targets:
+            found[node] = distance
+            if len(found) == len(targets):
+                break
+        for neighbor, cost in outgoing[node].items():
+            if neighbor != skipped and neighbor not in distances:
+                heappush(fringe, (distance + cost, next(c), neighbor))
+    return found
+
+
+def _cut_loops(path):
+    """
+    The path without the loops it returns to a node by. Shortcuts found over zero-cost edges can
+    unpack to a cheapest walk that visits a node twice, the loop costs nothing so cutting it keeps the cost.
+    """
+    simple = []
+    index = {}
+    for node in path:
+        if node in index:
+            for dropped in simple[index[node] + 1:]:
+                del index[dropped]
+            del simple[index[node] + 1:]
+        else:
+            index[node] = len(simple)
+            simple.append(node)
+    return simple
+
+
+if __name__ == "__main__":
+    from db_client import DatabaseClient
+
+    # Offline preprocessing: contract a graph of the edges table (default_graph unless one is given)
+    # and save the index for query_my_graph.py
+    graph_id = sys.argv[1] if len(sys.argv) > 1 else default_graph
+    index_path = ch_index_path.format(graph=graph_id)
+    db_client = DatabaseClient(dsn, graph_id)
+    checksum = db_client.get_checksum()
+
+    started = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(list(db_client.iter_nodes()), db_client.iter_edges())
+    db_client.close()
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    hierarchy.save(index_path, checksum)
+    print(f"Contraction hierarchy of graph {graph_id}, {len(hierarchy.rank)} nodes with {hierarchy.shortcut_count()} "
+          f"shortcuts, built in {time.perf_counter() - started:.2f}s and saved as {index_path}")
+
@@ -0,0 +1,174 @@
+from array import array
+
+import networkx as nx
+
+
+class CSRGraph:
+    """
+    Read-only directed graph stored in compressed sparse row form.
+
+    Node ids are interned to int32 indexes. The successors of node i are
+    targets[offsets[i]:offsets[i + 1]] and the costs of those edges sit in the same
+    slots of weights. Successors keep the order in which the edges were added, like
+    nx.DiGraph does, so the searches in query_my_graph return paths in the same order.
+    """
+
+    def __init__(self, node_ids, offsets, targets, weights, index=None):
+        self.node_ids = node_ids
+        # any mapping of node id -> position in node_ids, a dict is built when none is given
+        self.index = index if index is not None else {node: i for i, node in enumerate(node_ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        # graph level attributes, same as nx.DiGraph.graph
+        self.graph = {}
+        self._reverse = None
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """
+        Build the graph from node ids and (from_node, to_node, cost) tuples.
+        Unknown endpoints are added as nodes and a repeated (from_node, to_node) pair
+        keeps its first position and its last cost, the same as nx.DiGraph.add_edge.
+        """
+        node_ids = []
+        index = {}
+
+        def intern(node):
+            i = index.get(node)
+            if i is None:
+                i = index[node] = len(node_ids)
+                node_ids.append(node)
+            return i
+
+        for node in nodes:
+            intern(node)
+
+        sources, targets, weights = array('i'), array('i'), array('d')
+        slots = {}
+        for from_node, to_node, cost in edges:
+            u, v = intern(from_node), intern(to_node)
+            slot = slots.get((u, v))
+            if slot is None:
+                slots[(u, v)] = len(sources)
+                sources.append(u)
+                targets.append(v)
+                weights.append(cost)
+            else:
+                weights[slot] = cost
+        del slots
+
+        offsets, csr_targets, csr_weights = _compress(len(node_ids), sources, targets, weights)
+        return cls(node_ids, offsets, csr_targets, csr_weights)
+
+    def _node_index(self, node):
+        try:
+            return self.index[node]
+        except (KeyError, TypeError):
+            raise nx.NetworkXError(f"The node {node} is not in the digraph.")
+
+    def _reversed(self):
+        # Incoming edges are only needed by backward searches, build them on first use
+        if self._reverse is None:
+            sources = array('i')
+            for u in range(len(self.node_ids)):
+                sources.extend([u] * (self.offsets[u + 1] - self.offsets[u]))
+            self._reverse = _compress(len(self.node_ids), self.targets, sources, self.weights)
+        return self._reverse
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __iter__(self):
+        return iter(self.node_ids)
+
+    def __contains__(self, node):
+        try:
+            return node in self.index
+        except TypeError:
+            return False
+
+    def nodes(self):
+        return list(self.node_ids)
+
+    def has_node(self, node):
+        return node in self
+
+    def has_edge(self, from_node, to_node):
+        return from_node in self and to_node in self.successors(from_node)
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return len(self.targets)
+
+    def successors(self, node):
+        u = self._node_index(node)
+        node_ids = self.node_ids
+        return iter([node_ids[v] for v in self.targets[self.offsets[u]:self.offsets[u + 1]]])
+
+    neighbors = successors
+
+    def predecessors(self, node):
+        u = self._node_index(node)
+        offsets, sources, _ = self._reversed()
+        node_ids = self.node_ids
+        return iter([node_ids[v] for v in sources[offsets[u]:offsets[u + 1]]])
+
+    def weighted_successors(self, node):
+        u = self._node_index(node)
+        start, stop = self.offsets[u], self.offsets[u + 1]
+        node_ids = self.node_ids
+        return zip([node_ids[v] for v in self.targets[start:stop]], self.weights[start:stop])
+
+    def weighted_predecessors(self, node):
+        u = self._node_index(node)
+        offsets, sources, weights = self._reversed()
+        start, stop = offsets[u], offsets[u + 1]
+        node_ids = self.node_ids
+        return zip([node_ids[v] for v in sources[start:stop]], weights[start:stop])
+
+    def weighted_edges(self):
+        node_ids = self.node_ids
+        for u in range(len(node_ids)):
+            for slot in range(self.offsets[u], self.offsets[u + 1]):
+                yield node_ids[u], node_ids[self.targets[slot]], self.weights[slot]
+
+    def nbytes(self):
+        """Size of the adjacency and weight arrays, without the node id table."""
+        return sum(a.itemsize * len(a) for a in (self.offsets, self.targets, self.weights))
+
+
+def _compress(node_count, sources, targets, weights):
+    # Stable counting sort of the edges by source, keeps the per-node insertion order
+    offsets = array('q', [0]) * (node_count + 1)
+    for u in sources:
+        offsets[u + 1] += 1
+    for u in range(node_count):
+        offsets[u + 1] += offsets[u]
+
+    cursor = offsets[:-1]
+    csr_targets = array('i', [0]) * len(targets)
+    csr_weights = array('d', [0.0]) * len(weights)
+    for edge, u in enumerate(sources):
+        slot = cursor[u]
+        csr_targets[slot] = targets[edge]
+        csr_weights[slot] = weights[edge]
+        cursor[u] = slot + 1
+
+    return offsets, csr_targets, csr_weights
+
+
+def weighted_successors(graph, node):
+    """(successor, cost) pairs of node for both CSRGraph and nx.DiGraph."""
+    if isinstance(graph, CSRGraph):
+        return graph.weighted_successors(node)
+    return ((v, attrs.get('weight', 1)) for v, attrs in graph.succ[node].items())
+
+
+def weighted_predecessors(graph, node):
+    """(predecessor, cost) pairs of node for both CSRGraph and nx.DiGraph."""
+    if isinstance(graph, CSRGraph):
+        return graph.weighted_predecessors(node)
+    return ((v, attrs.get('weight', 1)) for v, attrs in graph.pred[node].items())
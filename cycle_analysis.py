@@ -0,0 +1,106 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import networkx as nx
+
+
+def strongly_connected_components(graph):
+    """
+    Tarjan's algorithm without recursion, linear in nodes and edges.
+    Works on any graph with successors(), components come out in reverse topological
+    order: no component has an edge to a component listed after it.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.successors(root)))]
+
+        while work:
+            node, successors = work[-1]
+            for neighbor in successors:
+                if neighbor not in index:
+                    index[neighbor] = low[neighbor] = len(index)
+                    stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work.append((neighbor, iter(graph.successors(neighbor))))
+                    break
+                if neighbor in on_stack and index[neighbor] < low[node]:
+                    low[node] = index[neighbor]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[node] < low[parent]:
+                        low[parent] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def self_loops(graph):
+    return [node for node in graph if graph.has_edge(node, node)]
+
+
+def cyclic_components(graph, components=None):
+    """Components that contain a cycle: more than one node, or a single node with a self-loop."""
+    if components is None:
+        components = strongly_connected_components(graph)
+    return [component for component in components
+            if len(component) > 1 or graph.has_edge(component[0], component[0])]
+
+
+def nodes_on_cycles(graph):
+    """Every node that lies on some cycle, found in linear time without enumerating cycles."""
+    return {node for component in cyclic_components(graph) for node in component}
+
+
+def _component_cycles(task):
+    nodes, edges, max_length, max_cycles = task
+    component = nx.DiGraph()
+    component.add_nodes_from(nodes)
+    component.add_edges_from(edges)
+    return list(islice(nx.simple_cycles(component, length_bound=max_length), max_cycles))
+
+
+def enumerate_cycles(graph, max_length=None, max_cycles=None, processes=1, components=None):
+    """
+    Simple cycles of at most max_length nodes, at most max_cycles of them in total.
+    A cycle never leaves its strongly connected component, so every cyclic component
+    is enumerated on its own, on a pool of processes when processes > 1.
+    """
+    if components is None:
+        components = cyclic_components(graph)
+
+    tasks = []
+    for component in components:
+        members = set(component)
+        edges = [(u, v) for u in component for v in graph.successors(u) if v in members]
+        tasks.append((component, edges, max_length, max_cycles))
+
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_component_cycles, tasks))
+    else:
+        results = map(_component_cycles, tasks)
+
+    cycles = []
+    for component_cycles in results:
+        cycles.extend(component_cycles)
+    return cycles[:max_cycles] if max_cycles is not None else cycles
@@ -1,51 +1,208 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
+from itertools import islice
+
+from sqlalchemy import create_engine, func, select, text, tuple_, BigInteger, Column, Integer, String, Float, ForeignKey
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from app_config import db_chunk_size, default_graph
+
 Base = declarative_base()
+class Graph(Base):
+    __tablename__ = 'graphs'
+    id = Column(String, primary_key=True)
+    name = Column(String)
+
 class Node(Base):
     __tablename__ = 'nodes'
+    graph_id = Column(String, ForeignKey('graphs.id'), primary_key=True)
     id = Column(Integer, primary_key=True)
     name = Column(String)
 
 class Edge(Base):
     __tablename__ = 'edges'
+    graph_id = Column(String, ForeignKey('graphs.id'), primary_key=True)
     id = Column(Integer, primary_key=True)
-    from_node = Column(Integer, ForeignKey('nodes.id'))
-    to_node = Column(Integer, ForeignKey('nodes.id'))
+    from_node = Column(Integer)
+    to_node = Column(Integer)
     cost = Column(Float)
 
+class Change(Base):
+    __tablename__ = 'graph_changelog'
+    version = Column(BigInteger, primary_key=True)
+    graph_id = Column(String)
+    table_name = Column(String)
+    operation = Column(String)
+    id = Column(String)
+    from_node = Column(String)
+    to_node = Column(String)
+    cost = Column(Float)
+
+# Order independent, changes whenever a node is added or removed or an edge of the graph changes
+GRAPH_CHECKSUM = """
+    SELECT (SELECT count(*) FROM nodes WHERE graph_id = :graph_id),
+           (SELECT count(*) FROM edges WHERE graph_id = :graph_id),
+           (SELECT coalesce(sum(hashtext(concat_ws(',', id, from_node, to_node, cost))::bigint), 0) FROM edges
+            WHERE graph_id = :graph_id)
+"""
+
+# A sync point is the last version read and the snapshot it was read in, both from one statement.
+# Versions are handed out when a change is logged but transactions commit in any order, so a change
+# with a lower version than one already read can still appear. Changes after a sync point are the
+# ones above its version and the ones whose transaction its snapshot couldn't see yet.
+SYNC_POINT = """
+    SELECT coalesce(max(version), 0), CAST(pg_current_snapshot() AS TEXT) FROM graph_changelog
+    WHERE graph_id = :graph_id
+"""
+
+CHANGES_SINCE = """
+    SELECT CAST(s.snapshot AS TEXT), c.version, c.table_name, c.operation, c.id, c.from_node, c.to_node, c.cost
+    FROM (SELECT pg_current_snapshot() AS snapshot) s
+    LEFT JOIN graph_changelog c ON c.graph_id = :graph_id AND (
+        c.version > :since
+        OR (CAST(:snapshot AS pg_snapshot) IS NOT NULL
+            AND c.xid >= pg_snapshot_xmin(CAST(:snapshot AS pg_snapshot))
+            AND NOT pg_visible_in_snapshot(c.xid, CAST(:snapshot AS pg_snapshot))))
+    ORDER BY c.version
+"""
+
 class DatabaseClient:
-    def __init__(self, db_connection):
+    """Reads and writes the nodes and edges of one graph, graph_id, of the database."""
+
+    def __init__(self, db_connection, graph_id=default_graph):
         self.engine = create_engine(db_connection)
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
+        self.graph_id = graph_id
+
+    def save_graph(self, name=None):
+        """Add the graph, or rename it, nodes and edges can only be saved once it exists."""
+        self.session.merge(Graph(id=self.graph_id, name=name))
+        self.session.commit()
+
+    def get_graphs(self):
+        """Ids of all graphs in the database."""
+        return [row[0] for row in self.session.query(Graph.id).order_by(Graph.id).all()]
 
     def save_nodes(self, nodes):
         for node_data in nodes:
-            node = Node(id=node_data[0], name=node_data[0])
+            node = Node(graph_id=self.graph_id, id=node_data[0], name=node_data[0])
             self.session.add(node)
         self.session.commit()
 
     def save_edges(self, edges):
         for edge_data in edges:
-            edge = Edge(id=edge_data['id'], from_node=edge_data['from_node'], to_node=edge_data['to_node'], cost=edge_data['cost'])
+            edge = Edge(graph_id=self.graph_id, id=edge_data['id'], from_node=edge_data['from_node'],
+                        to_node=edge_data['to_node'], cost=edge_data['cost'])
             self.session.add(edge)
         self.session.commit()
 
 
+    def bulk_save_nodes(self, nodes, chunk_size=db_chunk_size):
+        """
+        Upsert (id, name) tuples with Core INSERT ... ON CONFLICT (graph_id, id) DO UPDATE, one executemany
+        and one commit per chunk_size rows, so re-imports update existing ids. Returns the rows written.
+        """
+        rows = ({'graph_id': self.graph_id, 'id': node_data[0], 'name': node_data[1]} for node_data in nodes)
+        return self._bulk_upsert(Node.__table__, rows, ['name'], chunk_size)
+
+    def bulk_save_edges(self, edges, chunk_size=db_chunk_size):
+        """Upsert edge dicts, in the format save_edges takes, the same way as bulk_save_nodes."""
+        rows = ({'graph_id': self.graph_id, 'id': edge_data['id'], 'from_node': edge_data['from_node'],
+                 'to_node': edge_data['to_node'], 'cost': edge_data['cost']} for edge_data in edges)
+        return self._bulk_upsert(Edge.__table__, rows, ['from_node', 'to_node', 'cost'], chunk_size)
+
+    def _bulk_upsert(self, table, rows, update_columns, chunk_size):
+        dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+        dialect = dialects.get(self.engine.dialect.name)
+        if dialect is None:
+            raise ValueError(f"Bulk upserts are not supported on {self.engine.dialect.name}")
+
+        statement = dialect.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.graph_id, table.c.id],
+            set_={column: statement.excluded[column] for column in update_columns})
+
+        written = 0
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            # one statement can't update the same row twice, the last occurrence of an id wins
+            chunk = list({row['id']: row for row in chunk}.values())
+            self.session.execute(statement, chunk)
+            self.session.commit()
+            written += len(chunk)
+        return written
+
     def get_nodes(self):
-        results = self.session.query(Node).all()
+        results = self.session.query(Node).filter(Node.graph_id == self.graph_id).all()
         nodes = []
         for result in results:
             nodes.append(result.id)
         return nodes
 
     def get_edges(self):
-        results = self.session.query(Edge).all()
+        results = self.session.query(Edge).filter(Edge.graph_id == self.graph_id).all()
         edges = []
         for result in results:
             edges.append((result.from_node, result.to_node, result.cost))
         return edges
 
+    def iter_nodes(self, chunk_size=db_chunk_size):
+        """
+        Node ids selected with Core, without building ORM instances, and streamed from a
+        server-side cursor chunk_size rows at a time, so rows can be used while they still arrive.
+        """
+        statement = select(Node.id).where(Node.graph_id == self.graph_id).execution_options(yield_per=chunk_size)
+        for row in self.session.execute(statement):
+            yield row[0]
+
+    def iter_edges(self, chunk_size=db_chunk_size):
+        """
+        (from_node, to_node, cost) tuples streamed the same way as iter_nodes, in edge id order
+        so a graph built from them lists successors in the order the SQL backend walks them.
+        """
+        statement = select(Edge.from_node, Edge.to_node, Edge.cost).where(Edge.graph_id == self.graph_id)
+        statement = statement.order_by(Edge.id)
+        statement = statement.execution_options(yield_per=chunk_size)
+        for row in self.session.execute(statement):
+            yield tuple(row)
+
+    def get_version(self):
+        """Latest change of the graph logged in graph_changelog, 0 before any change."""
+        return self.session.query(func.max(Change.version)).filter(Change.graph_id == self.graph_id).scalar() or 0
+
+    def get_sync_point(self):
+        """(version, snapshot) to read the changes of the graph after, see get_changes."""
+        row = self.session.execute(text(SYNC_POINT), {'graph_id': self.graph_id}).one()
+        return row[0], row[1]
+
+    def get_changes(self, since, snapshot=None):
+        """
+        (changes, snapshot): (version, table_name, operation, id, from_node, to_node, cost) of every
+        change of the graph after the sync point (since, snapshot) in version order, and the snapshot
+        of the next sync point, whose version is the highest one of the changes. Without a snapshot
+        only the versions above since are read.
+        """
+        parameters = {'graph_id': self.graph_id, 'since': since, 'snapshot': snapshot}
+        rows = self.session.execute(text(CHANGES_SINCE), parameters).all()
+        # the snapshot comes with every row, a single row of NULLs without any change
+        return [tuple(row[1:]) for row in rows if row[1] is not None], rows[0][0]
+
+    def get_pair_costs(self, pairs):
+        """
+        Cost of every (from_node, to_node) pair of pairs that an edge of the graph still links,
+        from the last of its edges in id order, the one a graph built from iter_edges keeps.
+        """
+        if not pairs:
+            return {}
+        statement = select(Edge.from_node, Edge.to_node, Edge.cost).where(
+            Edge.graph_id == self.graph_id, tuple_(Edge.from_node, Edge.to_node).in_(list(pairs)))
+        statement = statement.order_by(Edge.id)
+        return {(from_node, to_node): cost for from_node, to_node, cost in self.session.execute(statement)}
+
+    def get_checksum(self):
+        """Identifies the current content of the graph tables, used to tell if a saved index is stale."""
+        row = self.session.execute(text(GRAPH_CHECKSUM), {'graph_id': self.graph_id}).one()
+        return ":".join(str(value) for value in row)
+
     def close(self):
         self.session.close()
@@ -1,15 +1,105 @@
-CREATE TABLE nodes (
+-- Every graph document (<graph><id>) is its own graph, nodes and edges are keyed by the graph id and
+-- hash partitioned on it, so queries of one graph only touch its partition and loading a new graph
+-- needs no DDL (a partition per graph would lock the parent tables while it is created).
+CREATE TABLE graphs (
     id VARCHAR PRIMARY KEY,
     name VARCHAR
 );
 
+CREATE TABLE nodes (
+    graph_id VARCHAR NOT NULL REFERENCES graphs(id),
+    id VARCHAR NOT NULL,
+    name VARCHAR,
+    PRIMARY KEY (graph_id, id)
+) PARTITION BY HASH (graph_id);
+
 CREATE TABLE edges (
-    id VARCHAR PRIMARY KEY,
-    from_node VARCHAR REFERENCES nodes(id),
-    to_node VARCHAR REFERENCES nodes(id),
-    cost FLOAT DEFAULT 0 CHECK (cost >= 0) -- ensure non-negative costs
+    graph_id VARCHAR NOT NULL,
+    id VARCHAR NOT NULL,
+    from_node VARCHAR NOT NULL,
+    to_node VARCHAR NOT NULL,
+    cost FLOAT DEFAULT 0 CHECK (cost >= 0), -- ensure non-negative costs
+    PRIMARY KEY (graph_id, id),
+    FOREIGN KEY (graph_id, from_node) REFERENCES nodes (graph_id, id),
+    FOREIGN KEY (graph_id, to_node) REFERENCES nodes (graph_id, id)
+) PARTITION BY HASH (graph_id);
+
+DO $$
+BEGIN
+    FOR remainder IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE nodes_%s PARTITION OF nodes FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+                       remainder, remainder);
+        EXECUTE format('CREATE TABLE edges_%s PARTITION OF edges FOR VALUES WITH (MODULUS 16, REMAINDER %s)',
+                       remainder, remainder);
+    END LOOP;
+END $$;
+
+-- Followed by the recursive queries of sql_backend.py: forwards from a node (and to a duplicate
+-- edge between the same pair of nodes), backwards to a node.
+CREATE INDEX edges_from_node_idx ON edges (graph_id, from_node, to_node);
+CREATE INDEX edges_to_node_idx ON edges (graph_id, to_node);
+
+-- Change tracking: every change to a graph is appended here by the triggers below, so a loaded graph
+-- can be synced by reading the entries of its graph after the last version it has seen.
+-- An update is logged as a delete of the old row followed by an insert of the new one,
+-- node updates that only rename a node don't change the graph and are not logged.
+-- Versions are taken when a change is logged, transactions commit in another order, so the
+-- transaction of every entry is kept as well: a reader also asks for the entries of the
+-- transactions its last snapshot didn't see (see db_client.py).
+CREATE SEQUENCE graph_version_seq;
+
+CREATE TABLE graph_changelog (
+    version BIGINT PRIMARY KEY DEFAULT nextval('graph_version_seq'),
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    graph_id VARCHAR NOT NULL,
+    table_name VARCHAR NOT NULL,   -- 'nodes' or 'edges'
+    operation CHAR(1) NOT NULL,    -- 'I' (insert) or 'D' (delete)
+    id VARCHAR NOT NULL,
+    from_node VARCHAR,
+    to_node VARCHAR,
+    cost FLOAT
 );
 
+CREATE INDEX graph_changelog_graph_idx ON graph_changelog (graph_id, version);
+CREATE INDEX graph_changelog_xid_idx ON graph_changelog (graph_id, xid);
+
+CREATE FUNCTION log_node_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id <> NEW.id) THEN
+        INSERT INTO graph_changelog (graph_id, table_name, operation, id) VALUES (OLD.graph_id, 'nodes', 'D', OLD.id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND OLD.id <> NEW.id) THEN
+        INSERT INTO graph_changelog (graph_id, table_name, operation, id) VALUES (NEW.graph_id, 'nodes', 'I', NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION log_edge_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO graph_changelog (graph_id, table_name, operation, id, from_node, to_node, cost)
+        VALUES (OLD.graph_id, 'edges', 'D', OLD.id, OLD.from_node, OLD.to_node, OLD.cost);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO graph_changelog (graph_id, table_name, operation, id, from_node, to_node, cost)
+        VALUES (NEW.graph_id, 'edges', 'I', NEW.id, NEW.from_node, NEW.to_node, NEW.cost);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row triggers of a partitioned table are created on each of its partitions
+CREATE TRIGGER nodes_changelog AFTER INSERT OR UPDATE OR DELETE ON nodes
+    FOR EACH ROW EXECUTE FUNCTION log_node_change();
+
+CREATE TRIGGER edges_changelog AFTER INSERT OR DELETE ON edges
+    FOR EACH ROW EXECUTE FUNCTION log_edge_change();
+
+-- The upserts of load_bulk update every row they meet, only rows that really changed are logged
+CREATE TRIGGER edges_changelog_update AFTER UPDATE ON edges
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION log_edge_change();
+
 WITH RECURSIVE cycle_check(id, path, from_node, to_node, cycle) AS (
     SELECT
         e.id,
@@ -0,0 +1,190 @@
+import glob
+import os
+import pickle
+
+import matplotlib.pyplot as plt
+import networkx as nx
+from matplotlib.collections import LineCollection
+
+import app_config
+from cycle_analysis import strongly_connected_components
+
+RENDER_MODES = ("auto", "detailed", "batched", "condensed")
+
+
+def layered_layout(graph):
+    """Acyclic graphs only: x is the topological generation of a node, a generation is spread over y."""
+    generations = list(nx.topological_generations(graph))
+    pos = {}
+    for x, generation in enumerate(generations):
+        for y, node in enumerate(generation):
+            pos[node] = (x / max(1, len(generations) - 1), (y + 0.5) / len(generation))
+    return pos
+
+
+LAYOUTS = {
+    "circular": nx.circular_layout,
+    # force-directed, reads better but costs far more, spring_layout needs scipy past 500 nodes
+    "spring": lambda graph: nx.spring_layout(graph, seed=42),
+    "layered": layered_layout,
+}
+
+# Layouts computed by this process, keyed by (graph id, kind, layout, graph version)
+_layouts = {}
+
+
+def graph_layout(graph, layout="circular", version=None, kind="graph", cache_dir=app_config.indexes_path,
+                 graph_id=app_config.default_graph):
+    """
+    Node positions of graph with the named layout. With a version (the graph_changelog version the
+    graph graph_id was read at) positions are cached in memory and in cache_dir, so the graph is only laid out
+    again after it changed. kind tells apart different graphs drawn from one version (e.g. the condensation).
+    """
+    if version is None:
+        return LAYOUTS[layout](graph)
+
+    key = (graph_id, kind, layout, version)
+    name = f"layout-{graph_id}-{kind}-{layout}"
+    path = os.path.join(cache_dir, f"{name}-{version}.pickle") if cache_dir else None
+    pos = _layouts.get(key)
+    if pos is None and path and os.path.exists(path):
+        with open(path, "rb") as f:
+            pos = pickle.load(f)
+    if pos is not None and all(node in pos for node in graph):
+        _layouts[key] = pos
+        return pos
+
+    pos = LAYOUTS[layout](graph)
+    _layouts[key] = pos
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # layouts of older versions won't be asked for again
+        for stale in glob.glob(os.path.join(glob.escape(cache_dir), f"{glob.escape(name)}-*.pickle")):
+            os.remove(stale)
+        with open(path, "wb") as f:
+            pickle.dump(pos, f)
+    return pos
+
+
+def cycle_edges(cycles):
+    """(edges on the listed cycles, the closing edge of each cycle)."""
+    on_cycle, closing = set(), set()
+    for cycle in cycles:
+        on_cycle.update(zip(cycle, cycle[1:]))
+        closing.add((cycle[-1], cycle[0]))
+    return on_cycle - closing, closing
+
+
+def draw_detailed(graph, pos, on_cycles, cycles):
+    """Every edge as its own arrow with its cost, readable up to a few hundred edges."""
+    node_colors = ['red' if node in on_cycles else 'skyblue' for node in graph.nodes()]
+    nx.draw(graph, pos, with_labels=True, node_color=node_colors, font_weight='bold', node_size=500, font_size=10,
+            width=1.0)
+
+    # Color the last edge of each cycle red
+    on_cycle, closing = cycle_edges(cycles)
+    nx.draw_networkx_edges(graph, pos, edgelist=list(on_cycle), edge_color='blue', node_size=500, width=1.0)
+    nx.draw_networkx_edges(graph, pos, edgelist=list(closing), edge_color='red', node_size=500, arrowsize=15)
+
+    # draw weighted edges on the graph
+    nx.draw_networkx_edge_labels(graph, pos, edge_labels={(u, v): d['weight'] for u, v, d in graph.edges(data=True)})
+
+
+def _draw_segments(ax, pos, edges, color, width, zorder):
+    segments = [(pos[u], pos[v]) for u, v in edges if u != v]
+    if segments:
+        ax.add_collection(LineCollection(segments, colors=color, linewidths=width, zorder=zorder))
+
+
+def _draw_labels(ax, pos, labels, font_size):
+    for node, label in labels.items():
+        x, y = pos[node]
+        ax.text(x, y, label, fontsize=font_size, ha='center', va='center', zorder=4)
+
+
+def draw_batched(ax, graph, pos, on_cycles, cycles, max_labels):
+    """
+    Edges as three line collections (plain, on a listed cycle, closing a cycle), without arrow heads,
+    and nodes as one scatter, so the artist count doesn't grow with the graph. Node labels are only
+    drawn up to max_labels nodes and costs up to max_labels edges.
+    """
+    on_cycle, closing = cycle_edges(cycles)
+    _draw_segments(ax, pos, (edge for edge in graph.edges() if edge not in on_cycle and edge not in closing),
+                   'gray', 0.3, 1)
+    _draw_segments(ax, pos, on_cycle, 'blue', 1.0, 2)
+    _draw_segments(ax, pos, closing, 'red', 1.0, 2)
+
+    nodes = list(graph)
+    xs, ys = zip(*(pos[node] for node in nodes)) if nodes else ((), ())
+    size = max(1.0, 500 / max(1, len(nodes)) ** 0.5)
+    ax.scatter(xs, ys, s=size, c=['red' if node in on_cycles else 'skyblue' for node in nodes], zorder=3)
+
+    if len(nodes) <= max_labels:
+        _draw_labels(ax, pos, {node: str(node) for node in nodes}, 8)
+    if graph.number_of_edges() <= max_labels:
+        nx.draw_networkx_edge_labels(graph, pos, ax=ax,
+                                     edge_labels={(u, v): d['weight'] for u, v, d in graph.edges(data=True)})
+
+
+def condense(graph):
+    """The graph of its strongly connected components: (condensed graph, {component index: members})."""
+    components = strongly_connected_components(graph)
+    component_of = {node: index for index, component in enumerate(components) for node in component}
+    condensed = nx.DiGraph()
+    condensed.add_nodes_from(range(len(components)))
+    condensed.add_edges_from((component_of[u], component_of[v]) for u, v in graph.edges()
+                             if component_of[u] != component_of[v])
+    return condensed, dict(enumerate(components))
+
+
+def draw_condensed(ax, graph, max_labels, version=None, graph_id=app_config.default_graph):
+    """
+    Overview with one node per strongly connected component, sized by its members and red when it
+    holds a cycle, laid out left to right in topological order. Only the max_labels largest
+    components of more than one node are labelled, by their smallest member and their size.
+    """
+    condensed, members = condense(graph)
+    pos = graph_layout(condensed, "layered", version, kind="condensed", graph_id=graph_id)
+    cyclic = {index for index, component in members.items()
+              if len(component) > 1 or graph.has_edge(component[0], component[0])}
+
+    _draw_segments(ax, pos, condensed.edges(), 'gray', 0.5, 1)
+    indexes = list(condensed)
+    xs, ys = zip(*(pos[index] for index in indexes)) if indexes else ((), ())
+    ax.scatter(xs, ys, s=[20 + 10 * len(members[index]) ** 0.5 for index in indexes],
+               c=['red' if index in cyclic else 'skyblue' for index in indexes], zorder=3)
+
+    largest = sorted((index for index in indexes if len(members[index]) > 1),
+                     key=lambda index: len(members[index]), reverse=True)[:max_labels]
+    _draw_labels(ax, pos, {index: f"{min(members[index])} ({len(members[index])})" for index in largest}, 7)
+
+
+def render_graph(graph, output_file, components, cycles, version=None, graph_id=app_config.default_graph,
+                 mode=app_config.render_mode, layout=app_config.render_layout, max_labels=app_config.render_max_labels):
+    """
+    Save a PNG of graph with the nodes of the cyclic components in red and the listed cycles in blue,
+    their closing edges in red. mode is one of RENDER_MODES, "auto" draws graphs of up to
+    render_detailed_max_edges edges "detailed" and bigger ones "batched". version and graph_id key the cached layouts.
+    """
+    if mode == "auto":
+        mode = "detailed" if graph.number_of_edges() <= app_config.render_detailed_max_edges else "batched"
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unknown render mode: {mode}")
+
+    on_cycles = {node for component in components for node in component}
+    if mode == "detailed":
+        fig = plt.figure()
+        draw_detailed(graph, graph_layout(graph, layout, version, graph_id=graph_id), on_cycles, cycles)
+        fig.savefig(output_file)
+        plt.close(fig)
+        return
+
+    fig, ax = plt.subplots(figsize=(12, 12))
+    if mode == "batched":
+        draw_batched(ax, graph, graph_layout(graph, layout, version, graph_id=graph_id), on_cycles, cycles, max_labels)
+    else:
+        draw_condensed(ax, graph, max_labels, version, graph_id)
+    ax.autoscale()
+    ax.set_axis_off()
+    fig.savefig(output_file, dpi=100)
+    plt.close(fig)
@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+
+from csr_graph import CSRGraph
+
+MAGIC = b"DGRAPHSN"
+SNAPSHOT_VERSION = 2
+# magic and JSON header, padded, the arrays start right after
+HEADER_SIZE = 4096
+ALIGNMENT = 8
+
+
+class NodeTable:
+    """
+    Node ids of a snapshot, sorted and UTF-8 encoded back to back in names, id i being
+    names[name_offsets[i]:name_offsets[i + 1]]. Ids are decoded only when accessed.
+    """
+
+    def __init__(self, name_offsets, names):
+        self.name_offsets = name_offsets
+        self.names = names
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def __getitem__(self, i):
+        return self.encoded(i).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def encoded(self, i):
+        return bytes(self.names[self.name_offsets[i]:self.name_offsets[i + 1]])
+
+
+class NodeIndex:
+    """Node id -> position lookups by binary search in a NodeTable, UTF-8 byte order is code point order."""
+
+    def __init__(self, table):
+        self.table = table
+        self._keys = _EncodedKeys(table)
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, node):
+        if not isinstance(node, str):
+            raise KeyError(node)
+        encoded = node.encode("utf-8")
+        i = bisect_left(self._keys, encoded)
+        if i == len(self.table) or self.table.encoded(i) != encoded:
+            raise KeyError(node)
+        return i
+
+    def __contains__(self, node):
+        try:
+            self[node]
+        except KeyError:
+            return False
+        return True
+
+
+class _EncodedKeys:
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        return self.table.encoded(i)
+
+
+def write_snapshot(graph, path, source_version, source_snapshot=None):
+    """
+    Write a CSRGraph as a binary snapshot: a header with the graph_changelog sync point (version
+    and snapshot, see DatabaseClient.get_changes) the graph was read at, then the offsets, targets and weights arrays and the sorted node id table.
+    Nodes are renumbered in id order, every node keeps the order of its successors.
+    The file is written next to path and renamed, so readers never see a partial snapshot.
+    """
+    node_ids = graph.node_ids
+    if not all(isinstance(node, str) for node in node_ids):
+        raise TypeError("Snapshots store string node ids only")
+
+    order = sorted(range(len(node_ids)), key=node_ids.__getitem__)
+    position = array('i', [0]) * len(order)
+    for new, old in enumerate(order):
+        position[old] = new
+
+    offsets = array('q', [0])
+    targets, weights = array('i'), array('d')
+    for old in order:
+        start, stop = graph.offsets[old], graph.offsets[old + 1]
+        targets.extend(position[v] for v in graph.targets[start:stop])
+        weights.extend(graph.weights[start:stop])
+        offsets.append(len(targets))
+
+    encoded = [node_ids[old].encode("utf-8") for old in order]
+    name_offsets = array('q', [0])
+    for name in encoded:
+        name_offsets.append(name_offsets[-1] + len(name))
+    names = b"".join(encoded)
+
+    sections = {}
+    cursor = HEADER_SIZE
+    blobs = (("offsets", offsets), ("targets", targets), ("weights", weights),
+             ("name_offsets", name_offsets), ("names", names))
+    for name, blob in blobs:
+        size = len(memoryview(blob).cast("B"))
+        sections[name] = [cursor, size]
+        cursor += _padding(size)
+
+    fields = {
+        "snapshot_version": SNAPSHOT_VERSION,
+        "source_version": source_version,
+        "source_snapshot": source_snapshot,
+        "byteorder": sys.byteorder,
+        "nodes": len(order),
+        "edges": len(targets),
+        "sections": sections,
+    }
+    header = json.dumps(fields).encode("utf-8")
+    if len(MAGIC) + len(header) > HEADER_SIZE and source_snapshot is not None:
+        # a snapshot listing very many running transactions is left out, the file is then never taken as current
+        fields["source_snapshot"] = None
+        header = json.dumps(fields).encode("utf-8")
+    if len(MAGIC) + len(header) > HEADER_SIZE:
+        raise ValueError("Snapshot header does not fit")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(MAGIC + header.ljust(HEADER_SIZE - len(MAGIC)))
+        for name, blob in blobs:
+            data = memoryview(blob).cast("B")
+            file.write(data)
+            file.write(b"\0" * (_padding(len(data)) - len(data)))
+    os.replace(partial, path)
+
+
+def read_header(path):
+    """The snapshot header, or None when path is not a snapshot of the current format."""
+    try:
+        with open(path, "rb") as file:
+            head = file.read(HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if not head.startswith(MAGIC):
+        return None
+    header = json.loads(head[len(MAGIC):].decode("utf-8"))
+    if header.get("snapshot_version") != SNAPSHOT_VERSION or header.get("byteorder") != sys.byteorder:
+        return None
+    return header
+
+
+def load_snapshot(path):
+    """
+    Memory-map a snapshot and return it as a CSRGraph reading its arrays straight from the
+    mapping, nothing is copied or decoded up front. Returns (graph, header).
+    """
+    header = read_header(path)
+    if header is None:
+        raise ValueError(f"{path} is not a graph snapshot of version {SNAPSHOT_VERSION}")
+
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+
+    def section(name, typecode):
+        start, size = header["sections"][name]
+        return view[start:start + size].cast(typecode)
+
+    table = NodeTable(section("name_offsets", "q"), section("names", "B"))
+    graph = CSRGraph(table, section("offsets", "q"), section("targets", "i"), section("weights", "d"),
+                     index=NodeIndex(table))
+    graph.graph["version"] = header["source_version"]
+    graph.graph["changes_snapshot"] = header["source_snapshot"]
+    return graph, header
+
+
+def _padding(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -1,17 +1,39 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby, islice
 from lxml import etree
 import psycopg2
+from psycopg2.extras import execute_values
 import networkx as nx
-import matplotlib.pyplot as plt
 import sys
+import time
 
 import app_config
+from cycle_analysis import cyclic_components, self_loops, enumerate_cycles
+from graph_rendering import render_graph
+
+
+XSD_NAMESPACE = {'xsd': 'http://www.w3.org/2001/XMLSchema'}
+
+
+@lru_cache(maxsize=None)
+def load_schema(xsd_path, identity_constraints=True):
+    """
+    The compiled XMLSchema of xsd_path, compiled once per process. Without identity_constraints
+    the xsd:key, xsd:keyref and xsd:unique definitions are left out, for callers checking them
+    on their own: libxml2 spends most of the validation time on them.
+    """
+    xsd_tree = etree.parse(xsd_path)
+    if not identity_constraints:
+        for constraint in xsd_tree.xpath('//xsd:key | //xsd:keyref | //xsd:unique', namespaces=XSD_NAMESPACE):
+            constraint.getparent().remove(constraint)
+    return etree.XMLSchema(xsd_tree)
 
 
 def validate_xml_with_xsd(xml_path, xsd_path):
     try:
         # Load the XSD schema
-        xsd_tree = etree.parse(xsd_path)
-        xsd_schema = etree.XMLSchema(xsd_tree)
+        xsd_schema = load_schema(xsd_path)
 
         # Load the XML file to validate
         xml_tree = etree.parse(xml_path)
@@ -32,96 +54,220 @@ def validate_xml_with_xsd(xml_path, xsd_path):
 
 def is_valid_graph(xml_data):
     try:
-        parser = etree.XMLParser()
-        tree = etree.parse(xml_data, parser)
-        root = tree.getroot()
+        for _ in iter_checked_elements(xml_data):
+            pass
+        return True, "The graph XML is valid."
+
+    except etree.XMLSyntaxError:
+        return False, "Invalid XML syntax."
+
+    except Exception as e:
+        return False, str(e)
+
+
+def child_texts(elem):
+    # one pass over the children is much cheaper than a findtext call per field
+    return {child.tag: child.text or "" for child in elem}
+
+
+def node_row(node_elem):
+    texts = child_texts(node_elem)
+    return texts.get('id'), texts.get('name')
 
-        # Ensure there's <id> and <name> for the <graph>
-        if root.find("id") is None or root.find("name") is None:
-            return False, "Graph must have <id> and <name>."
 
-        nodes = root.find("nodes")
-        edges = root.find("edges")
+def edge_row(edge_elem):
+    # <cost> is optional in the XSD, the edges table defaults it to 0
+    texts = child_texts(edge_elem)
+    cost = texts.get('cost')
+    return (texts.get('id'), texts.get('from'), texts.get('to'),
+            float(cost) if cost is not None else 0.0)
 
-        # Ensure there's at least one <node>
-        if not nodes or len(nodes.findall("node")) < 1:
-            return False, "<nodes> group must contain at least one <node>."
 
-        # Check all nodes have unique IDs
-        node_ids = {node.find("id").text for node in nodes.findall("node")}
-        if len(node_ids) != len(nodes.findall("node")):
-            return False, "All <node> elements must have unique <id> tags."
+def release(elem):
+    """Drop a handled element from the tree, so memory doesn't grow with the document."""
+    elem.getparent().remove(elem)
 
-        # For each <edge> validate <from>, <to>, and <cost>
-        for edge in edges.findall("edge"):
-            from_node = edge.find("from").text
-            to_node = edge.find("to").text
 
+def read_graph_header(xml_path):
+    """
+    (id, name) of the graph, None when missing. Only the start of the document is parsed,
+    up to the first element after them.
+    """
+    header = {}
+    depth = 0
+    for event, elem in etree.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2 and elem.tag not in ("id", "name"):
+                break
+        else:
+            depth -= 1
+            if depth == 1:
+                header[elem.tag] = elem.text
+    return header.get("id"), header.get("name")
+
+
+def iter_graph_elements(xml_path):
+    """
+    Stream the <node> and <edge> elements of the document as ("node", row) / ("edge", row) pairs.
+    Every element is released as soon as its row is built.
+    """
+    for _, elem in etree.iterparse(xml_path, events=("end",), tag=("node", "edge")):
+        if elem.tag == "node":
+            yield "node", node_row(elem)
+        else:
+            yield "edge", edge_row(elem)
+        release(elem)
+
+
+def iter_checked_elements(xml_path, schema=None):
+    """
+    iter_graph_elements with the checks of is_valid_graph made while the document streams by:
+    graph <id> and <name>, at least one <node>, unique node and edge ids, edges between defined
+    nodes and non-negative costs. A failed check raises ValueError with the is_valid_graph message.
+    With a schema the document is also validated against it while it is parsed, violations raise
+    etree.XMLSyntaxError, possibly only once the document ends (key references are checked there).
+    """
+    node_ids = set()
+    edge_ids = set()
+    nodes_seen = False
+    for _, elem in etree.iterparse(xml_path, events=("end",), tag=("node", "edge", "nodes", "graph"), schema=schema):
+        if elem.tag == "node":
+            node_id, node_name = node_row(elem)
+            if node_id in node_ids:
+                raise ValueError("All <node> elements must have unique <id> tags.")
+            node_ids.add(node_id)
+            yield "node", (node_id, node_name)
+            release(elem)
+        elif elem.tag == "edge":
+            texts = child_texts(elem)
+            from_node, to_node, cost = texts.get("from"), texts.get("to"), texts.get("cost")
             if from_node not in node_ids or to_node not in node_ids:
-                return False, "Each <edge> must have <from> and <to> corresponding to previously defined nodes."
+                raise ValueError("Each <edge> must have <from> and <to> corresponding to previously defined nodes.")
+            try:
+                cost = float(cost) if cost is not None else 0.0
+            except ValueError:
+                raise ValueError("<cost> should be a floating point or integer value.")
+            if cost < 0:
+                raise ValueError("<cost> should be a non-negative floating point.")
+            edge_id = texts.get("id")
+            if edge_id in edge_ids:
+                raise ValueError("All <edge> elements must have unique <id> tags.")
+            edge_ids.add(edge_id)
+            yield "edge", (edge_id, from_node, to_node, cost)
+            release(elem)
+        elif elem.tag == "nodes":
+            root = elem.getparent()
+            if root.find("id") is None or root.find("name") is None:
+                raise ValueError("Graph must have <id> and <name>.")
+            if not node_ids:
+                raise ValueError("<nodes> group must contain at least one <node>.")
+            nodes_seen = True
+        elif not nodes_seen:
+            # </graph> without a <nodes> group
+            if elem.find("id") is None or elem.find("name") is None:
+                raise ValueError("Graph must have <id> and <name>.")
+            raise ValueError("<nodes> group must contain at least one <node>.")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def save_graph(cur, graph_id, graph_name):
+    """Add the graph to the graphs table, or rename it, before its nodes and edges are written."""
+    cur.execute("INSERT INTO graphs (id, name) VALUES (%s, %s) ON CONFLICT (id) DO UPDATE SET name = EXCLUDED.name",
+                (graph_id, graph_name))
+
+
+def upsert_node(cur, node_id, node_name, graph_id=app_config.default_graph):
+    """Returns True when the node was inserted and False when it was updated."""
+    cur.execute("SELECT * FROM nodes WHERE graph_id = %s AND id = %s", (graph_id, node_id))
+    if cur.fetchone():
+        cur.execute("UPDATE nodes SET name = %s WHERE graph_id = %s AND id = %s", (node_name, graph_id, node_id))
+        return False
 
-            cost = edge.find("cost")
-            if cost is not None:
-                try:
-                    cost_value = float(cost.text)
-                    if cost_value < 0:
-                        return False, "<cost> should be a non-negative floating point."
-                except ValueError:
-                    return False, "<cost> should be a floating point or integer value."
+    cur.execute("INSERT INTO nodes (id, name, graph_id) VALUES (%s, %s, %s)", (node_id, node_name, graph_id))
+    return True
 
-        return True, "The graph XML is valid."
 
-    except etree.XMLSyntaxError:
-        return False, "Invalid XML syntax."
+def upsert_edge(cur, edge_id, from_node, to_node, cost, graph_id=app_config.default_graph):
+    """Returns True when the edge was inserted and False when it was updated."""
+    cur.execute("SELECT * FROM edges WHERE graph_id = %s AND id = %s", (graph_id, edge_id))
+    if cur.fetchone():
+        cur.execute("UPDATE edges SET from_node = %s, to_node = %s, cost = %s WHERE graph_id = %s AND id = %s",
+                    (from_node, to_node, cost, graph_id, edge_id))
+        return False
 
-    except Exception as e:
-        return False, str(e)
+    cur.execute("INSERT INTO edges (id, from_node, to_node, cost, graph_id) VALUES (%s, %s, %s, %s, %s)",
+                (edge_id, from_node, to_node, cost, graph_id))
+    return True
 
 
-def load_into_database(xml_path, db_connection):
+# (xmax = 0) is only true for freshly inserted rows, it tells inserts and updates apart.
+# bulk_upsert adds the graph id as the last value of every row.
+NODES_UPSERT = ("INSERT INTO nodes (id, name, graph_id) VALUES %s "
+                "ON CONFLICT (graph_id, id) DO UPDATE SET name = EXCLUDED.name "
+                "RETURNING (xmax = 0)")
+EDGES_UPSERT = ("INSERT INTO edges (id, from_node, to_node, cost, graph_id) VALUES %s "
+                "ON CONFLICT (graph_id, id) DO UPDATE SET from_node = EXCLUDED.from_node, to_node = EXCLUDED.to_node, "
+                "cost = EXCLUDED.cost "
+                "RETURNING (xmax = 0)")
+
+
+def bulk_upsert(cur, upsert_sql, rows, batch_size=app_config.load_batch_size, graph_id=app_config.default_graph):
+    """
+    Upsert rows of the graph graph_id with one INSERT ... ON CONFLICT statement per batch and return (added, updated).
+    The counts are the same as upserting the rows one by one: a repeated id is one insert and then updates.
+    """
+    added = updated = 0
+    for batch in chunked(rows, batch_size):
+        # One statement can't affect the same row twice, keep the last occurrence like the row-by-row path does
+        unique = list({row[0]: row + (graph_id,) for row in batch}.values())
+        flags = execute_values(cur, upsert_sql, unique, page_size=len(unique), fetch=True)
+        inserted = sum(1 for (is_insert,) in flags if is_insert)
+        added += inserted
+        updated += len(batch) - inserted
+    return added, updated
+
+
+def load_into_database(xml_path, db_connection, bulk=app_config.load_bulk, batch_size=app_config.load_batch_size):
     try:
         tree = etree.parse(xml_path)
         root = tree.getroot()
 
+        graph_id = root.findtext("id")
         nodes = root.findall("./nodes/node")
         edges = root.findall("./edges/edge")
 
         conn = psycopg2.connect(**db_connection)
         cur = conn.cursor()
+        save_graph(cur, graph_id, root.findtext("name"))
 
-        for node_elem in nodes:
-            node_id = node_elem.find('id').text
-            node_name = node_elem.find('name').text
-            cur.execute("SELECT * FROM nodes WHERE id = %s", (node_id,))
-            existing_node = cur.fetchone()
+        if bulk:
+            added, updated = bulk_upsert(cur, NODES_UPSERT, (node_row(e) for e in nodes), batch_size, graph_id)
+            print(f"Nodes: {added} added, {updated} updated in the database.")
+            added, updated = bulk_upsert(cur, EDGES_UPSERT, (edge_row(e) for e in edges), batch_size, graph_id)
+            print(f"Edges: {added} added, {updated} updated in the database.")
+        else:
+            for node_elem in nodes:
+                node_id, node_name = node_row(node_elem)
+                if upsert_node(cur, node_id, node_name, graph_id):
+                    print(f"Node {node_id} added to the database.")
+                else:
+                    print(f"Node {node_id} updated in the database.")
 
-            if existing_node:
-                cur.execute("UPDATE nodes SET name = %s WHERE id = %s", (node_name, node_id))
-                print(f"Node {node_id} updated in the database.")
-            else:
-                cur.execute("INSERT INTO nodes (id, name) VALUES (%s, %s)", (node_id, node_name))
-                print(f"Node {node_id} added to the database.")
-
-        for edge_elem in edges:
-            edge_id = edge_elem.find('id').text
-            from_node = edge_elem.find('from').text
-            to_node = edge_elem.find('to').text
-            cost = float(edge_elem.find('cost').text)
-
-            cur.execute("SELECT * FROM edges WHERE id = %s", (edge_id,))
-            existing_edge = cur.fetchone()
-
-            if existing_edge:
-                cur.execute("UPDATE edges SET from_node = %s, to_node = %s, cost = %s WHERE id = %s",
-                            (from_node, to_node, cost, edge_id))
-                print(f"Edge {edge_id} updated in the database.")
-            else:
-                cur.execute("INSERT INTO edges (id, from_node, to_node, cost) VALUES (%s, %s, %s, %s)",
-                            (edge_id, from_node, to_node, cost))
-                print(f"Edge {edge_id} added to the database.")
+            for edge_elem in edges:
+                edge_id, from_node, to_node, cost = edge_row(edge_elem)
+                if upsert_edge(cur, edge_id, from_node, to_node, cost, graph_id):
+                    print(f"Edge {edge_id} added to the database.")
+                else:
+                    print(f"Edge {edge_id} updated in the database.")
 
         conn.commit()
-        print(f"Graph data from: {xml_path}, loaded into the database successfully.")
+        print(f"Graph data from: {xml_path} (graph {graph_id}), loaded into the database successfully.")
 
         cur.close()
         conn.close()
@@ -129,19 +275,126 @@ def load_into_database(xml_path, db_connection):
         print("An error occurred:", e)
 
 
-def find_cycles_and_save_visualization(db_connection, output_file):
+def stream_into_database(xml_path, db_connection, chunk_size=app_config.load_chunk_size,
+                         bulk=app_config.load_bulk, batch_size=app_config.load_batch_size):
+    """
+    Streaming variant of load_into_database for documents too large to hold as one lxml tree.
+    Elements are parsed with iterparse and written and committed in chunks of chunk_size,
+    so peak memory is bounded by the chunk size instead of the document size.
+    """
     try:
+        graph_id, graph_name = read_graph_header(xml_path)
         conn = psycopg2.connect(**db_connection)
         cur = conn.cursor()
+        save_graph(cur, graph_id, graph_name)
+
+        added = updated = total = 0
+        started = time.perf_counter()
+
+        for chunk in chunked(iter_graph_elements(xml_path), chunk_size):
+            if bulk:
+                # nodes precede edges in the document, so the edges' foreign keys are already in place
+                for kind, upsert_sql in (("node", NODES_UPSERT), ("edge", EDGES_UPSERT)):
+                    rows = [row for row_kind, row in chunk if row_kind == kind]
+                    chunk_added, chunk_updated = bulk_upsert(cur, upsert_sql, rows, batch_size, graph_id)
+                    added += chunk_added
+                    updated += chunk_updated
+            else:
+                for kind, row in chunk:
+                    inserted = upsert_node(cur, *row, graph_id) if kind == "node" else upsert_edge(cur, *row, graph_id)
+                    if inserted:
+                        added += 1
+                    else:
+                        updated += 1
+            conn.commit()
+
+            total += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"{total} elements loaded ({total / elapsed if elapsed else 0:.0f} elements/sec).")
+
+        elapsed = time.perf_counter() - started
+        print(f"{added} elements added, {updated} updated in {elapsed:.2f}s "
+              f"({total / elapsed if elapsed else 0:.0f} elements/sec).")
+        print(f"Graph data from: {xml_path} (graph {graph_id}), loaded into the database successfully.")
+
+        cur.close()
+        conn.close()
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def validate_and_load(xml_path, xsd_path, db_connection, batch_size=app_config.load_batch_size):
+    """
+    Validate and load the document in a single pass: it is parsed once with iterparse against the
+    cached compiled schema, the checks of iter_checked_elements run while it streams (they cover the
+    key, keyref and unique constraints of the XSD, so the schema is compiled without them), and the checked rows go
+    straight to bulk_upsert in batches of batch_size. Everything is written in one transaction, so an
+    invalid document, whose errors may only show at its end, loads nothing. Returns True when loaded.
+    The rows go to the graph of the document's <graph><id>, documents of different graphs can be loaded at once.
+    """
+    conn = None
+    try:
+        graph_id, graph_name = read_graph_header(xml_path)
+        if graph_id is None or graph_name is None:
+            raise ValueError("Graph must have <id> and <name>.")
+
+        conn = psycopg2.connect(**db_connection)
+        cur = conn.cursor()
+        started = time.perf_counter()
+        save_graph(cur, graph_id, graph_name)
 
-        # Load nodes and edges from the database
-        nodes_query = "SELECT id FROM nodes"
-        edges_query = "SELECT from_node, to_node, cost FROM edges"
-        cur.execute(nodes_query)
+        elements = iter_checked_elements(xml_path, load_schema(xsd_path, identity_constraints=False))
+        for kind, group in groupby(elements, key=lambda element: element[0]):
+            upsert_sql = NODES_UPSERT if kind == "node" else EDGES_UPSERT
+            added, updated = bulk_upsert(cur, upsert_sql, (row for _, row in group), batch_size, graph_id)
+            print(f"{kind.capitalize()}s: {added} added, {updated} updated in the database.")
+
+        conn.commit()
+        print(f"Graph data from: {xml_path} (graph {graph_id}), validated and loaded into the database "
+              f"successfully in {time.perf_counter() - started:.2f}s.")
+        cur.close()
+        return True
+    except etree.XMLSyntaxError as e:
+        print("XML is not valid against the XSD schema.")
+        print(e)
+    except ValueError as e:
+        print("The graph XML is not valid:", e)
+    except Exception as e:
+        print("An error occurred:", e)
+    finally:
+        if conn is not None:
+            conn.close()
+    return False
+
+
+def load_documents(xml_paths, xsd_path, db_connection, processes=app_config.load_processes):
+    """validate_and_load every document, processes of them at once. Returns whether each one was loaded."""
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(validate_and_load, xml_paths, [xsd_path] * len(xml_paths),
+                                 [db_connection] * len(xml_paths)))
+
+
+def find_cycles_and_save_visualization(db_connection, output_file, graph_id=app_config.default_graph):
+    try:
+        conn = psycopg2.connect(**db_connection)
+        cur = conn.cursor()
+
+        # Load nodes and edges of the graph from the database
+        nodes_query = "SELECT id FROM nodes WHERE graph_id = %s"
+        edges_query = "SELECT from_node, to_node, cost FROM edges WHERE graph_id = %s"
+        cur.execute(nodes_query, (graph_id,))
         nodes = [row[0] for row in cur.fetchall()]
-        cur.execute(edges_query)
+        cur.execute(edges_query, (graph_id,))
         edges = [(row[0], row[1], {'weight': row[2]}) for row in cur.fetchall()]
 
+        # Layouts are cached per version of the graph
+        try:
+            cur.execute("SELECT coalesce(max(version), 0) FROM graph_changelog WHERE graph_id = %s", (graph_id,))
+            version = cur.fetchone()[0]
+        except psycopg2.Error:
+            conn.rollback()
+            version = None
+
         cur.close()
         conn.close()
 
@@ -150,37 +403,19 @@ def find_cycles_and_save_visualization(db_connection, output_file):
         graph.add_nodes_from(nodes)
         graph.add_edges_from(edges)
 
-        # Find cycles using NetworkX
-        cycles = list(nx.simple_cycles(graph))
-        print(cycles)
+        # Strongly connected components tell which nodes are on a cycle in linear time,
+        # the number of simple cycles can grow exponentially so they are only enumerated when asked, within limits
+        components = cyclic_components(graph)
+        print(f"{len(components)} cyclic components, self-loops on: {self_loops(graph)}")
+        cycles = []
+        if app_config.cycle_enumerate:
+            cycles = enumerate_cycles(graph, app_config.cycle_max_length, app_config.cycle_max_count,
+                                      app_config.cycle_processes, components)
+            print(cycles)
         # cycles = [['g'], ['d', 'e', 'a', 'b', 'c'], ['b', 'e', 'a'], ['h', 'j']]
-        # flatten the list of lists
-        flat_cycles = [item for sublist in cycles for item in sublist]
-
-        # Color nodes based on cycles
-        node_colors = ['red' if node in flat_cycles else 'skyblue' for node in graph.nodes()]
-
-        # Visualize the graph using Matplotlib
-        pos = nx.circular_layout(graph)
-        nx.draw(graph, pos, with_labels=True, node_color=node_colors, font_weight='bold', node_size=500, font_size=10,
-                width=1.0)
-
-        # # Color the last edge of each cycle red
-        for cycle in cycles:
-            for i in range(len(cycle)):
-                if i < len(cycle) - 1:
-                    nx.draw_networkx_edges(graph, pos, edgelist=[(cycle[i], cycle[i + 1])], edge_color='blue',
-                                           node_size=500, width=1.0)
-                else:
-                    nx.draw_networkx_edges(graph, pos, edgelist=[(cycle[-1], cycle[0])], edge_color='red',
-                                           node_size=500, arrowsize=15)
-
-        # draw weighted edges on the graph
-        nx.draw_networkx_edge_labels(graph, pos,
-                                     edge_labels={(u, v): d['weight'] for u, v, d in graph.edges(data=True)})
 
-        # Save the plot as a PNG image
-        plt.savefig(output_file)
+        # Visualize the graph using Matplotlib, nodes on cycles in red, see graph_rendering.py
+        render_graph(graph, output_file, components, cycles, version, graph_id)
         print("Graph visualization saved as", output_file)
 
     except Exception as e:
@@ -192,16 +427,31 @@ if __name__ == "__main__":
     xml_document = app_config.xml_document
     db_connection = app_config.db_connection
 
-    # 1) Validate the XML document against the XSD schema
-    if not validate_xml_with_xsd(xml_document, xml_schema):
-        sys.exit(1)
-
-    # 1.1) 2nd way to validate xml file using python
-    #if not is_valid_graph(xml_document):
-    #    sys.exit(1)
-
-    # 2) Load the XML document into the database
-    load_into_database(xml_document, db_connection)
+    if len(sys.argv) > 2:
+        # Several documents, each its own graph, are loaded in parallel and not visualized
+        loaded = load_documents(sys.argv[1:], xml_schema, db_connection)
+        sys.exit(0 if all(loaded) else 1)
+    if len(sys.argv) == 2:
+        xml_document = sys.argv[1]
+
+    if app_config.load_single_pass:
+        # 1-2) Validate the XML document and load it into the database while it is parsed once
+        if not validate_and_load(xml_document, xml_schema, db_connection):
+            sys.exit(1)
+    else:
+        # 1) Validate the XML document against the XSD schema
+        if not validate_xml_with_xsd(xml_document, xml_schema):
+            sys.exit(1)
+
+        # 1.1) 2nd way to validate xml file using python
+        #if not is_valid_graph(xml_document):
+        #    sys.exit(1)
+
+        # 2) Load the XML document into the database
+        if app_config.load_streaming:
+            stream_into_database(xml_document, db_connection)
+        else:
+            load_into_database(xml_document, db_connection)
 
     # 3) Find cycles in the graph and render a visualization
-    find_cycles_and_save_visualization(db_connection, app_config.png_image)
+    find_cycles_and_save_visualization(db_connection, app_config.png_image, read_graph_header(xml_document)[0])
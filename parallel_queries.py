@@ -0,0 +1,120 @@
+import pickle
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+from app_config import query_processes, query_batch_size
+from csr_graph import CSRGraph
+import query_my_graph
+
+# The graph a pool worker answers queries on and the shared blocks behind it, attached once by _attach_graph
+_worker_graph = None
+_worker_blocks = None
+
+
+class SharedGraph:
+    """
+    CSRGraph arrays and node id table copied once into shared memory blocks.
+    Processes attach to the blocks by name and read the arrays in place.
+    """
+
+    ARRAYS = (("offsets", "q"), ("targets", "i"), ("weights", "d"))
+    INDEXES = ("landmarks", "ch", "reachability")
+
+    def __init__(self, graph):
+        # the landmark, contraction hierarchy and reachability indexes can outgrow the arrays and
+        # would be copied into every worker, workers answer without them
+        self.attributes = {name: value for name, value in graph.graph.items() if name not in self.INDEXES}
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_edges(graph.nodes(), ((u, v, attrs.get('weight', 1))
+                                                        for u, v, attrs in graph.edges(data=True)))
+        self.blocks = []
+        self.names = {}
+        for name, typecode in self.ARRAYS:
+            data = memoryview(getattr(graph, name)).cast("B")
+            self.names[name] = (self._copy(data), typecode, len(data))
+        node_table = pickle.dumps(list(graph.node_ids), protocol=pickle.HIGHEST_PROTOCOL)
+        self.names["node_ids"] = (self._copy(node_table), "B", len(node_table))
+
+    def _copy(self, data):
+        block = SharedMemory(create=True, size=max(len(data), 1))
+        block.buf[:len(data)] = data
+        self.blocks.append(block)
+        return block.name
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach_graph(names, attributes):
+    """Build a CSRGraph over the shared blocks, returns (graph, blocks) where blocks must outlive the graph."""
+    blocks = []
+    arrays = {}
+    for name, (block_name, typecode, size) in names.items():
+        block = SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = block.buf[:size].cast(typecode)
+
+    node_ids = pickle.loads(arrays.pop("node_ids"))
+    graph = CSRGraph(node_ids, arrays["offsets"], arrays["targets"], arrays["weights"])
+    graph.graph.update(attributes)
+    return graph, blocks
+
+
+def _attach_graph(names, attributes):
+    global _worker_graph, _worker_blocks
+    _worker_graph, _worker_blocks = attach_graph(names, attributes)
+
+
+def _answer_batch(queries):
+    result = query_my_graph.process_queries(queries, _worker_graph)
+    return None if result is None else result["answers"]
+
+
+class ParallelQueryExecutor:
+    """
+    Answers query batches on a pool of processes sharing one copy of the graph.
+    Queries are sent in batches of batch_size and the answers come back in input order,
+    the result is the same {"answers": [...]} document process_queries returns.
+    Stats blocks of the answers are added to query_my_graph.metrics of this process.
+    The workers have none of the graph's indexes (see SharedGraph): "reachable" queries search,
+    "alt" runs as plain A* and "ch" queries fail.
+    """
+
+    def __init__(self, graph, processes=query_processes, batch_size=query_batch_size):
+        self.batch_size = batch_size
+        self.shared = SharedGraph(graph)
+        self.pool = Pool(processes, initializer=_attach_graph,
+                         initargs=(self.shared.names, self.shared.attributes))
+
+    def iter_answers(self, queries):
+        """The answers in input order as their batches come back, raises RuntimeError when a batch failed."""
+        batches = [queries[i:i + self.batch_size] for i in range(0, len(queries), self.batch_size)]
+        for batch_answers in self.pool.imap(_answer_batch, batches):
+            if batch_answers is None:
+                # the worker already printed the error, like process_queries does
+                raise RuntimeError("A query batch failed")
+            for answer in batch_answers:
+                for query_type, fields in answer.items():
+                    if "stats" in fields:
+                        query_my_graph.metrics.observe(query_type, fields["stats"])
+                yield answer
+
+    def process_queries(self, queries):
+        try:
+            return {"answers": list(self.iter_answers(queries))}
+        except RuntimeError:
+            return None
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+# Upper bounds of the histogram buckets, Prometheus adds the +Inf bucket
+DURATION_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+PATH_LENGTH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class QueryStats:
+    """
+    Work done for one query, filled in by process_queries and the search kernels it calls.
+    Kernels add to the counters, so a query running several searches reports their sum.
+    """
+    __slots__ = ("wall_time", "nodes_expanded", "edges_relaxed", "paths", "peak_path_length")
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.nodes_expanded = 0
+        self.edges_relaxed = 0
+        self.paths = 0
+        self.peak_path_length = 0
+
+    def add_paths(self, paths):
+        for path in paths:
+            self.paths += 1
+            self.peak_path_length = max(self.peak_path_length, len(path))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def counting(neighbors, stats):
+    """
+    Wrap the neighbors function of a search so every call counts a node expanded and its
+    neighbors as edges relaxed in stats. Searches only wrap it when stats are collected,
+    without stats they run exactly as before.
+    """
+    def counted(*args):
+        found = list(neighbors(*args))
+        stats.nodes_expanded += 1
+        stats.edges_relaxed += len(found)
+        return iter(found)
+    return counted
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryMetrics:
+    """Counters and histograms of the stats of every answered query, by query type."""
+
+    COUNTERS = (
+        ("graph_queries_total", "Queries answered.", None),
+        ("graph_query_nodes_expanded_total", "Nodes expanded by the searches.", "nodes_expanded"),
+        ("graph_query_edges_relaxed_total", "Edges looked at by the searches.", "edges_relaxed"),
+        ("graph_query_paths_total", "Paths returned.", "paths"),
+    )
+
+    def __init__(self):
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self.clear()
+
+    def clear(self):
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.durations = defaultdict(lambda: Histogram(DURATION_BUCKETS))
+        self.path_lengths = defaultdict(lambda: Histogram(PATH_LENGTH_BUCKETS))
+
+    def observe(self, query_type, stats):
+        """Add the QueryStats, or the stats block of an answer, of one query of query_type."""
+        if isinstance(stats, QueryStats):
+            stats = stats.as_dict()
+        with self._lock:
+            for name, _, field in self.COUNTERS:
+                self.counters[name][query_type] += stats[field] if field else 1
+            self.durations[query_type].observe(stats["wall_time"])
+            self.path_lengths[query_type].observe(stats["peak_path_length"])
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, help_text, _ in self.COUNTERS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for query_type, value in sorted(self.counters[name].items()):
+                    lines.append(f'{name}{{type="{query_type}"}} {value}')
+            for name, help_text, histograms in (
+                    ("graph_query_duration_seconds", "Wall time of a query.", self.durations),
+                    ("graph_query_peak_path_length", "Nodes on the longest path of a query.", self.path_lengths)):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for query_type, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{type="{query_type}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{type="{query_type}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{type="{query_type}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Replace path with the current metrics, for the textfile collector of node_exporter.
+        Every write goes through a temporary file of its own next to path, so threads and
+        processes writing the same path at once each replace it with a complete file.
+        """
+        with self._write_lock:
+            fd, partial = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".partial",
+                                           dir=os.path.dirname(path) or ".")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(self.to_prometheus())
+                os.replace(partial, path)
+            except BaseException:
+                os.unlink(partial)
+                raise
@@ -1,85 +1,345 @@
+import asyncio
 import json
+import os
+import pickle
 import sys
+import time
+from collections import Counter, OrderedDict, deque, defaultdict
+from functools import partial
+from itertools import islice
+from threading import Lock
 
 import networkx as nx
-from app_config import dsn
+from app_config import dsn, graph_engine, path_tree_cache_size, cheapest_algorithm, landmark_count, ch_index_path
+from app_config import query_processes, graph_snapshot_path, query_backend, query_stats, query_metrics_path
+from app_config import reachability_index, reachability_max_bytes, default_graph, graph_cache_size, output_format
+from app_config import query_planner, query_plan_debug
+from contraction_hierarchy import ContractionHierarchy
+from csr_graph import CSRGraph
 from db_client import DatabaseClient
+from graph_snapshot import read_header, load_snapshot, write_snapshot
+from query_metrics import QueryMetrics, QueryStats, counting
+from query_planner import plan_queries, unplanned
+from reachability import ReachabilityIndex
+from sql_backend import SqlQueryBackend
+from shortest_paths import dijkstra_path, cheapest_path, k_cheapest_paths, restore_path, LandmarkIndex, ShortestPathTreeCache
+from traversal import iter_dfs_paths, iter_bfs_paths, iter_dfs_paths_to_any
 
+# Single-source shortest path trees of the loaded graph, shared by all "cheapest" and "cheapest_k" queries
+path_tree_cache = ShortestPathTreeCache(path_tree_cache_size)
+# Stats of the queries answered by this process, see process_queries
+metrics = QueryMetrics()
+# Held while a reachability index is built, so concurrent queries build it once
+_reachability_lock = Lock()
 
-def create_graph_from_database(dsn):
+
+def create_graph_from_database(dsn, engine=graph_engine, snapshot_path=graph_snapshot_path, graph_id=default_graph):
     try:
-        # Fetch nodes and edges from the database
-        db_client = DatabaseClient(dsn)
-        nodes = db_client.get_nodes()
-        edges = db_client.get_edges()
+        # Trees computed on a previously loaded graph are stale
+        path_tree_cache.clear()
+
+        db_client = DatabaseClient(dsn, graph_id)
+        # snapshots and contraction hierarchies are kept per graph
+        if snapshot_path:
+            snapshot_path = snapshot_path.format(graph=graph_id)
+        hierarchy_path = ch_index_path.format(graph=graph_id)
+        snapshot = read_header(snapshot_path) if engine == "csr" and snapshot_path else None
+        if (snapshot is not None and snapshot["source_snapshot"] is not None
+                and not db_client.get_changes(snapshot["source_version"], snapshot["source_snapshot"])[0]):
+            # Nothing changed since the snapshot was written, map it instead of reading the tables
+            graph, _ = load_snapshot(snapshot_path)
+            version, changes_snapshot = snapshot["source_version"], snapshot["source_snapshot"]
+        else:
+            # read first, changes made while the tables are read are applied again by sync_graph
+            version, changes_snapshot = db_client.get_sync_point()
+            # Stream nodes and edges from the database, the graph is built while rows arrive
+            nodes = db_client.iter_nodes()
+            edges = db_client.iter_edges()
+
+            if engine == "csr":
+                graph = CSRGraph.from_edges(nodes, edges)
+                if snapshot_path:
+                    write_snapshot(graph, snapshot_path, version, changes_snapshot)
+            else:
+                graph = nx.DiGraph()
+                # Add nodes and edges to the graph
+                graph.add_nodes_from(nodes)
+                for edge in edges:
+                    from_node, to_node, cost = edge
+                    graph.add_edge(from_node, to_node, weight=cost)
+
+        checksum = db_client.get_checksum() if os.path.exists(hierarchy_path) else None
         db_client.close()
 
-        graph = nx.DiGraph()
-        # Add nodes and edges to the graph
-        graph.add_nodes_from(nodes)
-        for edge in edges:
-            from_node, to_node, cost = edge
-            graph.add_edge(from_node, to_node, weight=cost)
+        graph.graph["id"] = graph_id
+        graph.graph["version"] = version
+        graph.graph["changes_snapshot"] = changes_snapshot
+
+        if landmark_count:
+            # Distance tables for "alt" cheapest queries
+            graph.graph["landmarks"] = LandmarkIndex.build(graph, landmark_count)
+
+        if reachability_index:
+            # Index for "reachable" queries, also rejects searches between unconnected nodes.
+            # Built by get_reachability when first needed, loading stays as fast as reading the graph
+            graph.graph["reachability"] = None
+
+        if checksum is not None:
+            # Index for "ch" cheapest queries, built offline by contraction_hierarchy.py
+            try:
+                hierarchy, header = ContractionHierarchy.load(hierarchy_path)
+            except (ValueError, pickle.UnpicklingError, EOFError) as e:
+                # another index version or not an index, the graph is still usable without it
+                hierarchy, header = None, None
+                print(f"{hierarchy_path} can't be used ({e}), rebuild it with: python contraction_hierarchy.py {graph_id}",
+                      file=sys.stderr)
+            if header is not None and header["checksum"] == checksum:
+                graph.graph["ch"] = hierarchy
+            elif header is not None:
+                print(f"{hierarchy_path} is out of date, rebuild it with: python contraction_hierarchy.py {graph_id}",
+                      file=sys.stderr)
 
         return graph
     except Exception as e:
         print("An error occurred:", e)
 
-# Trace the Path in Depth-First Search (recursive)
-def find_dfs_paths(graph, start, end):
-    paths = []
-    def dfs(current_node, path):
-        if current_node == end:
-            paths.append(path)
-        else:
-            for neighbor in graph.successors(current_node):
-                if neighbor not in path:
-                    dfs(neighbor, path + [neighbor])
+def apply_changes(graph, changes, linked=None):
+    """
+    Apply graph_changelog entries to a loaded nx.DiGraph, in version order. The DiGraph holds one
+    edge per (from_node, to_node) pair, so an edge delete only removes it when linked, the costs of
+    the pairs other edge ids still connect (see DatabaseClient.get_pair_costs), doesn't have the pair.
+    """
+    for _, table_name, operation, row_id, from_node, to_node, cost in changes:
+        if table_name == "nodes":
+            if operation == "I":
+                graph.add_node(row_id)
+            elif row_id in graph:
+                graph.remove_node(row_id)
+        elif operation == "I":
+            graph.add_edge(from_node, to_node, weight=cost)
+        elif linked is not None and (from_node, to_node) in linked:
+            graph.add_edge(from_node, to_node, weight=linked[(from_node, to_node)])
+        elif graph.has_edge(from_node, to_node):
+            graph.remove_edge(from_node, to_node)
 
-    dfs(start, [start])
-    return paths
 
+def sync_graph(graph, dsn):
+    """
+    Bring a graph loaded by create_graph_from_database up to date by applying only the changes logged
+    since the sync point (version and snapshot, see DatabaseClient.get_changes) it was loaded or last
+    synced at. Returns the number of changes.
+    Indexes computed on the old graph (path trees, landmarks, contraction hierarchy, reachability) are dropped.
+    """
+    if isinstance(graph, CSRGraph):
+        raise TypeError("CSRGraph is read-only, reload it with create_graph_from_database")
 
-# Trace the Path in Depth-First Search (Iterative)
-def find_dfs_paths_iterative(graph, start, end):
-    paths = []
-    stack = [(start, [start])]
+    db_client = DatabaseClient(dsn, graph.graph.get("id", default_graph))
+    changes, changes_snapshot = db_client.get_changes(graph.graph.get("version", 0),
+                                                      graph.graph.get("changes_snapshot"))
+    # pairs of deleted edges may still be linked by another edge id
+    linked = db_client.get_pair_costs({(from_node, to_node) for _, table_name, operation, _, from_node, to_node, _
+                                       in changes if table_name == "edges" and operation == "D"})
+    db_client.close()
 
-    while stack:
-        current_node, path = stack.pop()
+    if changes:
+        apply_changes(graph, changes, linked)
+        # changes committed late can have lower versions than the ones applied before
+        graph.graph["version"] = max(graph.graph.get("version", 0), changes[-1][0])
+        graph.graph["changes_snapshot"] = changes_snapshot
+        graph.graph.pop("landmarks", None)
+        graph.graph.pop("ch", None)
+        graph.graph.pop("reachability", None)
+        path_tree_cache.clear()
+    return len(changes)
 
-        if current_node == end:
-            paths.append(path)
-        else:
-            for neighbor in graph.successors(current_node):
-                if neighbor not in path:
-                    stack.append((neighbor, path + [neighbor]))
+def graph_ids(dsn):
+    """Ids of the graphs in the database."""
+    db_client = DatabaseClient(dsn)
+    try:
+        return set(db_client.get_graphs())
+    finally:
+        db_client.close()
+
+class GraphCache:
+    """
+    Graphs of the database by id, each loaded with load(graph_id) when it is first queried. At most
+    size graphs stay loaded, the least recently queried one is evicted (and closed if it has a close
+    method). Every graph gets its own ShortestPathTreeCache. With known, a function returning the ids
+    of the existing graphs, other ids are rejected before anything is loaded.
+    """
 
-    return paths
+    def __init__(self, load, size=graph_cache_size, known=None):
+        self.load = load
+        self.size = size
+        self.known = known
+        self._graphs = OrderedDict()
+        # the query server answers from several threads, a graph is loaded once
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._graphs)
+
+    def __contains__(self, graph_id):
+        return graph_id in self._graphs
+
+    def get(self, graph_id):
+        """(graph, its path tree cache), loading the graph when it isn't loaded."""
+        with self._lock:
+            entry = self._graphs.get(graph_id)
+            if entry is not None:
+                self._graphs.move_to_end(graph_id)
+                return entry
+
+            if self.known is not None and graph_id not in self.known():
+                raise ValueError(f"Graph {graph_id} does not exist")
+            graph = self.load(graph_id)
+            if graph is None:
+                raise ValueError(f"Graph {graph_id} could not be loaded")
+            entry = self._graphs[graph_id] = (graph, ShortestPathTreeCache(path_tree_cache_size))
+            if len(self._graphs) > self.size:
+                _, (evicted, _) = self._graphs.popitem(last=False)
+                if hasattr(evicted, "close"):
+                    evicted.close()
+            return entry
+
+
+def select_graph(graph, fields):
+    """
+    (graph, path tree cache) a query runs on: a GraphCache gives the graph named by the "graph" field
+    of the query, default_graph without one. A single graph only answers queries of its own graph.
+    """
+    graph_id = fields.get("graph", default_graph)
+    if isinstance(graph, GraphCache):
+        return graph.get(graph_id)
+    loaded = graph.graph_id if isinstance(graph, SqlQueryBackend) else graph.graph.get("id", default_graph)
+    if "graph" in fields and graph_id != loaded:
+        raise ValueError(f"Graph {graph_id} is not loaded")
+    return graph, path_tree_cache
+
+# Trace the Path in Depth-First Search (recursive order)
+def find_dfs_paths(graph, start, end, stats=None):
+    return list(iter_dfs_paths(graph, start, end, stats=stats))
+
+
+# Trace the Path in Depth-First Search (Iterative, stack order)
+def find_dfs_paths_iterative(graph, start, end, stats=None):
+    return list(iter_dfs_paths(graph, start, end, reverse=True, stats=stats))
 
 # Tracing the Path in Breadth-First Search
-def find_bfs_paths(graph, start, end):
-    paths = []
-    queue = [(start, [start])]
+def find_bfs_paths(graph, start, end, stats=None):
+    return list(iter_bfs_paths(graph, start, end, stats=stats))
 
+def nodes_reaching(graph, end, stats=None):
+    """All nodes with a path to end (end included), found with a BFS over the reversed edges."""
+    predecessors = graph.predecessors if stats is None else counting(graph.predecessors, stats)
+    reaching = {end}
+    queue = deque([end])
     while queue:
-        current_node, path = queue.pop(0)
+        for neighbor in predecessors(queue.popleft()):
+            if neighbor not in reaching:
+                reaching.add(neighbor)
+                queue.append(neighbor)
+    return reaching
 
-        if current_node == end:
-            paths.append(path)
-        else:
-            for neighbor in graph.neighbors(current_node):
-                if neighbor not in path:
-                    queue.append((neighbor, path + [neighbor]))
+def get_reachability(graph):
+    """
+    The reachability index of graph, or None without one. A graph loaded with reachability_index
+    holds None under "reachability" until the index is first asked for, it is built then.
+    """
+    index = graph.graph.get("reachability")
+    if index is None and "reachability" in graph.graph:
+        with _reachability_lock:
+            index = graph.graph.get("reachability")
+            if index is None and "reachability" in graph.graph:
+                index = graph.graph["reachability"] = ReachabilityIndex.build(graph, reachability_max_bytes)
+    return index
+
+def is_reachable(graph, start, end, stats=None):
+    """Whether a path leads from start to end, from the reachability index when the graph has one."""
+    index = get_reachability(graph)
+    if index is not None:
+        return index.reachable(start, end, stats)
+    return start in graph and end in graph and start in nodes_reaching(graph, end, stats)
+
+def unreachable(graph, start, end):
+    """True when the reachability index of graph rules out any path between two of its nodes."""
+    index = get_reachability(graph)
+    # unknown nodes are left to the searches, they raise for them
+    return index is not None and start in graph and end in graph and not index.reachable(start, end)
+
+def iter_all_paths(graph, start, end, max_paths=None, max_depth=None, stats=None):
+    """
+    Lazily yield the simple paths from start to end, in the same order as nx.all_simple_paths.
+    Branches through nodes that can't reach end are never entered. max_depth caps the
+    number of edges of a path and max_paths the number of paths yielded.
+    Both searches count their work in stats when a QueryStats is given. An unknown start raises
+    right away rather than once the paths are read, before a streamed answer is started.
+    """
+    if start not in graph:
+        raise nx.NodeNotFound(f"source node {start} not in graph")
+    return _iter_all_paths(graph, start, end, max_paths, max_depth, stats)
+
+def _iter_all_paths(graph, start, end, max_paths, max_depth, stats):
+    if end not in graph or max_paths == 0:
+        return
 
-    return paths
+    reaching = nodes_reaching(graph, end, stats)
+    if start not in reaching:
+        return
 
-def find_all_paths(graph, start, end):
-    all_paths = list(nx.all_simple_paths(graph, source=start, target=end))
-    return all_paths
+    paths = iter_dfs_paths(graph, start, end, allowed=reaching, max_depth=max_depth, stats=stats)
+    yield from islice(paths, max_paths)
 
-def find_cheapest_path(graph, start, end):
+def find_all_paths(graph, start, end, max_paths=None, max_depth=None, stats=None):
+    return list(iter_all_paths(graph, start, end, max_paths, max_depth, stats))
+
+def find_all_paths_from(graph, start, targets, stats=None):
+    """
+    find_all_paths from start to the end of each (end, max_paths, max_depth) of targets, in one
+    depth-first enumeration that goes on through an end towards the other ends it reaches.
+    Returns the list of paths of every target, the paths and their order are the ones of find_all_paths.
+    """
+    if start not in graph:
+        raise nx.NodeNotFound(f"source node {start} not in graph")
+    found = [[] for _ in targets]
+    reaching = {}
+    by_end = defaultdict(list)
+    for i, (end, max_paths, _) in enumerate(targets):
+        if end in graph and max_paths != 0:
+            if end not in reaching:
+                reaching[end] = nodes_reaching(graph, end, stats)
+            if start in reaching[end]:
+                by_end[end].append(i)
+    if not by_end:
+        return found
+
+    allowed = set().union(*(reaching[end] for end in by_end))
+    through = {end for end in by_end if any(end in reaching[other] for other in by_end if other != end)}
+    depths = [targets[i][2] for indexes in by_end.values() for i in indexes]
+    max_depth = None if None in depths else max(depths)
+    # the enumeration stops once every target has its max_paths paths
+    open_targets = sum(len(indexes) for indexes in by_end.values())
+    if any(targets[i][1] is None for indexes in by_end.values() for i in indexes):
+        open_targets = None
+
+    for path in iter_dfs_paths_to_any(graph, start, by_end, through, allowed, max_depth, stats):
+        for i in by_end[path[-1]]:
+            _, max_paths, depth = targets[i]
+            if (depth is None or len(path) <= depth + 1) and (max_paths is None or len(found[i]) < max_paths):
+                found[i].append(path)
+                if open_targets is not None and len(found[i]) == max_paths:
+                    open_targets -= 1
+        if open_targets == 0:
+            break
+    return found
+
+def find_cheapest_path(graph, start, end, cache=None, stats=None):
     try:
+        if cache is not None:
+            return cache.path(graph, start, end, stats)
+        if isinstance(graph, CSRGraph) or stats is not None:
+            # the same path nx.dijkstra_path finds, with the work counted
+            return dijkstra_path(graph, start, end, stats)
         path = nx.dijkstra_path(graph, start, end)
         return path
     except nx.NetworkXNoPath:
@@ -87,36 +347,227 @@ def find_cheapest_path(graph, start, end):
 
 
 
-def process_queries(queries, graph):
+def _record_stats(query, query_type, answer, stats, started, hook):
+    stats.wall_time = time.perf_counter() - started
+    answer["stats"] = stats.as_dict()
+    metrics.observe(query_type, stats)
+    if hook is not None:
+        hook(query, answer, stats)
+    return answer["stats"]
+
+
+def _stream_paths(paths, stats):
+    for path in paths:
+        stats.add_paths([path])
+        yield path
+
+
+def _answer(query, query_type, fields, graph, collect_stats, hook, stream_paths):
+    """The answer to the query_type block of query, see iter_answers."""
+    stats = QueryStats() if collect_stats else None
+    started = time.perf_counter()
+    query_graph, path_trees = select_graph(graph, fields)
+    start = fields["start"]
+    end = fields["end"]
+    if query_type == "paths":
+        max_paths = fields.get("max_paths")
+        max_depth = fields.get("max_depth")
+        if isinstance(query_graph, SqlQueryBackend):
+            paths = query_graph.find_all_paths(start, end, max_paths, max_depth)
+        elif unreachable(query_graph, start, end):
+            paths = []
+        elif stream_paths:
+            paths = iter_all_paths(query_graph, start, end, max_paths, max_depth, stats)
+        else:
+            paths = find_all_paths(query_graph, start, end, max_paths, max_depth, stats)
+        answer = {"from": start, "to": end, "paths": paths}
+        if stats is not None and stream_paths:
+            answer["paths"] = _stream_paths(paths, stats)
+            answer["stats"] = partial(_record_stats, query, "paths", answer, stats, started, hook)
+        elif stats is not None:
+            stats.add_paths(paths)
+            _record_stats(query, "paths", answer, stats, started, hook)
+    elif query_type == "cheapest":
+        algorithm = fields.get("algorithm")
+        if isinstance(query_graph, SqlQueryBackend):
+            path = query_graph.find_cheapest_path(start, end)
+            answer = {"from": start, "to": end, "path": path or False}
+        elif unreachable(query_graph, start, end):
+            path = None
+            answer = {"from": start, "to": end, "path": False}
+        elif algorithm is None and cheapest_algorithm == "dijkstra":
+            path = find_cheapest_path(query_graph, start, end, path_trees, stats)
+            answer = {"from": start, "to": end, "path": path or False}
+        else:
+            path, settled = cheapest_path(query_graph, start, end, algorithm or cheapest_algorithm,
+                                          stats)
+            answer = {"from": start, "to": end, "path": path or False}
+            if algorithm is not None:
+                # an explicitly chosen algorithm reports its work
+                answer["settled"] = settled
+        if stats is not None:
+            stats.add_paths([path] if path else [])
+            _record_stats(query, "cheapest", answer, stats, started, hook)
+    elif query_type == "cheapest_k":
+        k = fields["k"]
+        if isinstance(query_graph, SqlQueryBackend):
+            paths = query_graph.find_cheapest_paths(start, end, k)
+        elif unreachable(query_graph, start, end):
+            paths = []
+        else:
+            paths = k_cheapest_paths(query_graph, start, end, k, path_trees, stats)
+        answer = {"from": start, "to": end, "paths": [{"path": path, "cost": cost} for cost, path in paths]}
+        if stats is not None:
+            stats.add_paths(path for _, path in paths)
+            _record_stats(query, "cheapest_k", answer, stats, started, hook)
+    elif query_type == "reachable":
+        if isinstance(query_graph, SqlQueryBackend):
+            reachable = query_graph.reachable(start, end)
+        else:
+            reachable = is_reachable(query_graph, start, end, stats)
+        answer = {"from": start, "to": end, "reachable": reachable}
+        if stats is not None:
+            _record_stats(query, "reachable", answer, stats, started, hook)
+    return answer
+
+
+def _answer_group(plan, leader, graph, collect_stats, hook):
+    """
+    Answers to the steps of the group of leader, {step: answer}, from one shortest path tree or one
+    path enumeration. The shared search is counted in the stats of the leader.
+    """
+    members = plan.groups[leader]
+    _, query_type, fields = plan.steps[leader]
+    query_graph, path_trees = select_graph(graph, fields)
+    if isinstance(query_graph, SqlQueryBackend):
+        return {i: _answer(*plan.steps[i], graph, collect_stats, hook, False) for i in members}
+
+    start = fields["start"]
+    shared = QueryStats() if collect_stats else None
+    started = time.perf_counter()
+    if query_type == "cheapest":
+        distances, predecessors = path_trees.tree(query_graph, start, shared)
+        found = [[restore_path(predecessors, end)] if end in distances else []
+                 for end in (plan.steps[i][2]["end"] for i in members)]
+    else:
+        targets = []
+        for i in members:
+            end = plan.steps[i][2]["end"]
+            max_paths = 0 if unreachable(query_graph, start, end) else plan.steps[i][2].get("max_paths")
+            targets.append((end, max_paths, plan.steps[i][2].get("max_depth")))
+        found = find_all_paths_from(query_graph, start, targets, shared)
+
+    answers = {}
+    for i, paths in zip(members, found):
+        query, _, fields = plan.steps[i]
+        if query_type == "cheapest":
+            answer = {"from": start, "to": fields["end"], "path": paths[0] if paths else False}
+        else:
+            answer = {"from": start, "to": fields["end"], "paths": paths}
+        stats = shared if i == leader else QueryStats() if collect_stats else None
+        if stats is not None:
+            stats.add_paths(paths)
+            _record_stats(query, query_type, answer, stats, started, hook)
+            started = time.perf_counter()
+        answers[i] = answer
+    return answers
+
+
+def iter_answers(queries, graph, collect_stats=query_stats, hook=None, stream_paths=False, plan=query_planner):
+    """
+    The answers of process_queries one at a time, each one computed when it is asked for.
+    With plan the batch is answered by plan_queries: identical queries share one answer, stats
+    included, and queries grouped on one start are answered together when the first of them is
+    reached. With stream_paths the paths of a "paths" answer are an iterator finding them while
+    they are written, and its "stats" block a function that records the stats once they are
+    consumed (see query_output.write_answers).
+    """
+    collect_stats = collect_stats or hook is not None
+    plan = plan_queries(queries, share_paths=not stream_paths) if plan else unplanned(queries)
+    if query_plan_debug:
+        print(plan.summary(), file=sys.stderr)
+
+    # answers still to be given to a later step
+    answers = {}
+    uses = Counter(plan.first)
+    for i, (query, query_type, fields) in enumerate(plan.steps):
+        source = plan.first[i]
+        if source not in answers:
+            if source in plan.groups:
+                answers.update(_answer_group(plan, source, graph, collect_stats, hook))
+            else:
+                answers[source] = _answer(query, query_type, fields, graph, collect_stats, hook, stream_paths)
+        answer = answers[source]
+        uses[source] -= 1
+        if uses[source] == 0:
+            del answers[source]
+        yield {query_type: answer}
+
+
+def process_queries(queries, graph, collect_stats=query_stats, hook=None, plan=query_planner):
+    """
+    Answer "paths", "cheapest", "cheapest_k" and "reachable" queries on graph, a single graph or a
+    GraphCache picking one by the "graph" field of each query. With a reachability index "paths"
+    and cheapest queries are answered without searching when end can't be reached from start.
+    With collect_stats, or a hook, every answer gets a "stats" block with the wall time, nodes
+    expanded, edges relaxed, paths produced and peak path length of its query, the stats are added
+    to metrics and hook(query, answer, stats) is called after each query. Without them the searches
+    run uninstrumented. With plan the batch is planned first, see iter_answers.
+    """
     try:
-        answers = []
-
-        for query in queries:
-            if "paths" in query:
-                start = query["paths"]["start"]
-                end = query["paths"]["end"]
-                paths = find_all_paths(graph, start, end)
-                answers.append({"paths": {"from": start, "to": end, "paths": paths}})
-            if "cheapest" in query:
-                start = query["cheapest"]["start"]
-                end = query["cheapest"]["end"]
-                cheapest_path = find_cheapest_path(graph, start, end)
-                answers.append({"cheapest": {"from": start, "to": end, "path": cheapest_path or False}})
-
-        result = {"answers": answers}
-        return result
+        return {"answers": list(iter_answers(queries, graph, collect_stats, hook, plan=plan))}
     except Exception as e:
         print("An error occurred:", e)
 
 
-if __name__ == "__main__":
+def main():
+    # Graphs are loaded when first queried, the default one right away
+    known = partial(graph_ids, dsn)
+    if query_backend == "sql":
+        graph = GraphCache(lambda graph_id: SqlQueryBackend(dsn, graph_id), known=known)
+    else:
+        graph = GraphCache(lambda graph_id: create_graph_from_database(dsn, graph_id=graph_id), known=known)
+    try:
+        graph.get(default_graph)
+    except ValueError as e:
+        # queries naming an existing graph are still answered
+        print(f"{e}, queries without a graph will fail", file=sys.stderr)
 
-    graph = create_graph_from_database(dsn)
+    if "--serve" in sys.argv[1:]:
+        # Keep the graph in memory and answer newline-delimited JSON queries, see query_server.py
+        from query_server import serve
+        asyncio.run(serve(graph))
+        return
 
     try:
         input_data = json.load(sys.stdin)
         queries = input_data.get("queries", [])
-        result = process_queries(queries, graph)
-        print(json.dumps(result, indent=2))
+        if output_format != "indent":
+            from query_output import write_answers
+        if query_processes > 1:
+            from parallel_queries import ParallelQueryExecutor
+            # the pool shares one graph, queries of other graphs fail
+            with ParallelQueryExecutor(graph.get(default_graph)[0]) as executor:
+                if output_format == "indent":
+                    print(json.dumps(executor.process_queries(queries), indent=2))
+                else:
+                    write_answers(executor.iter_answers(queries), sys.stdout, output_format)
+        elif output_format == "indent":
+            print(json.dumps(process_queries(queries, graph), indent=2))
+        else:
+            # answers and paths are written as they are found, none of them is kept
+            write_answers(iter_answers(queries, graph, stream_paths=True), sys.stdout, output_format)
+        if query_metrics_path:
+            metrics.write_prometheus(query_metrics_path)
     except json.JSONDecodeError:
         print("Invalid JSON input.")
+    except ValueError as e:
+        # the default graph of the executor pool doesn't exist
+        print("An error occurred:", e)
+
+
+if __name__ == "__main__":
+    # Run the imported module, so the query server and the executors see the same GraphCache class,
+    # path tree cache and metrics as the queries answered here
+    import query_my_graph
+    query_my_graph.main()
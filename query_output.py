@@ -0,0 +1,68 @@
+import json
+from collections.abc import Iterator
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _write_value(value, write):
+    """
+    Write value as compact JSON. Iterators are written as arrays item by item while they produce them,
+    functions in a dict are called for the value to write, so they can depend on the items before them.
+    """
+    if isinstance(value, dict):
+        write("{")
+        try:
+            for i, (key, item) in enumerate(value.items()):
+                if callable(item):
+                    item = item()
+                write(("," if i else "") + _dumps(str(key)) + ":")
+                _write_value(item, write)
+        finally:
+            # an error leaves the document truncated but balanced
+            write("}")
+    elif isinstance(value, Iterator):
+        write("[")
+        try:
+            for i, item in enumerate(value):
+                write(("," if i else "") + _dumps(item))
+        finally:
+            write("]")
+    else:
+        write(_dumps(value))
+
+
+def write_answers(answers, out, output_format="json"):
+    """
+    Write answers, any iterable of the answers of query_my_graph.iter_answers, to out while they
+    are produced and flush after each one. "json" writes the {"answers": [...]} document of
+    process_queries in compact JSON, "ndjson" one answer per line. Returns False when a query
+    failed, the answers written so far are then followed by an "error" member of the envelope,
+    or an {"error": ...} line in NDJSON.
+    """
+    if output_format not in ("json", "ndjson"):
+        raise ValueError(f"Unknown streaming output format: {output_format}")
+    ndjson = output_format == "ndjson"
+    try:
+        if not ndjson:
+            out.write('{"answers":[')
+        try:
+            for i, answer in enumerate(answers):
+                try:
+                    if i and not ndjson:
+                        out.write(",")
+                    _write_value(answer, out.write)
+                finally:
+                    if ndjson:
+                        out.write("\n")
+                out.flush()
+        finally:
+            if not ndjson:
+                out.write("]")
+    except Exception as e:
+        out.write(_dumps({"error": str(e)}) + "\n" if ndjson else ',"error":' + _dumps(str(e)) + "}\n")
+        out.flush()
+        return False
+    if not ndjson:
+        out.write("}\n")
+    out.flush()
+    return True
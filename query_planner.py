@@ -0,0 +1,65 @@
+import json
+
+from app_config import cheapest_algorithm, default_graph
+
+# The blocks of one query, in the order they are answered
+QUERY_TYPES = ("paths", "cheapest", "cheapest_k", "reachable")
+
+
+class QueryPlan:
+    """
+    How a batch of queries is answered. steps lists (query, query type, fields) in answer order,
+    first[i] is the step whose answer step i gets, i itself or an earlier identical step, and
+    groups maps the first step of a group to all of its steps, whose searches run as one.
+    """
+
+    def __init__(self, steps, first, groups):
+        self.steps = steps
+        self.first = first
+        self.groups = groups
+
+    def summary(self):
+        duplicates = sum(1 for i, source in enumerate(self.first) if source != i)
+        parts = [f"query plan: {len(self.steps)} answers, {duplicates} copied from an identical query"]
+        for query_type, search in (("cheapest", "shortest path trees"), ("paths", "path enumerations")):
+            groups = [members for leader, members in self.groups.items() if self.steps[leader][1] == query_type]
+            queries = sum(len(members) for members in groups)
+            parts.append(f"{queries} {query_type} queries answered by {len(groups)} {search}")
+        return ", ".join(parts)
+
+
+def query_steps(queries):
+    """(query, query type, fields) of every block of queries, in answer order."""
+    return [(query, query_type, query[query_type]) for query in queries
+            for query_type in QUERY_TYPES if query_type in query]
+
+
+def unplanned(queries):
+    """The plan answering every block of queries on its own."""
+    steps = query_steps(queries)
+    return QueryPlan(steps, list(range(len(steps))), {})
+
+
+def plan_queries(queries, share_paths=True):
+    """
+    Plan of a batch. Identical query blocks are answered once, "cheapest" queries on plain Dijkstra
+    from one start on one graph are grouped to share one shortest path tree, and with share_paths
+    "paths" queries from one start to share one depth-first enumeration. Without share_paths
+    "paths" queries are neither grouped nor deduplicated, so their answers can be streamed.
+    """
+    steps = query_steps(queries)
+    first = []
+    seen = {}
+    groups = {}
+    leaders = {}
+    for i, (_, query_type, fields) in enumerate(steps):
+        key = (query_type, json.dumps(fields, sort_keys=True))
+        first.append(seen.setdefault(key, i) if share_paths or query_type != "paths" else i)
+        if first[i] != i:
+            continue
+        # the cheapest queries answered from the shortest path tree cache
+        dijkstra = fields.get("algorithm") is None and cheapest_algorithm == "dijkstra"
+        if (query_type == "cheapest" and dijkstra) or (query_type == "paths" and share_paths):
+            leader = leaders.setdefault((query_type, fields.get("graph", default_graph), fields.get("start")), i)
+            groups.setdefault(leader, []).append(i)
+    return QueryPlan(steps, first, {leader: members for leader, members in groups.items() if len(members) > 1})
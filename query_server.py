@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from app_config import server_host, server_port, server_socket, query_metrics_path
+from query_my_graph import process_queries, metrics
+
+
+def answer_line(line, graph):
+    """
+    Answer one newline-delimited request, a JSON document in the same {"queries": [...]}
+    format query_my_graph.py reads from stdin. Returns the response line without the newline.
+    """
+    try:
+        input_data = json.loads(line)
+    except json.JSONDecodeError:
+        return "Invalid JSON input."
+
+    queries = input_data.get("queries", [])
+    response = json.dumps(process_queries(queries, graph))
+    if query_metrics_path:
+        metrics.write_prometheus(query_metrics_path)
+    return response
+
+
+async def handle_client(reader, writer, graph):
+    loop = asyncio.get_running_loop()
+    try:
+        while line := await reader.readline():
+            if not line.strip():
+                continue
+            # Searches are CPU bound, run them off the event loop so other clients keep being served
+            response = await loop.run_in_executor(None, answer_line, line.decode("utf-8"), graph)
+            writer.write(response.encode("utf-8") + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(graph, host=server_host, port=server_port, unix_path=server_socket):
+    """Start listening on unix_path when it is set, on host:port otherwise."""
+    async def client_connected(reader, writer):
+        await handle_client(reader, writer, graph)
+
+    if unix_path:
+        return await asyncio.start_unix_server(client_connected, path=unix_path)
+    return await asyncio.start_server(client_connected, host=host, port=port)
+
+
+async def serve(graph, host=server_host, port=server_port, unix_path=server_socket):
+    server = await start_server(graph, host, port, unix_path)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    print(f"Serving graph queries on {addresses}")
+    async with server:
+        await server.serve_forever()
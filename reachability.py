@@ -0,0 +1,125 @@
+from cycle_analysis import strongly_connected_components
+
+
+class ReachabilityIndex:
+    """
+    Answers whether start can reach end on the condensation of a graph, the DAG of its strongly
+    connected components. Components are numbered in the reverse topological order Tarjan's
+    algorithm lists them in, so a component only reaches components numbered lower, and every
+    component carries the interval labels [low, post] of two depth-first post-orders: the intervals
+    of a reachable component lie inside the ones of the component reaching it. Most unreachable
+    pairs fail one of those tests in constant time.
+    The pairs that pass are settled by the transitive closure when it fits in max_bytes, kept per
+    component as a bitset of the components it reaches shifted down by the lowest of them, otherwise
+    by a depth-first search that only enters components whose intervals still contain the end.
+    """
+
+    def __init__(self, component_of, successors, labels, closure=None):
+        self.component_of = component_of
+        self.successors = successors
+        # low of the Tarjan order (post is the component number), post and low of the second order
+        self.low, self.post2, self.low2 = labels
+        self.closure = closure
+
+    @classmethod
+    def build(cls, graph, max_bytes=None):
+        """Index of graph, any graph with successors(). max_bytes caps the closure, None doesn't keep one."""
+        components = strongly_connected_components(graph)
+        component_of = {node: index for index, component in enumerate(components) for node in component}
+        successors = []
+        for index, component in enumerate(components):
+            targets = {component_of[neighbor] for node in component for neighbor in graph.successors(node)}
+            targets.discard(index)
+            successors.append(tuple(sorted(targets)))
+
+        labels = _interval_labels(successors)
+        closure = _closure(successors, max_bytes) if max_bytes else None
+        return cls(component_of, successors, labels, closure)
+
+    def _may_reach(self, source, target):
+        return (target < source and self.low[source] <= self.low[target]
+                and self.post2[target] < self.post2[source] and self.low2[source] <= self.low2[target])
+
+    def reachable(self, start, end, stats=None):
+        """True when a path leads from start to end, a node reaches itself. Unknown nodes reach nothing."""
+        source = self.component_of.get(start)
+        target = self.component_of.get(end)
+        if source is None or target is None:
+            return False
+        if source == target:
+            return True
+        if not self._may_reach(source, target):
+            return False
+        if self.closure is not None:
+            offset, bits = self.closure[source]
+            return target >= offset and (bits >> (target - offset)) & 1 == 1
+        return self._search(source, target, stats)
+
+    def _search(self, source, target, stats):
+        seen = {source}
+        stack = [source]
+        while stack:
+            successors = self.successors[stack.pop()]
+            if stats is not None:
+                stats.nodes_expanded += 1
+                stats.edges_relaxed += len(successors)
+            for successor in successors:
+                if successor == target:
+                    return True
+                if successor not in seen and self._may_reach(successor, target):
+                    seen.add(successor)
+                    stack.append(successor)
+        return False
+
+
+def _interval_labels(successors):
+    """(low, post2, low2) where low[c] is the lowest post-order number below c, for two post-orders."""
+    count = len(successors)
+
+    # The Tarjan numbering is one post-order, the second one visits roots and successors in reverse
+    post2 = [None] * count
+    number = 0
+    for root in reversed(range(count)):
+        if post2[root] is not None:
+            continue
+        post2[root] = -1
+        work = [(root, iter(reversed(successors[root])))]
+        while work:
+            component, remaining = work[-1]
+            for successor in remaining:
+                if post2[successor] is None:
+                    post2[successor] = -1
+                    work.append((successor, iter(reversed(successors[successor]))))
+                    break
+            else:
+                work.pop()
+                post2[component] = number
+                number += 1
+
+    # successors are numbered lower, so they are labelled first
+    low, low2 = list(range(count)), list(post2)
+    for component, targets in enumerate(successors):
+        for successor in targets:
+            if low[successor] < low[component]:
+                low[component] = low[successor]
+            if low2[successor] < low2[component]:
+                low2[component] = low2[successor]
+    return low, post2, low2
+
+
+def _closure(successors, max_bytes):
+    """[(offset, bits)] with bit c - offset set for every component c reached, None past max_bytes."""
+    closure = []
+    total = 0
+    for targets in successors:
+        reached = 0
+        for successor in targets:
+            offset, bits = closure[successor]
+            reached |= (bits << offset) | (1 << successor)
+        offset = (reached & -reached).bit_length() - 1 if reached else 0
+        bits = reached >> offset
+        total += bits.bit_length() // 8 + 1
+        if total > max_bytes:
+            return None
+        closure.append((offset, bits))
+    return closure
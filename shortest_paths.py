@@ -0,0 +1,410 @@
+from collections import OrderedDict
+from heapq import heappush, heappop
+from itertools import count
+from threading import Lock
+
+import networkx as nx
+
+from csr_graph import weighted_successors, weighted_predecessors
+from query_metrics import counting
+
+ALGORITHMS = ("dijkstra", "bidirectional", "alt", "ch")
+
+
+def single_source_dijkstra(graph, start, target=None, reverse=False, stats=None):
+    """
+    Dijkstra from start over any graph with weighted successors, returns (distances, predecessors).
+    Ties are broken the same way nx.dijkstra_path breaks them, so the paths are identical.
+    When target is given the search stops as soon as target is settled.
+    With reverse=True edges are followed backwards and distances are the costs to reach start.
+    Settled nodes and their edges are counted in stats when a QueryStats is given.
+    """
+    neighbors = weighted_predecessors if reverse else weighted_successors
+    if stats is not None:
+        neighbors = counting(neighbors, stats)
+    if start not in graph:
+        raise nx.NodeNotFound(f"Node {start} not found in graph")
+
+    distances = {}
+    seen = {start: 0}
+    predecessors = {start: None}
+    c = count()
+    fringe = [(0, next(c), start)]
+
+    while fringe:
+        distance, _, node = heappop(fringe)
+        if node in distances:
+            continue
+        distances[node] = distance
+        if node == target:
+            break
+
+        for neighbor, cost in neighbors(graph, node):
+            neighbor_distance = distance + cost
+            if neighbor not in distances and (neighbor not in seen or neighbor_distance < seen[neighbor]):
+                seen[neighbor] = neighbor_distance
+                predecessors[neighbor] = node
+                heappush(fringe, (neighbor_distance, next(c), neighbor))
+
+    return distances, predecessors
+
+
+def restore_path(predecessors, end):
+    path = [end]
+    while (node := predecessors[path[-1]]) is not None:
+        path.append(node)
+    path.reverse()
+    return path
+
+
+def dijkstra_path(graph, start, end, stats=None):
+    distances, predecessors = single_source_dijkstra(graph, start, end, stats=stats)
+    if end not in distances:
+        raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+    return restore_path(predecessors, end)
+
+
+def bidirectional_dijkstra(graph, start, end):
+    """
+    Point-to-point Dijkstra growing a forward search from start and a backward one from end,
+    always expanding the side with the smaller tentative distance. Returns (path, settled)
+    where path is None when end can't be reached and settled counts the nodes settled by both sides.
+    The cost is the same as dijkstra_path, among equally cheap paths another one may be returned.
+    """
+    for node in (start, end):
+        if node not in graph:
+            raise nx.NodeNotFound(f"Node {node} not found in graph")
+    if start == end:
+        return [start], 1
+
+    neighbors = (weighted_successors, weighted_predecessors)
+    distances = ({}, {})
+    seen = ({start: 0}, {end: 0})
+    predecessors = ({start: None}, {end: None})
+    c = count()
+    fringes = ([(0, next(c), start)], [(0, next(c), end)])
+    best, meeting, settled = float("inf"), None, 0
+
+    while fringes[0] and fringes[1]:
+        # no path through unsettled nodes can be cheaper than the best meeting found so far
+        if fringes[0][0][0] + fringes[1][0][0] >= best:
+            break
+
+        direction = 0 if fringes[0][0][0] <= fringes[1][0][0] else 1
+        distance, _, node = heappop(fringes[direction])
+        if node in distances[direction]:
+            continue
+        distances[direction][node] = distance
+        settled += 1
+
+        other_seen = seen[1 - direction]
+        for neighbor, cost in neighbors[direction](graph, node):
+            neighbor_distance = distance + cost
+            if neighbor in distances[direction]:
+                continue
+            if neighbor not in seen[direction] or neighbor_distance < seen[direction][neighbor]:
+                seen[direction][neighbor] = neighbor_distance
+                predecessors[direction][neighbor] = node
+                heappush(fringes[direction], (neighbor_distance, next(c), neighbor))
+                if neighbor in other_seen and neighbor_distance + other_seen[neighbor] < best:
+                    best = neighbor_distance + other_seen[neighbor]
+                    meeting = neighbor
+
+    if meeting is None:
+        return None, settled
+
+    path = restore_path(predecessors[0], meeting)
+    node = predecessors[1][meeting]
+    while node is not None:
+        path.append(node)
+        node = predecessors[1][node]
+    return path, settled
+
+
+class LandmarkIndex:
+    """
+    Distance tables of a few landmark nodes for A* with landmarks (ALT).
+    By the triangle inequality d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L)
+    for every landmark L, the largest of those bounds is an admissible and consistent heuristic.
+    """
+
+    def __init__(self, landmarks, from_landmark, to_landmark):
+        self.landmarks = landmarks
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+
+    @classmethod
+    def build(cls, graph, count):
+        """
+        Pick count landmarks by farthest selection: every new landmark is the node farthest
+        from the ones already picked, nodes they can't reach at all come first.
+        """
+        landmarks, from_landmark, to_landmark = [], [], []
+        nearest = dict.fromkeys(graph, float("inf"))
+        candidate = next(iter(graph), None)
+
+        while candidate is not None and len(landmarks) < count:
+            landmarks.append(candidate)
+            from_landmark.append(single_source_dijkstra(graph, candidate)[0])
+            to_landmark.append(single_source_dijkstra(graph, candidate, reverse=True)[0])
+
+            nearest.pop(candidate)
+            for node, distance in from_landmark[-1].items():
+                if distance < nearest.get(node, -1):
+                    nearest[node] = distance
+            candidate = max(nearest, key=nearest.get, default=None)
+
+        return cls(landmarks, from_landmark, to_landmark)
+
+    def heuristic(self, target):
+        """Returns h(node), the lower bound on the cost from node to target."""
+        bounds = [(from_l, from_l.get(target), to_l, to_l.get(target))
+                  for from_l, to_l in zip(self.from_landmark, self.to_landmark)]
+
+        def h(node):
+            best = 0
+            for from_l, landmark_to_target, to_l, target_to_landmark in bounds:
+                landmark_to_node = from_l.get(node)
+                if landmark_to_target is not None and landmark_to_node is not None:
+                    best = max(best, landmark_to_target - landmark_to_node)
+                node_to_landmark = to_l.get(node)
+                if node_to_landmark is not None and target_to_landmark is not None:
+                    best = max(best, node_to_landmark - target_to_landmark)
+            return best
+
+        return h
+
+
+def astar_landmarks(graph, start, end, landmarks=None):
+    """
+    A* guided by a LandmarkIndex, returns (path, settled) like bidirectional_dijkstra.
+    Without landmarks the heuristic is 0 and this is a plain point-to-point Dijkstra.
+    """
+    for node in (start, end):
+        if node not in graph:
+            raise nx.NodeNotFound(f"Node {node} not found in graph")
+
+    h = landmarks.heuristic(end) if landmarks is not None else (lambda node: 0)
+    distances = {start: 0}
+    predecessors = {start: None}
+    settled = set()
+    c = count()
+    fringe = [(h(start), next(c), start)]
+
+    while fringe:
+        _, _, node = heappop(fringe)
+        if node in settled:
+            continue
+        settled.add(node)
+        if node == end:
+            return restore_path(predecessors, end), len(settled)
+
+        distance = distances[node]
+        for neighbor, cost in weighted_successors(graph, node):
+            neighbor_distance = distance + cost
+            if neighbor not in settled and neighbor_distance < distances.get(neighbor, float("inf")):
+                distances[neighbor] = neighbor_distance
+                predecessors[neighbor] = node
+                heappush(fringe, (neighbor_distance + h(neighbor), next(c), neighbor))
+
+    return None, len(settled)
+
+
+def cheapest_path(graph, start, end, algorithm="dijkstra", stats=None):
+    """
+    Cheapest path with the chosen algorithm, returns (path, settled) where path is None when
+    end can't be reached. "alt" uses the LandmarkIndex stored in graph.graph["landmarks"]
+    and "ch" the ContractionHierarchy stored in graph.graph["ch"]. The work is counted in stats
+    when a QueryStats is given.
+    """
+    if algorithm == "dijkstra":
+        if end not in graph:
+            raise nx.NodeNotFound(f"Node {end} not found in graph")
+        distances, predecessors = single_source_dijkstra(graph, start, end, stats=stats)
+        path = restore_path(predecessors, end) if end in distances else None
+        return path, len(distances)
+    if algorithm == "bidirectional":
+        path, settled = bidirectional_dijkstra(graph, start, end)
+    elif algorithm == "alt":
+        path, settled = astar_landmarks(graph, start, end, graph.graph.get("landmarks"))
+    elif algorithm == "ch":
+        hierarchy = graph.graph.get("ch")
+        if hierarchy is None:
+            raise ValueError("No contraction hierarchy is loaded, build one with: python contraction_hierarchy.py")
+        path, settled = hierarchy.query(start, end)
+    else:
+        raise ValueError(f"Unknown cheapest path algorithm: {algorithm}")
+    if stats is not None:
+        # only plain Dijkstra counts edges, the other algorithms report the nodes they settled
+        stats.nodes_expanded += settled
+    return path, settled
+
+
+def _tree_tail(node, next_hops, blocked_nodes, open_tails):
+    """
+    The path from node to the end along the reverse tree, None when it takes a blocked node.
+    open_tails remembers for the nodes walked whether their tree paths are open, so each spur
+    search walks every tree edge at most once.
+    """
+    walked = []
+    hop = next_hops[node]
+    while hop is not None and hop not in open_tails and hop not in blocked_nodes:
+        walked.append(hop)
+        hop = next_hops[hop]
+    is_open = hop is None or (hop not in blocked_nodes and open_tails[hop])
+    for hop in walked:
+        open_tails[hop] = is_open
+    if not is_open:
+        return None
+    tail = [node]
+    while (hop := next_hops[tail[-1]]) is not None:
+        tail.append(hop)
+    return tail
+
+
+def _spur_path(graph, spur, blocked_nodes, blocked_edges, tree, neighbors):
+    """
+    Cheapest path from spur to the end of the reverse tree that doesn't enter blocked_nodes, the root
+    up to and with spur, nor take blocked_edges, as (cost, path), None without one. An A* search whose estimates are the exact costs of the
+    tree, blocking only makes paths dearer, and it stops at the first node whose tree path is
+    still open: nothing left in the fringe can beat it. Most spurs stop at the spur node itself.
+    """
+    to_end, next_hops = tree
+    open_tails = {}
+    distances = {spur: 0}
+    predecessors = {spur: None}
+    settled = set()
+    c = count()
+    fringe = [(to_end[spur], next(c), spur)]
+
+    while fringe:
+        _, _, node = heappop(fringe)
+        if node in settled:
+            continue
+        settled.add(node)
+        tail = None
+        if node != spur or (spur, next_hops[spur]) not in blocked_edges:
+            tail = _tree_tail(node, next_hops, blocked_nodes, open_tails)
+        if tail is not None:
+            path = restore_path(predecessors, node) + tail[1:]
+            # with zero cost edges the tail may come back to the way here
+            if len(set(path)) == len(path):
+                return distances[node] + to_end[node], path
+
+        for neighbor, cost in neighbors(graph, node):
+            if (neighbor in settled or neighbor in blocked_nodes or neighbor not in to_end
+                    or (node == spur and (spur, neighbor) in blocked_edges)):
+                continue
+            neighbor_distance = distances[node] + cost
+            if neighbor_distance < distances.get(neighbor, float("inf")):
+                distances[neighbor] = neighbor_distance
+                predecessors[neighbor] = node
+                heappush(fringe, (neighbor_distance + to_end[neighbor], next(c), neighbor))
+    return None
+
+
+def k_cheapest_paths(graph, start, end, k, cache=None, stats=None):
+    """
+    The k cheapest simple paths from start to end as [(cost, path)] in ascending cost, fewer when
+    there aren't k. Yen's algorithm: every next path leaves one of the last path's prefixes (its root)
+    by an edge no cheaper path took from there. All spur searches share one reverse Dijkstra tree
+    from end, taken from cache when given, which guides them and finishes them wherever its paths
+    avoid the root. The work is counted in stats when a QueryStats is given.
+    """
+    if start not in graph:
+        raise nx.NodeNotFound(f"Node {start} not found in graph")
+    tree = cache.tree(graph, end, stats, reverse=True) if cache is not None \
+        else single_source_dijkstra(graph, end, reverse=True, stats=stats)
+    if k <= 0 or start not in tree[0]:
+        return []
+    neighbors = weighted_successors if stats is None else counting(weighted_successors, stats)
+
+    paths = [(tree[0][start], _tree_tail(start, tree[1], (), {}))]
+    found = {tuple(paths[0][1])}
+    candidates = []
+    c = count()
+    while len(paths) < k:
+        last = paths[-1][1]
+        root_cost = 0
+        root = set()
+        # the paths found so far that start with the root
+        sharing = [path for _, path in paths]
+        for i, spur in enumerate(last[:-1]):
+            root.add(spur)
+            sharing = [path for path in sharing if path[i] == spur]
+            blocked_edges = {(spur, path[i + 1]) for path in sharing}
+            spur_path = _spur_path(graph, spur, root, blocked_edges, tree, neighbors)
+            if spur_path is not None:
+                path = last[:i] + spur_path[1]
+                if tuple(path) not in found:
+                    found.add(tuple(path))
+                    heappush(candidates, (root_cost + spur_path[0], next(c), path))
+            root_cost += dict(weighted_successors(graph, spur))[last[i + 1]]
+        if not candidates:
+            break
+        cost, _, path = heappop(candidates)
+        paths.append((cost, path))
+    return paths
+
+
+class ShortestPathTreeCache:
+    """
+    Size-bounded LRU cache of single-source Dijkstra trees keyed by start node and direction.
+    A cached (distances, predecessors) tree answers cheapest paths from its start to every node,
+    a reverse one the costs of every node to its start.
+    The cache belongs to one graph at a time, it is emptied when it is used with another graph or
+    with its graph at another graph.graph["version"] or "changes_snapshot" (sync_graph moves them on),
+    and must be cleared when the graph it holds trees for is changed in any other way.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._graph = None
+        self._version = None
+        self._trees = OrderedDict()
+        # the query server answers from several threads
+        self._lock = Lock()
+
+    def clear(self):
+        with self._lock:
+            self._graph = None
+            self._version = None
+            self._trees.clear()
+
+    def __len__(self):
+        return len(self._trees)
+
+    def tree(self, graph, start, stats=None, reverse=False):
+        key = (start, reverse)
+        version = (graph.graph.get("version"), graph.graph.get("changes_snapshot"))
+        with self._lock:
+            if graph is not self._graph or version != self._version:
+                self._trees.clear()
+                self._graph = graph
+                self._version = version
+
+            tree = self._trees.get(key)
+            if tree is not None:
+                self.hits += 1
+                self._trees.move_to_end(key)
+                return tree
+            self.misses += 1
+
+        tree = single_source_dijkstra(graph, start, reverse=reverse, stats=stats)
+        with self._lock:
+            if self.maxsize > 0 and graph is self._graph and version == self._version:
+                self._trees[key] = tree
+                if len(self._trees) > self.maxsize:
+                    self._trees.popitem(last=False)
+        return tree
+
+    def path(self, graph, start, end, stats=None):
+        distances, predecessors = self.tree(graph, start, stats)
+        if end not in distances:
+            raise nx.NetworkXNoPath(f"Node {end} not reachable from {start}")
+        return restore_path(predecessors, end)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._trees), "maxsize": self.maxsize}
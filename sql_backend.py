@@ -0,0 +1,202 @@
+import networkx as nx
+from sqlalchemy import text
+
+from app_config import default_graph
+from db_client import DatabaseClient
+from shortest_paths import dijkstra_path, k_cheapest_paths
+
+# Every query only reads the rows of graph :graph.
+# Both walks only step onto nodes that can still reach the end node (found backwards through
+# edges(to_node)) and skip a duplicate from -> to edge unless it has the lowest id of its pair,
+# the pair then costs what its highest id edge costs, like nx.DiGraph built from edges in id order.
+# Ordering finished walks by the edge ids they took lists the paths in the order the in-memory
+# depth-first search finds them, its successors come in edge id order as well (iter_edges).
+REACHING = """
+    reaching(node) AS (
+        SELECT CAST(:end AS VARCHAR)
+        UNION
+        SELECT e.from_node FROM reaching r JOIN edges e ON e.graph_id = :graph AND e.to_node = r.node
+    )
+"""
+
+STEP = """
+    FROM walk w
+    JOIN edges e ON e.graph_id = :graph AND e.from_node = w.node
+    CROSS JOIN LATERAL (
+        SELECT l.cost FROM edges l
+        WHERE l.graph_id = e.graph_id AND l.from_node = e.from_node AND l.to_node = e.to_node
+        ORDER BY l.id DESC LIMIT 1
+    ) c
+    WHERE w.node <> :end
+      AND e.to_node <> ALL(w.path)
+      AND e.to_node IN (SELECT node FROM reaching)
+      AND NOT EXISTS (
+          SELECT 1 FROM edges d
+          WHERE d.graph_id = e.graph_id AND d.from_node = e.from_node AND d.to_node = e.to_node AND d.id < e.id
+      )
+      AND (CAST(:max_depth AS INTEGER) IS NULL OR cardinality(w.hops) < :max_depth)
+      AND (CAST(:max_cost AS FLOAT) IS NULL OR w.total_cost + c.cost <= :max_cost)
+"""
+
+WALK = f"""
+    WITH RECURSIVE {REACHING},
+    walk(node, path, hops, total_cost) AS (
+        SELECT CAST(:start AS VARCHAR), ARRAY[CAST(:start AS VARCHAR)], CAST(ARRAY[] AS VARCHAR[]),
+               CAST(0 AS FLOAT)
+        UNION ALL
+        SELECT e.to_node, w.path || e.to_node, w.hops || e.id, w.total_cost + c.cost
+        {STEP}
+    )
+"""
+
+PATHS = WALK + """
+    SELECT path FROM walk WHERE node = :end ORDER BY hops LIMIT :max_paths
+"""
+
+# Cost of the cheapest path from :start to every node it reaches, relaxed in rounds on a temporary
+# table: a round only goes on from the nodes whose cost the previous round lowered, so no walk is ever
+# enumerated. Of duplicate edges only the highest id one counts, as in the walks.
+COSTS_TABLE = """
+    CREATE TEMPORARY TABLE costs (node VARCHAR PRIMARY KEY, cost FLOAT NOT NULL, round INTEGER NOT NULL)
+    ON COMMIT DROP
+"""
+
+COSTS_START = "INSERT INTO costs VALUES (:start, 0, 0)"
+
+RELAX = """
+    INSERT INTO costs (node, cost, round)
+    SELECT e.to_node, min(c.cost + e.cost), :round + 1
+    FROM costs c
+    JOIN edges e ON e.graph_id = :graph AND e.from_node = c.node
+    WHERE c.round = :round
+      AND NOT EXISTS (
+          SELECT 1 FROM edges d
+          WHERE d.graph_id = e.graph_id AND d.from_node = e.from_node AND d.to_node = e.to_node AND d.id > e.id
+      )
+    GROUP BY e.to_node
+    ON CONFLICT (node) DO UPDATE SET cost = EXCLUDED.cost, round = EXCLUDED.round
+    WHERE EXCLUDED.cost < costs.cost
+"""
+
+END_COST = "SELECT cost FROM costs WHERE node = :end"
+
+# Edges of every cheapest path, in id order, Dijkstra picks among equally cheap paths on them
+CHEAPEST_EDGES = WALK + """
+    , cheapest AS (
+        SELECT hops FROM walk
+        WHERE node = :end AND total_cost = (SELECT min(total_cost) FROM walk WHERE node = :end)
+    )
+    SELECT e.from_node, e.to_node, c.cost
+    FROM edges e
+    CROSS JOIN LATERAL (
+        SELECT l.cost FROM edges l
+        WHERE l.graph_id = e.graph_id AND l.from_node = e.from_node AND l.to_node = e.to_node
+        ORDER BY l.id DESC LIMIT 1
+    ) c
+    WHERE e.graph_id = :graph AND e.id IN (SELECT unnest(hops) FROM cheapest)
+    ORDER BY e.id
+"""
+
+REACHABLE = f"""
+    WITH RECURSIVE {REACHING}
+    SELECT EXISTS (SELECT 1 FROM reaching WHERE node = :start)
+"""
+
+# Edges between nodes that can reach the end node, every path to it runs on them
+REACHING_EDGES = f"""
+    WITH RECURSIVE {REACHING}
+    SELECT e.from_node, e.to_node, e.cost FROM edges e
+    WHERE e.graph_id = :graph
+      AND e.from_node IN (SELECT node FROM reaching) AND e.to_node IN (SELECT node FROM reaching)
+    ORDER BY e.id
+"""
+
+NODES_PRESENT = "SELECT id FROM nodes WHERE graph_id = :graph AND id IN (:start, :end)"
+
+
+class SqlQueryBackend:
+    """
+    Answers "paths", "cheapest", "cheapest_k" and "reachable" queries inside PostgreSQL with recursive CTEs, for graphs that
+    don't fit in memory. Answers are the ones the in-memory graph gives, only slower to get.
+    Every statement runs on a connection of its own from the engine's pool, so the query server's
+    threads can share one backend.
+    """
+
+    def __init__(self, dsn, graph_id=default_graph):
+        self.graph_id = graph_id
+        self.db_client = DatabaseClient(dsn, graph_id)
+
+    def _execute(self, sql, start, end, max_paths=None, max_depth=None, max_cost=None):
+        parameters = dict(graph=self.graph_id, start=start, end=end, max_paths=max_paths,
+                          max_depth=max_depth, max_cost=max_cost)
+        with self.db_client.engine.connect() as connection:
+            return connection.execute(text(sql), parameters).all()
+
+    def _cheapest_cost(self, start, end):
+        """Cost of the cheapest path from start to end, None without one, see RELAX."""
+        parameters = dict(graph=self.graph_id, start=start, end=end)
+        with self.db_client.engine.begin() as connection:
+            connection.execute(text(COSTS_TABLE))
+            connection.execute(text(COSTS_START), parameters)
+            # costs are not negative, so the rounds stop once none is lowered, at the latest after one per node
+            round_number = 0
+            while connection.execute(text(RELAX), dict(parameters, round=round_number)).rowcount:
+                round_number += 1
+            row = connection.execute(text(END_COST), parameters).first()
+        return None if row is None else row[0]
+
+    def _check_nodes(self, start, end):
+        present = {row[0] for row in self._execute(NODES_PRESENT, start, end)}
+        if start not in present:
+            raise nx.NodeNotFound(f"source node {start} not in graph")
+        return end in present
+
+    def find_all_paths(self, start, end, max_paths=None, max_depth=None):
+        """Simple paths from start to end, in the order and with the limits of find_all_paths."""
+        if not self._check_nodes(start, end):
+            return []
+        rows = self._execute(PATHS, start, end, max_paths=max_paths, max_depth=max_depth)
+        return [list(row[0]) for row in rows]
+
+    def find_cheapest_path(self, start, end):
+        """
+        Cheapest path from start to end, None without one. Paths are only walked while they
+        cost no more than the cheapest cost, found first without walking them.
+        """
+        if not self._check_nodes(start, end):
+            return None
+        if start == end:
+            return [start]
+        bound = self._cheapest_cost(start, end)
+        if bound is None:
+            return None
+
+        subgraph = nx.DiGraph()
+        subgraph.add_weighted_edges_from(
+            self._execute(CHEAPEST_EDGES, start, end, max_cost=bound))
+        return dijkstra_path(subgraph, start, end)
+
+    def find_cheapest_paths(self, start, end, k):
+        """
+        The k cheapest simple paths as [(cost, path)], from k_cheapest_paths run on the edges
+        of the nodes that can reach end.
+        """
+        if not self._check_nodes(start, end):
+            return []
+        subgraph = nx.DiGraph()
+        subgraph.add_nodes_from((start, end))
+        # in id order, so of duplicate edges the highest id sets the cost
+        subgraph.add_weighted_edges_from(self._execute(REACHING_EDGES, start, end))
+        return k_cheapest_paths(subgraph, start, end, k)
+
+    def reachable(self, start, end):
+        """Whether a path leads from start to end, unknown nodes reach nothing."""
+        present = {row[0] for row in self._execute(NODES_PRESENT, start, end)}
+        if start not in present or end not in present:
+            return False
+        return self._execute(REACHABLE, start, end)[0][0]
+
+    def close(self):
+        # connections still in use by a query are closed when it gives them back
+        self.db_client.close()
+        self.db_client.engine.dispose()
@@ -0,0 +1,102 @@
+import pickle
+
+import networkx as nx
+import pytest
+
+from contraction_hierarchy import ContractionHierarchy, CH_FORMAT
+
+
+@pytest.fixture
+def edges():
+    return [
+        ('a', 'b', 0.5),
+        ('b', 'c', 10.0),
+        ('b', 'e', 42.0),
+        ('c', 'd', 5.0),
+        ('d', 'e', 0.8),
+        ('e', 'a', 0.42),
+        ('e', 'f', 1.0),
+        ('e', 'h', 0.53),
+        ('g', 'g', 0.5),
+        ('h', 'j', 0.5),
+        ('j', 'h', 0.5),
+        ('a', 'k', 6),
+        ('k', 'l', 7),
+        ('l', 'm', 8),
+        ('m', 'n', 9),
+    ]
+
+
+@pytest.fixture
+def hierarchy(edges):
+    return ContractionHierarchy.build(['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n'], edges)
+
+
+def test_query(hierarchy):
+    assert hierarchy.query('a', 'e')[0] == ['a', 'b', 'c', 'd', 'e']
+    assert hierarchy.query('b', 'a')[0] == ['b', 'c', 'd', 'e', 'a']
+    assert hierarchy.query('a', 'n')[0] == ['a', 'k', 'l', 'm', 'n']
+    assert hierarchy.query('g', 'g')[0] == ['g']
+    assert hierarchy.query('f', 'g')[0] is None
+    assert hierarchy.query('h', 'a')[0] is None
+
+
+def test_query_unknown_node(hierarchy):
+    with pytest.raises(nx.NodeNotFound):
+        hierarchy.query('a', 'z')
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_query_matches_dijkstra(seed):
+    graph = nx.gnm_random_graph(60, 240, seed=seed, directed=True)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = float((u * 7 + v * 13 + seed) % 10)
+    hierarchy = ContractionHierarchy.build(graph.nodes(), ((u, v, d['weight']) for u, v, d in graph.edges(data=True)))
+    lengths = dict(nx.all_pairs_dijkstra_path_length(graph))
+
+    for start in graph:
+        for end in graph:
+            path, _ = hierarchy.query(start, end)
+            if end not in lengths[start]:
+                assert path is None
+                continue
+            # the unpacked path is a path of the original graph with the cheapest cost
+            assert path[0] == start and path[-1] == end
+            assert all(graph.has_edge(u, v) for u, v in zip(path, path[1:]))
+            assert nx.path_weight(graph, path, 'weight') == pytest.approx(lengths[start][end])
+
+
+@pytest.mark.parametrize('seed', [2, 3, 97])
+def test_query_with_zero_cost_edges_returns_simple_paths(seed):
+    graph = nx.gnm_random_graph(6, 15, seed=seed, directed=True)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = float((u * 7 + v * 13 + seed) % 3)
+    hierarchy = ContractionHierarchy.build(graph.nodes(), ((u, v, d['weight']) for u, v, d in graph.edges(data=True)))
+    lengths = dict(nx.all_pairs_dijkstra_path_length(graph))
+
+    for start in graph:
+        for end in lengths[start]:
+            path, _ = hierarchy.query(start, end)
+            assert len(set(path)) == len(path)
+            assert all(graph.has_edge(u, v) for u, v in zip(path, path[1:]))
+            assert nx.path_weight(graph, path, 'weight') == pytest.approx(lengths[start][end])
+
+
+def test_save_and_load(hierarchy, tmp_path):
+    path = tmp_path / "graph.ch"
+    hierarchy.save(path, checksum="13:15:42")
+
+    loaded, header = ContractionHierarchy.load(path)
+
+    assert header["checksum"] == "13:15:42"
+    assert header["nodes"] == 13
+    assert loaded.query('a', 'e') == hierarchy.query('a', 'e')
+
+
+def test_load_rejects_other_versions(hierarchy, tmp_path):
+    path = tmp_path / "graph.ch"
+    with open(path, "wb") as file:
+        pickle.dump({"format": CH_FORMAT, "version": 0}, file)
+
+    with pytest.raises(ValueError):
+        ContractionHierarchy.load(path)
@@ -0,0 +1,121 @@
+import pytest
+import networkx as nx
+
+from csr_graph import CSRGraph, weighted_successors, weighted_predecessors
+from query_my_graph import (
+    process_queries,
+    find_dfs_paths,
+    find_bfs_paths,
+    find_dfs_paths_iterative,
+    find_all_paths,
+    find_cheapest_path,
+)
+from shortest_paths import dijkstra_path
+
+
+@pytest.fixture
+def nodes():
+    return ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n']
+
+
+@pytest.fixture
+def edges():
+    return [
+        ('a', 'b', 0.5),
+        ('b', 'c', 10.0),
+        ('b', 'e', 42.0),
+        ('c', 'd', 5.0),
+        ('d', 'e', 0.8),
+        ('e', 'a', 0.42),
+        ('e', 'f', 1.0),
+        ('e', 'h', 0.53),
+        ('g', 'g', 0.5),
+        ('h', 'j', 0.5),
+        ('j', 'h', 0.5),
+        ('a', 'k', 6),
+        ('k', 'l', 7),
+        ('l', 'm', 8),
+        ('m', 'n', 9),
+    ]
+
+
+@pytest.fixture
+def nx_graph(nodes, edges):
+    graph = nx.DiGraph()
+    graph.add_nodes_from(nodes)
+    for from_node, to_node, cost in edges:
+        graph.add_edge(from_node, to_node, weight=cost)
+    return graph
+
+
+@pytest.fixture
+def csr_graph(nodes, edges):
+    return CSRGraph.from_edges(nodes, edges)
+
+
+def test_csr_graph_structure(csr_graph):
+    assert len(csr_graph) == 13
+    assert csr_graph.number_of_edges() == 15
+    assert list(csr_graph.successors('b')) == ['c', 'e']
+    assert list(csr_graph.predecessors('e')) == ['b', 'd']
+    assert list(csr_graph.weighted_successors('e')) == [('a', 0.42), ('f', 1.0), ('h', 0.53)]
+    assert csr_graph.has_edge('g', 'g')
+    assert not csr_graph.has_edge('a', 'e')
+    assert 'z' not in csr_graph
+
+
+def test_csr_graph_duplicate_edges():
+    graph = CSRGraph.from_edges(['a'], [('a', 'b', 1.0), ('a', 'c', 2.0), ('a', 'b', 3.0)])
+
+    assert graph.nodes() == ['a', 'b', 'c']
+    assert list(graph.weighted_successors('a')) == [('b', 3.0), ('c', 2.0)]
+
+
+def test_csr_graph_unknown_node(csr_graph):
+    with pytest.raises(nx.NetworkXError):
+        csr_graph.successors('z')
+
+
+def test_weighted_helpers_match(nx_graph, csr_graph):
+    for node in nx_graph:
+        assert list(weighted_successors(nx_graph, node)) == list(weighted_successors(csr_graph, node))
+        assert list(weighted_predecessors(nx_graph, node)) == list(weighted_predecessors(csr_graph, node))
+
+
+@pytest.mark.parametrize('search', [find_dfs_paths, find_dfs_paths_iterative, find_bfs_paths, find_all_paths])
+def test_searches_match_digraph(nx_graph, csr_graph, search):
+    for start in nx_graph:
+        for end in nx_graph:
+            assert search(csr_graph, start, end) == search(nx_graph, start, end)
+
+
+def test_cheapest_path_matches_digraph(nx_graph, csr_graph):
+    for start in nx_graph:
+        for end in nx_graph:
+            assert find_cheapest_path(csr_graph, start, end) == find_cheapest_path(nx_graph, start, end)
+
+
+def test_dijkstra_path_ties_match_networkx():
+    # small integer costs give plenty of equally cheap paths
+    graph = nx.gnm_random_graph(60, 300, seed=7, directed=True)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = (u * 31 + v * 17) % 3
+    csr_graph = CSRGraph.from_edges(graph.nodes(), ((u, v, d['weight']) for u, v, d in graph.edges(data=True)))
+
+    for start in range(0, 60, 7):
+        for end in range(60):
+            if nx.has_path(graph, start, end):
+                expected = nx.dijkstra_path(graph, start, end)
+                assert dijkstra_path(graph, start, end) == expected
+                assert dijkstra_path(csr_graph, start, end) == expected
+
+
+def test_process_queries_matches_digraph(nx_graph, csr_graph):
+    queries = [
+        {"paths": {"start": "a", "end": "e"}},
+        {"cheapest": {"start": "a", "end": "e"}},
+        {"paths": {"start": "h", "end": "a"}},
+        {"cheapest": {"start": "b", "end": "a"}},
+    ]
+
+    assert process_queries(queries, csr_graph) == process_queries(queries, nx_graph)
@@ -0,0 +1,69 @@
+import networkx as nx
+import pytest
+
+from csr_graph import CSRGraph
+from cycle_analysis import (
+    strongly_connected_components,
+    cyclic_components,
+    self_loops,
+    nodes_on_cycles,
+    enumerate_cycles,
+)
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_nodes_from(['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'j', 'k'])
+    graph.add_edges_from([('a', 'b'), ('b', 'c'), ('b', 'e'), ('c', 'd'), ('d', 'e'), ('e', 'a'), ('e', 'f'),
+                          ('e', 'h'), ('g', 'g'), ('h', 'j'), ('j', 'h'), ('a', 'k')])
+    return graph
+
+
+def test_strongly_connected_components(graph):
+    components = strongly_connected_components(graph)
+
+    assert sorted(map(sorted, components)) == sorted(map(sorted, nx.strongly_connected_components(graph)))
+
+
+def test_components_in_reverse_topological_order(graph):
+    components = strongly_connected_components(graph)
+    position = {node: i for i, component in enumerate(components) for node in component}
+
+    for u, v in graph.edges():
+        assert position[u] >= position[v]
+
+
+def test_strongly_connected_components_random():
+    graph = nx.gnm_random_graph(200, 400, seed=5, directed=True)
+    components = strongly_connected_components(CSRGraph.from_edges(graph.nodes(), ((u, v, 1) for u, v in graph.edges())))
+
+    assert sorted(map(sorted, components)) == sorted(map(sorted, nx.strongly_connected_components(graph)))
+
+
+def test_long_chain_does_not_recurse():
+    graph = nx.path_graph(20000, create_using=nx.DiGraph)
+    graph.add_edge(19999, 0)
+
+    assert len(strongly_connected_components(graph)) == 1
+
+
+def test_cyclic_components_and_self_loops(graph):
+    assert sorted(map(sorted, cyclic_components(graph))) == [['a', 'b', 'c', 'd', 'e'], ['g'], ['h', 'j']]
+    assert self_loops(graph) == ['g']
+    assert nodes_on_cycles(graph) == {'a', 'b', 'c', 'd', 'e', 'g', 'h', 'j'}
+
+
+def test_enumerate_cycles(graph):
+    cycles = enumerate_cycles(graph)
+
+    assert sorted(map(sorted, cycles)) == sorted(map(sorted, nx.simple_cycles(graph)))
+
+
+def test_enumerate_cycles_bounded(graph):
+    assert sorted(map(sorted, enumerate_cycles(graph, max_length=3))) == [['a', 'b', 'e'], ['g'], ['h', 'j']]
+    assert len(enumerate_cycles(graph, max_cycles=2)) == 2
+
+
+def test_enumerate_cycles_in_processes(graph):
+    assert enumerate_cycles(graph, processes=2) == enumerate_cycles(graph)
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch
-from db_client import DatabaseClient, Node, Edge
+from db_client import Base, DatabaseClient, Node, Edge
 
 @pytest.fixture
 def mock_session():
@@ -13,7 +13,7 @@ def mock_session_query(mock_session):
 @patch('db_client.create_engine', Mock())
 def test_get_nodes(mock_session_query, mock_session):
     mock_session.query.return_value = mock_session_query
-    mock_session_query.all.return_value = [
+    mock_session_query.filter.return_value.all.return_value = [
         Node(id='x', name='X name'),
         Node(id='y', name='Y name'),
         Node(id='z', name='Z name'),
@@ -31,7 +31,7 @@ def test_get_nodes(mock_session_query, mock_session):
 @patch('db_client.create_engine', Mock())
 def test_get_edges(mock_session_query, mock_session):
     mock_session.query.return_value = mock_session_query
-    mock_session_query.all.return_value = [
+    mock_session_query.filter.return_value.all.return_value = [
         Edge(id='e1', from_node='x', to_node='y', cost=5.0),
         Edge(id='e2', from_node='y', to_node='z', cost=0.8),
         Edge(id='e3', from_node='z', to_node='x', cost=0.42),
@@ -44,3 +44,146 @@ def test_get_edges(mock_session_query, mock_session):
 
     assert len(edges) == 3
     assert [('x', 'y', 5.0), ('y', 'z', 0.8), ('z', 'x', 0.42)] == edges
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_checksum(mock_session):
+    mock_session.execute.return_value.one.return_value = (13, 15, -123456)
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    assert db_client.get_checksum() == "13:15:-123456"
+    assert mock_session.execute.call_args[0][1] == {'graph_id': 'g0'}
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_changes(mock_session):
+    mock_session.execute.return_value.all.return_value = [
+        ('9:9:', 7, 'nodes', 'I', 'x', None, None, None),
+        ('9:9:', 8, 'edges', 'I', 'e1', 'x', 'y', 5.0),
+    ]
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    changes, snapshot = db_client.get_changes(6, '5:7:5')
+
+    assert changes == [(7, 'nodes', 'I', 'x', None, None, None), (8, 'edges', 'I', 'e1', 'x', 'y', 5.0)]
+    assert snapshot == '9:9:'
+    assert mock_session.execute.call_args[0][1] == {'graph_id': 'g0', 'since': 6, 'snapshot': '5:7:5'}
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_changes_without_changes(mock_session):
+    # the snapshot still comes back, on a row without a change
+    mock_session.execute.return_value.all.return_value = [('9:9:', None, None, None, None, None, None, None)]
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    assert db_client.get_changes(6) == ([], '9:9:')
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_sync_point(mock_session):
+    mock_session.execute.return_value.one.return_value = (0, '9:9:')
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    assert db_client.get_sync_point() == (0, '9:9:')
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_pair_costs(mock_session):
+    mock_session.execute.return_value = iter([('x', 'y', 5.0), ('y', 'z', 0.8), ('x', 'y', 2.0)])
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    # the last edge of a pair in id order wins, like in a graph loaded from iter_edges
+    assert db_client.get_pair_costs({('x', 'y'), ('y', 'z')}) == {('x', 'y'): 2.0, ('y', 'z'): 0.8}
+    assert db_client.get_pair_costs(set()) == {}
+    assert mock_session.execute.call_count == 1
+
+
+@patch('db_client.create_engine', Mock())
+def test_get_version_without_changes(mock_session_query, mock_session):
+    mock_session.query.return_value = mock_session_query
+    mock_session_query.filter.return_value.scalar.return_value = None
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    assert db_client.get_version() == 0
+
+
+@patch('db_client.create_engine', Mock())
+def test_iter_nodes(mock_session):
+    mock_session.execute.return_value = iter([('x',), ('y',), ('z',)])
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    assert list(db_client.iter_nodes(chunk_size=2)) == ['x', 'y', 'z']
+    statement = mock_session.execute.call_args[0][0]
+    assert statement.get_execution_options()["yield_per"] == 2
+
+
+@patch('db_client.create_engine', Mock())
+def test_iter_edges(mock_session):
+    mock_session.execute.return_value = iter([('x', 'y', 5.0), ('y', 'z', 0.8)])
+
+    db_client = DatabaseClient(db_connection='dummy_dsn')
+    db_client.session = mock_session
+
+    edges = db_client.iter_edges()
+
+    assert list(edges) == [('x', 'y', 5.0), ('y', 'z', 0.8)]
+    statement = mock_session.execute.call_args[0][0]
+    assert [column.name for column in statement.selected_columns] == ['from_node', 'to_node', 'cost']
+    assert statement.whereclause.compare(Edge.graph_id == 'g0')
+
+
+@pytest.fixture
+def sqlite_client():
+    db_client = DatabaseClient(db_connection='sqlite://')
+    Base.metadata.create_all(db_client.engine)
+    yield db_client
+    db_client.close()
+
+
+def test_bulk_save_nodes_upserts(sqlite_client):
+    assert sqlite_client.bulk_save_nodes([(1, 'x'), (2, 'y'), (3, 'z')], chunk_size=2) == 3
+    assert sqlite_client.bulk_save_nodes([(2, 'y renamed'), (4, 'w'), (4, 'w renamed')]) == 2
+
+    names = dict(sqlite_client.session.query(Node.id, Node.name).all())
+    assert names == {1: 'x', 2: 'y renamed', 3: 'z', 4: 'w renamed'}
+
+
+def test_bulk_save_edges_upserts(sqlite_client):
+    sqlite_client.bulk_save_nodes([(1, 'x'), (2, 'y'), (3, 'z')])
+    edges = [{'id': 1, 'from_node': 1, 'to_node': 2, 'cost': 5.0}, {'id': 2, 'from_node': 2, 'to_node': 3, 'cost': 0.8}]
+
+    sqlite_client.bulk_save_edges(edges)
+    sqlite_client.bulk_save_edges([{'id': 2, 'from_node': 3, 'to_node': 1, 'cost': 0.42}])
+
+    assert sorted(sqlite_client.get_edges()) == [(1, 2, 5.0), (3, 1, 0.42)]
+
+
+def test_graphs_are_separate(sqlite_client):
+    sqlite_client.save_graph('first')
+    sqlite_client.bulk_save_nodes([(1, 'x'), (2, 'y')])
+
+    sqlite_client.graph_id = 'g1'
+    sqlite_client.save_graph('second')
+    sqlite_client.bulk_save_nodes([(1, 'x in g1')])
+    sqlite_client.bulk_save_edges([{'id': 1, 'from_node': 1, 'to_node': 1, 'cost': 1.0}])
+
+    assert sqlite_client.get_graphs() == ['g0', 'g1']
+    assert list(sqlite_client.iter_nodes()) == [1]
+    assert sqlite_client.get_edges() == [(1, 1, 1.0)]
+    sqlite_client.graph_id = 'g0'
+    assert sorted(sqlite_client.iter_nodes()) == [1, 2]
+    assert sqlite_client.get_edges() == []
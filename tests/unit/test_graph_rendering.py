@@ -0,0 +1,78 @@
+import os
+
+import networkx as nx
+import pytest
+
+import graph_rendering
+from graph_rendering import condense, cycle_edges, graph_layout, layered_layout, render_graph
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([("a", "b", 1), ("b", "c", 2), ("c", "a", 3), ("c", "d", 1), ("e", "e", 1)])
+    return graph
+
+
+def test_cycle_edges():
+    on_cycle, closing = cycle_edges([["a", "b", "c"], ["e"]])
+
+    assert on_cycle == {("a", "b"), ("b", "c")}
+    assert closing == {("c", "a"), ("e", "e")}
+
+
+def test_condense(graph):
+    condensed, members = condense(graph)
+
+    assert sorted(sorted(component) for component in members.values()) == [["a", "b", "c"], ["d"], ["e"]]
+    component_of = {node: index for index, component in members.items() for node in component}
+    assert set(condensed.edges()) == {(component_of["a"], component_of["d"])}
+
+
+def test_layered_layout():
+    pos = layered_layout(nx.DiGraph([(0, 1), (0, 2), (1, 3), (2, 3)]))
+
+    assert [pos[node][0] for node in range(4)] == [0.0, 0.5, 0.5, 1.0]
+    assert pos[1][1] != pos[2][1]
+
+
+@pytest.mark.parametrize("mode", ["auto", "detailed", "batched", "condensed"])
+def test_render_graph(graph, tmp_path, mode):
+    output_file = tmp_path / "graph.png"
+    render_graph(graph, str(output_file), [["a", "b", "c"], ["e"]], [["a", "b", "c"], ["e"]], mode=mode)
+
+    assert output_file.stat().st_size > 0
+
+
+def test_render_graph_unknown_mode(graph, tmp_path):
+    with pytest.raises(ValueError):
+        render_graph(graph, str(tmp_path / "graph.png"), [], [], mode="sketch")
+
+
+def test_graph_layout_cached_per_version(graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_rendering, "_layouts", {})
+    calls = []
+    monkeypatch.setitem(graph_rendering.LAYOUTS, "circular", lambda g: calls.append(1) or nx.circular_layout(g))
+
+    pos = graph_layout(graph, "circular", 1, cache_dir=str(tmp_path))
+    assert graph_layout(graph, "circular", 1, cache_dir=str(tmp_path)) == pos
+    # a new process reads the cached file
+    graph_rendering._layouts.clear()
+    assert graph_layout(graph, "circular", 1, cache_dir=str(tmp_path)).keys() == pos.keys()
+    assert len(calls) == 1
+
+    graph_layout(graph, "circular", 2, cache_dir=str(tmp_path))
+    assert len(calls) == 2
+    assert os.listdir(tmp_path) == ["layout-g0-graph-circular-2.pickle"]
+
+    # other graphs keep their layouts
+    graph_layout(graph, "circular", 1, cache_dir=str(tmp_path), graph_id="g1")
+    assert sorted(os.listdir(tmp_path)) == ["layout-g0-graph-circular-2.pickle", "layout-g1-graph-circular-1.pickle"]
+
+
+def test_graph_layout_recomputed_for_new_nodes(graph, tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_rendering, "_layouts", {})
+    graph_layout(graph, "circular", 1, cache_dir=str(tmp_path))
+    graph.add_edge("d", "f", weight=1)
+
+    assert "f" in graph_layout(graph, "circular", 1, cache_dir=str(tmp_path))
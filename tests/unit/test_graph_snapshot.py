@@ -0,0 +1,125 @@
+from unittest.mock import patch
+
+import networkx as nx
+import pytest
+
+from csr_graph import CSRGraph
+from graph_snapshot import write_snapshot, load_snapshot, read_header
+from query_my_graph import create_graph_from_database, process_queries
+
+
+@pytest.fixture
+def nodes():
+    return ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'ü']
+
+
+@pytest.fixture
+def edges():
+    return [
+        ('a', 'b', 0.5),
+        ('b', 'c', 10.0),
+        ('b', 'e', 42.0),
+        ('c', 'd', 5.0),
+        ('d', 'e', 0.8),
+        ('e', 'a', 0.42),
+        ('e', 'f', 1.0),
+        ('e', 'h', 0.53),
+        ('g', 'g', 0.5),
+        ('h', 'j', 0.5),
+        ('j', 'h', 0.5),
+        ('a', 'k', 6),
+        ('k', 'l', 7),
+        ('l', 'm', 8),
+        ('m', 'n', 9),
+        ('n', 'ü', 1),
+    ]
+
+
+@pytest.fixture
+def graph(nodes, edges):
+    return CSRGraph.from_edges(nodes, edges)
+
+
+def test_snapshot_round_trip(graph, tmp_path):
+    path = tmp_path / "graph.snapshot"
+    write_snapshot(graph, path, source_version=42, source_snapshot='40:44:40,42')
+
+    loaded, header = load_snapshot(path)
+
+    assert header["source_version"] == 42
+    assert loaded.graph["version"] == 42
+    assert loaded.graph["changes_snapshot"] == '40:44:40,42'
+    assert sorted(loaded.nodes()) == sorted(graph.nodes())
+    assert loaded.number_of_edges() == graph.number_of_edges()
+    for node in graph:
+        assert list(loaded.weighted_successors(node)) == list(graph.weighted_successors(node))
+        assert sorted(loaded.predecessors(node)) == sorted(graph.predecessors(node))
+    assert 'z' not in loaded
+    assert 1 not in loaded
+    with pytest.raises(nx.NetworkXError):
+        loaded.successors('z')
+
+
+def test_snapshot_answers_match(graph, tmp_path):
+    path = tmp_path / "graph.snapshot"
+    write_snapshot(graph, path, source_version=1)
+    loaded, _ = load_snapshot(path)
+    queries = [{kind: {"start": start, "end": end}} for start in graph for end in graph for kind in ("paths", "cheapest")]
+
+    assert process_queries(queries, loaded) == process_queries(queries, graph)
+
+
+def test_snapshot_without_a_long_changelog_snapshot(graph, tmp_path):
+    path = tmp_path / "graph.snapshot"
+    running = ",".join(str(xid) for xid in range(1000, 2000))
+    write_snapshot(graph, path, source_version=1, source_snapshot=f"1000:2000:{running}")
+
+    # never taken as current, see create_graph_from_database
+    assert read_header(path)["source_snapshot"] is None
+
+
+def test_read_header_rejects_other_files(tmp_path):
+    path = tmp_path / "graph.snapshot"
+    path.write_bytes(b"not a snapshot")
+
+    assert read_header(path) is None
+    assert read_header(tmp_path / "missing.snapshot") is None
+
+
+def test_create_graph_uses_current_snapshot(nodes, edges, tmp_path):
+    path = tmp_path / "graph.snapshot"
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_sync_point.return_value = (7, '20:20:')
+        client.return_value.get_changes.return_value = ([], '21:21:')
+        client.return_value.iter_nodes.return_value = nodes
+        client.return_value.iter_edges.return_value = edges
+
+        first = create_graph_from_database('dummy_dsn', engine="csr", snapshot_path=str(path))
+        second = create_graph_from_database('dummy_dsn', engine="csr", snapshot_path=str(path))
+        assert client.return_value.iter_edges.call_count == 1
+        client.return_value.get_changes.assert_called_with(7, '20:20:')
+        assert second.graph["version"] == 7 and second.graph["changes_snapshot"] == '20:20:'
+
+        # committed after the snapshot was read, with a lower version than the one it was read at
+        client.return_value.get_changes.return_value = ([(6, 'nodes', 'I', 'x', None, None, None)], '22:22:')
+        client.return_value.get_sync_point.return_value = (7, '22:22:')
+        create_graph_from_database('dummy_dsn', engine="csr", snapshot_path=str(path))
+        assert client.return_value.iter_edges.call_count == 2
+
+    assert read_header(path)["source_snapshot"] == '22:22:'
+    assert process_queries([{"paths": {"start": "a", "end": "e"}}], second) == \
+        process_queries([{"paths": {"start": "a", "end": "e"}}], first)
+
+
+def test_snapshots_per_graph(nodes, edges, tmp_path):
+    path = tmp_path / "graph-{graph}.snapshot"
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_sync_point.return_value = (7, '20:20:')
+        client.return_value.iter_nodes.return_value = nodes
+        client.return_value.iter_edges.return_value = edges
+
+        graph = create_graph_from_database('dummy_dsn', engine="csr", snapshot_path=str(path), graph_id='g1')
+        client.assert_called_with('dummy_dsn', 'g1')
+
+    assert graph.graph["id"] == 'g1'
+    assert read_header(tmp_path / "graph-g1.snapshot")["source_version"] == 7
@@ -0,0 +1,148 @@
+import pytest
+from unittest.mock import Mock, patch
+from my_graph import iter_graph_elements, chunked, bulk_upsert, NODES_UPSERT, EDGES_UPSERT
+from my_graph import is_valid_graph, load_schema, validate_and_load, read_graph_header
+
+XSD = './xmls/directed_graph_schema.xsd'
+
+def graph_xml(tmp_path, nodes="<node><id>a</id><name>A</name></node><node><id>b</id><name>B</name></node>",
+              edges="<edge><id>e1</id><from>a</from><to>b</to><cost>1.5</cost></edge>", header="<id>g0</id><name>G</name>"):
+    xml_path = tmp_path / "graph.xml"
+    xml_path.write_text(f"<graph>{header}<nodes>{nodes}</nodes><edges>{edges}</edges></graph>")
+    return str(xml_path)
+
+
+def test_iter_graph_elements():
+    elements = list(iter_graph_elements('./xmls/directed_graph.xml'))
+
+    nodes = [row for kind, row in elements if kind == "node"]
+    edges = [row for kind, row in elements if kind == "edge"]
+
+    assert len(nodes) == 13
+    assert len(edges) == 15
+    assert nodes[0] == ('a', 'A name')
+    assert edges[0] == ('e1', 'a', 'b', 0.5)
+    assert edges[-1] == ('e15', 'm', 'n', 9.0)
+
+
+def test_iter_graph_elements_optional_cost(tmp_path):
+    xml_path = tmp_path / "graph.xml"
+    xml_path.write_text(
+        "<graph><id>g0</id><name>G</name>"
+        "<nodes><node><id>a</id><name>A</name></node></nodes>"
+        "<edges><edge><id>e1</id><from>a</from><to>a</to></edge></edges>"
+        "</graph>"
+    )
+
+    assert list(iter_graph_elements(str(xml_path))) == [("node", ("a", "A")), ("edge", ("e1", "a", "a", 0.0))]
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+@patch('my_graph.execute_values')
+def test_bulk_upsert_counts(mock_execute_values):
+    # 'a' already exists in the database, 'b' is new and repeated within the batch
+    mock_execute_values.side_effect = lambda cur, sql, rows, page_size, fetch: [(row[0] != 'a',) for row in rows]
+    rows = [('a', 'A name'), ('b', 'B name'), ('b', 'B renamed')]
+
+    added, updated = bulk_upsert(Mock(), NODES_UPSERT, rows, batch_size=10, graph_id='g1')
+
+    assert (added, updated) == (1, 2)
+    (_, _, sent_rows), _ = mock_execute_values.call_args
+    assert sent_rows == [('a', 'A name', 'g1'), ('b', 'B renamed', 'g1')]
+
+
+@patch('my_graph.execute_values')
+def test_bulk_upsert_batches(mock_execute_values):
+    mock_execute_values.side_effect = lambda cur, sql, rows, page_size, fetch: [(True,) for _ in rows]
+
+    added, updated = bulk_upsert(Mock(), EDGES_UPSERT, [(f"e{i}", 'a', 'b', 1.0) for i in range(5)], batch_size=2)
+
+    assert (added, updated) == (5, 0)
+    assert mock_execute_values.call_count == 3
+
+
+def test_is_valid_graph():
+    assert is_valid_graph('./xmls/directed_graph.xml') == (True, "The graph XML is valid.")
+
+
+@pytest.mark.parametrize("document, message", [
+    (dict(header="<id>g0</id>"), "Graph must have <id> and <name>."),
+    (dict(nodes=""), "<nodes> group must contain at least one <node>."),
+    (dict(nodes="<node><id>a</id><name>A</name></node><node><id>a</id><name>B</name></node>"),
+     "All <node> elements must have unique <id> tags."),
+    (dict(edges="<edge><id>e1</id><from>a</from><to>x</to></edge>"),
+     "Each <edge> must have <from> and <to> corresponding to previously defined nodes."),
+    (dict(edges="<edge><id>e1</id><from>a</from><to>b</to><cost>-1</cost></edge>"),
+     "<cost> should be a non-negative floating point."),
+    (dict(edges="<edge><id>e1</id><from>a</from><to>b</to><cost>high</cost></edge>"),
+     "<cost> should be a floating point or integer value."),
+    (dict(edges="<edge><id>e1</id><from>a</from><to>b</to></edge><edge><id>e1</id><from>b</from><to>a</to></edge>"),
+     "All <edge> elements must have unique <id> tags."),
+])
+def test_is_valid_graph_errors(tmp_path, document, message):
+    assert is_valid_graph(graph_xml(tmp_path, **document)) == (False, message)
+
+
+def test_is_valid_graph_syntax_error(tmp_path):
+    xml_path = tmp_path / "graph.xml"
+    xml_path.write_text("<graph><id>g0</id>")
+
+    assert is_valid_graph(str(xml_path)) == (False, "Invalid XML syntax.")
+
+
+def test_load_schema_is_cached():
+    assert load_schema(XSD) is load_schema(XSD)
+
+
+def test_load_schema_without_identity_constraints(tmp_path):
+    from lxml import etree
+    document = etree.parse(graph_xml(tmp_path, edges="<edge><id>e1</id><from>a</from><to>x</to></edge>"))
+
+    assert not load_schema(XSD).validate(document)
+    assert load_schema(XSD, identity_constraints=False).validate(document)
+
+
+@patch('my_graph.execute_values')
+@patch('my_graph.psycopg2.connect')
+def test_validate_and_load(mock_connect, mock_execute_values, tmp_path):
+    mock_execute_values.side_effect = lambda cur, sql, rows, page_size, fetch: [(True,) for _ in rows]
+
+    assert validate_and_load(graph_xml(tmp_path, header="<id>g7</id><name>G</name>"), XSD, {})
+
+    # the rows go to the graph of the document
+    cur = mock_connect.return_value.cursor.return_value
+    assert cur.execute.call_args.args[1] == ('g7', 'G')
+    sent = [(call.args[1], call.args[2]) for call in mock_execute_values.call_args_list]
+    assert sent == [(NODES_UPSERT, [('a', 'A', 'g7'), ('b', 'B', 'g7')]), (EDGES_UPSERT, [('e1', 'a', 'b', 1.5, 'g7')])]
+    mock_connect.return_value.commit.assert_called_once()
+
+
+@patch('my_graph.execute_values')
+@patch('my_graph.psycopg2.connect')
+def test_validate_and_load_invalid(mock_connect, mock_execute_values, tmp_path):
+    mock_execute_values.side_effect = lambda cur, sql, rows, page_size, fetch: [(True,) for _ in rows]
+    # the nodes are already sent when the repeated edge id or the misplaced <weight> shows up
+    for edges in ("<edge><id>e1</id><from>a</from><to>b</to></edge><edge><id>e1</id><from>b</from><to>a</to></edge>",
+                  "<edge><id>e1</id><from>a</from><to>b</to><weight>1</weight></edge>"):
+        mock_connect.reset_mock()
+
+        assert not validate_and_load(graph_xml(tmp_path, edges=edges), XSD, {})
+
+        mock_connect.return_value.commit.assert_not_called()
+        mock_connect.return_value.close.assert_called_once()
+
+
+def test_read_graph_header(tmp_path):
+    assert read_graph_header(graph_xml(tmp_path, header="<id>g7</id><name>G</name>")) == ('g7', 'G')
+    assert read_graph_header(graph_xml(tmp_path, header="<name>G</name>")) == (None, 'G')
+    assert read_graph_header('./xmls/directed_graph.xml') == ('g0', 'The Graph Name')
+
+
+@patch('my_graph.psycopg2.connect')
+def test_validate_and_load_without_graph_id(mock_connect, tmp_path):
+    assert not validate_and_load(graph_xml(tmp_path, header="<name>G</name>"), XSD, {})
+    mock_connect.assert_not_called()
@@ -0,0 +1,85 @@
+import io
+import json
+import runpy
+import sys
+from functools import partial
+from unittest.mock import patch
+
+import networkx as nx
+import pytest
+
+import query_my_graph
+from csr_graph import CSRGraph
+from parallel_queries import ParallelQueryExecutor, SharedGraph, attach_graph
+from query_my_graph import process_queries
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_nodes_from(['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'j'])
+    graph.add_weighted_edges_from([('a', 'b', 0.5), ('b', 'c', 10.0), ('b', 'e', 42.0), ('c', 'd', 5.0),
+                                   ('d', 'e', 0.8), ('e', 'a', 0.42), ('e', 'f', 1.0), ('e', 'h', 0.53),
+                                   ('g', 'g', 0.5), ('h', 'j', 0.5), ('j', 'h', 0.5)])
+    return graph
+
+
+@pytest.fixture
+def queries(graph):
+    return [{kind: {"start": start, "end": end}} for start in graph for end in graph for kind in ("paths", "cheapest")]
+
+
+def test_attach_graph_reads_shared_arrays(graph):
+    shared = SharedGraph(graph)
+    try:
+        attached, blocks = attach_graph(shared.names, shared.attributes)
+        assert isinstance(attached, CSRGraph)
+        assert attached.nodes() == list(graph.nodes())
+        for node in graph:
+            assert list(attached.successors(node)) == list(graph.successors(node))
+        del attached
+        for block in blocks:
+            block.close()
+    finally:
+        shared.close()
+
+
+def test_indexes_stay_in_this_process(graph):
+    graph.graph.update(id='g0', version=7, landmarks=object(), ch=object(), reachability=object())
+    shared = SharedGraph(graph)
+    try:
+        assert shared.attributes == {'id': 'g0', 'version': 7}
+        assert 'ch' in graph.graph
+    finally:
+        shared.close()
+
+
+def test_answers_in_input_order(graph, queries):
+    with ParallelQueryExecutor(graph, processes=3, batch_size=5) as executor:
+        result = executor.process_queries(queries)
+
+    assert result == process_queries(queries, graph)
+
+
+def test_error_in_a_batch(graph):
+    with ParallelQueryExecutor(graph, processes=2, batch_size=1) as executor:
+        result = executor.process_queries([{"cheapest": {"start": "a", "end": "e"}}, {"paths": {"start": "z"}}])
+
+    assert result is None
+
+
+def test_command_line_metrics_of_the_workers(graph, queries, tmp_path, monkeypatch, capsys):
+    path = tmp_path / "graph_queries.prom"
+    monkeypatch.setattr(sys, "argv", ["query_my_graph.py"])
+    monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps({"queries": queries})))
+    query_my_graph.metrics.clear()
+    # the forked workers answer with stats, as with query_stats = True
+    with patch.multiple("query_my_graph", create_graph_from_database=lambda *args, **kwargs: graph,
+                        graph_ids=lambda dsn: {"g0"}, query_processes=2, query_metrics_path=str(path),
+                        output_format="indent", process_queries=partial(process_queries, collect_stats=True)):
+        runpy.run_path(query_my_graph.__file__, run_name="__main__")
+
+    assert len(json.loads(capsys.readouterr().out)["answers"]) == len(queries)
+    lines = path.read_text().splitlines()
+    assert f'graph_queries_total{{type="paths"}} {len(queries) // 2}' in lines
+    assert f'graph_queries_total{{type="cheapest"}} {len(queries) // 2}' in lines
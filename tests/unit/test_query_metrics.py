@@ -0,0 +1,82 @@
+from threading import Thread
+
+import networkx as nx
+
+from query_metrics import QueryMetrics, QueryStats, counting
+from traversal import iter_dfs_paths, iter_bfs_paths
+from shortest_paths import single_source_dijkstra
+
+
+def test_counting():
+    stats = QueryStats()
+    successors = counting(lambda node: [node + 1, node + 2], stats)
+
+    assert list(successors(1)) == [2, 3]
+    assert (stats.nodes_expanded, stats.edges_relaxed) == (1, 2)
+
+
+def test_searches_count_their_work():
+    graph = nx.DiGraph([(0, 1), (1, 2), (0, 3), (3, 2), (0, 2)])
+    for search in (lambda stats: list(iter_dfs_paths(graph, 0, 2, stats=stats)),
+                   lambda stats: list(iter_bfs_paths(graph, 0, 2, stats=stats))):
+        stats = QueryStats()
+        search(stats)
+        # 0, 1 and 3 are expanded, 2 is the end
+        assert (stats.nodes_expanded, stats.edges_relaxed) == (3, 5)
+
+    stats = QueryStats()
+    single_source_dijkstra(graph, 0, stats=stats)
+    assert (stats.nodes_expanded, stats.edges_relaxed) == (4, 5)
+
+
+def test_add_paths():
+    stats = QueryStats()
+    stats.add_paths([[0, 1, 2], [0, 2]])
+
+    assert stats.as_dict() == {"wall_time": 0.0, "nodes_expanded": 0, "edges_relaxed": 0,
+                               "paths": 2, "peak_path_length": 3}
+
+
+def test_prometheus_export(tmp_path):
+    metrics = QueryMetrics()
+    stats = QueryStats()
+    stats.wall_time, stats.nodes_expanded, stats.paths, stats.peak_path_length = 0.002, 7, 1, 3
+    metrics.observe("cheapest", stats)
+    metrics.observe("cheapest", stats.as_dict())
+
+    path = tmp_path / "graph_queries.prom"
+    metrics.write_prometheus(str(path))
+    lines = path.read_text().splitlines()
+
+    assert "# TYPE graph_queries_total counter" in lines
+    assert 'graph_queries_total{type="cheapest"} 2' in lines
+    assert 'graph_query_nodes_expanded_total{type="cheapest"} 14' in lines
+    assert 'graph_query_duration_seconds_bucket{type="cheapest",le="0.001"} 0' in lines
+    assert 'graph_query_duration_seconds_bucket{type="cheapest",le="0.005"} 2' in lines
+    assert 'graph_query_duration_seconds_bucket{type="cheapest",le="+Inf"} 2' in lines
+    assert 'graph_query_peak_path_length_bucket{type="cheapest",le="4"} 2' in lines
+    assert 'graph_query_peak_path_length_count{type="cheapest"} 2' in lines
+
+
+def test_concurrent_prometheus_writes(tmp_path):
+    metrics = QueryMetrics()
+    metrics.observe("paths", QueryStats())
+    path = tmp_path / "graph_queries.prom"
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                metrics.write_prometheus(str(path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert path.read_text() == metrics.to_prometheus()
+    assert [file.name for file in tmp_path.iterdir()] == ["graph_queries.prom"]
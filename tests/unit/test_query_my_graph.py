@@ -1,11 +1,32 @@
+import io
+import json
+import pickle
+import runpy
+import sys
+
 import pytest
+from unittest.mock import Mock, patch
 from query_my_graph import (
     process_queries,
     find_dfs_paths,
     find_bfs_paths,
     find_dfs_paths_iterative,
+    find_all_paths,
+    find_all_paths_from,
+    iter_all_paths,
+    nodes_reaching,
+    path_tree_cache,
+    metrics,
+    apply_changes,
+    sync_graph,
+    is_reachable,
+    GraphCache,
+    create_graph_from_database,
 )
+from contraction_hierarchy import CH_FORMAT
+from reachability import ReachabilityIndex
 import networkx as nx
+import query_my_graph
 
 @pytest.fixture
 def nodes():
@@ -306,6 +327,147 @@ def test_find_bfs_paths(graph, start='a', end='e'):
     paths = find_bfs_paths(graph, start, end)
     assert paths == [['a', 'b', 'e'], ['a', 'b', 'c', 'd', 'e']]
 
+def test_nodes_reaching(graph):
+    assert nodes_reaching(graph, 'e') == {'a', 'b', 'c', 'd', 'e'}
+    assert nodes_reaching(graph, 'g') == {'g'}
+
+def test_find_all_paths_matches_networkx(graph):
+    for start in graph:
+        for end in graph:
+            assert find_all_paths(graph, start, end) == list(nx.all_simple_paths(graph, start, end))
+
+def test_find_all_paths_matches_networkx_random():
+    graph = nx.gnm_random_graph(12, 40, seed=3, directed=True)
+    for start in graph:
+        for end in graph:
+            assert find_all_paths(graph, start, end) == list(nx.all_simple_paths(graph, start, end))
+
+def test_find_all_paths_limits(graph):
+    assert find_all_paths(graph, 'a', 'e', max_paths=1) == [['a', 'b', 'c', 'd', 'e']]
+    assert find_all_paths(graph, 'a', 'e', max_depth=2) == [['a', 'b', 'e']]
+    assert find_all_paths(graph, 'a', 'e', max_depth=1) == []
+    assert find_all_paths(graph, 'a', 'e', max_paths=0) == []
+
+def test_iter_all_paths_is_lazy(graph):
+    paths = iter_all_paths(graph, 'a', 'e')
+    assert next(paths) == ['a', 'b', 'c', 'd', 'e']
+
+def test_iter_all_paths_prunes_dead_ends(graph):
+    # 'k', 'l', 'm', 'n' can't reach 'e', the search must never look at their successors
+    expanded = []
+    successors = graph.successors
+    graph.successors = lambda node: expanded.append(node) or successors(node)
+
+    assert find_all_paths(graph, 'a', 'e') == [['a', 'b', 'c', 'd', 'e'], ['a', 'b', 'e']]
+    assert not {'k', 'l', 'm', 'n'} & set(expanded)
+
+def test_process_queries_paths_limits(graph):
+    queries = [{"paths": {"start": "a", "end": "e", "max_paths": 1}}, {"paths": {"start": "a", "end": "e", "max_depth": 2}}]
+
+    answers = process_queries(queries, graph)["answers"]
+
+    assert answers[0]["paths"]["paths"] == [['a', 'b', 'c', 'd', 'e']]
+    assert answers[1]["paths"]["paths"] == [['a', 'b', 'e']]
+
+def test_process_queries_reuses_path_trees(graph):
+    path_tree_cache.clear()
+    hits = path_tree_cache.hits
+    queries = [{"cheapest": {"start": "a", "end": end}} for end in ('e', 'f', 'n')]
+
+    # unplanned, each query is looked up on its own and the second and third find the tree from a in the cache
+    answers = process_queries(queries, graph, plan=False)["answers"]
+
+    assert [answer["cheapest"]["path"] for answer in answers] == [
+        ['a', 'b', 'c', 'd', 'e'], ['a', 'b', 'c', 'd', 'e', 'f'], ['a', 'k', 'l', 'm', 'n']]
+    assert path_tree_cache.hits - hits == 2
+
+def test_process_queries_cheapest_algorithm(graph):
+    queries = [{"cheapest": {"start": "a", "end": "e", "algorithm": algorithm}}
+               for algorithm in ("dijkstra", "bidirectional", "alt")]
+
+    answers = process_queries(queries, graph)["answers"]
+
+    for answer in answers:
+        assert answer["cheapest"]["path"] == ['a', 'b', 'c', 'd', 'e']
+        assert answer["cheapest"]["settled"] > 0
+
+def test_apply_changes(graph):
+    apply_changes(graph, [
+        (1, 'nodes', 'I', 'x', None, None, None),
+        (2, 'edges', 'I', 'e16', 'n', 'x', 1.5),
+        # e1 updated from a -> b to a -> e
+        (3, 'edges', 'D', 'e1', 'a', 'b', 0.5),
+        (4, 'edges', 'I', 'e1', 'a', 'e', 2.0),
+        (5, 'edges', 'D', 'e9', 'g', 'g', 0.5),
+        (6, 'nodes', 'D', 'g', None, None, None),
+    ])
+
+    assert graph['n']['x']['weight'] == 1.5
+    assert not graph.has_edge('a', 'b')
+    assert graph['a']['e']['weight'] == 2.0
+    assert 'g' not in graph
+
+def test_apply_changes_keeps_pairs_linked_by_other_edges(graph):
+    # e17 also links a -> b, e2 was the only edge of b -> c
+    apply_changes(graph, [
+        (1, 'edges', 'I', 'e17', 'a', 'b', 3.0),
+        (2, 'edges', 'D', 'e1', 'a', 'b', 0.5),
+        (3, 'edges', 'D', 'e2', 'b', 'c', 10.0),
+    ], linked={('a', 'b'): 3.0})
+
+    assert graph['a']['b']['weight'] == 3.0
+    assert not graph.has_edge('b', 'c')
+
+def test_sync_graph_rereads_deleted_pairs(graph):
+    graph.graph["version"] = 10
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_changes.return_value = ([(11, 'edges', 'D', 'e1', 'a', 'b', 0.5),
+                                                          (12, 'edges', 'I', 'e16', 'f', 'g', 1.0)], '20:20:')
+        client.return_value.get_pair_costs.return_value = {('a', 'b'): 0.7}
+        assert sync_graph(graph, 'dummy_dsn') == 2
+        client.return_value.get_pair_costs.assert_called_with({('a', 'b')})
+
+    assert graph['a']['b']['weight'] == 0.7
+
+def test_sync_graph(graph):
+    graph.graph["version"] = 10
+    graph.graph["landmarks"] = object()
+    graph.graph["reachability"] = ReachabilityIndex.build(graph)
+    graph.graph["changes_snapshot"] = '15:16:15'
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_changes.return_value = ([(11, 'edges', 'I', 'e16', 'f', 'g', 1.0)], '20:20:')
+        assert sync_graph(graph, 'dummy_dsn') == 1
+        client.return_value.get_changes.assert_called_with(10, '15:16:15')
+
+    assert graph.graph["version"] == 11
+    assert graph.graph["changes_snapshot"] == '20:20:'
+    assert "landmarks" not in graph.graph
+    assert "reachability" not in graph.graph
+    assert process_queries([{"cheapest": {"start": "f", "end": "g"}}], graph)["answers"][0]["cheapest"]["path"] == ['f', 'g']
+
+def test_sync_graph_applies_changes_committed_late(graph):
+    # version 9 was taken before 10 but committed after the graph was read at version 10
+    graph.graph["version"] = 10
+    graph.graph["changes_snapshot"] = '9:11:9'
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_changes.return_value = ([(9, 'edges', 'I', 'e16', 'f', 'g', 1.0)], '12:12:')
+        assert sync_graph(graph, 'dummy_dsn') == 1
+
+    assert graph.has_edge('f', 'g')
+    assert graph.graph["version"] == 10 and graph.graph["changes_snapshot"] == '12:12:'
+
+def test_sync_graph_drops_cached_trees(graph):
+    graph.graph["version"] = 10
+    graphs = GraphCache(lambda graph_id: graph)
+    query = [{"cheapest": {"start": "a", "end": "e"}}]
+    assert process_queries(query, graphs)["answers"][0]["cheapest"]["path"] == ['a', 'b', 'c', 'd', 'e']
+
+    with patch('query_my_graph.DatabaseClient') as client:
+        client.return_value.get_changes.return_value = ([(11, 'edges', 'D', 'e2', 'b', 'c', 10.0)], '20:20:')
+        sync_graph(graph, 'dummy_dsn')
+
+    assert process_queries(query, graphs)["answers"][0]["cheapest"]["path"] == ['a', 'b', 'e']
+
 def test_manual_dijkstra(nodes, edges, start='a', end='e'):
     graph = {node: [] for node in nodes}
     for u, v, w in edges:
@@ -346,4 +508,201 @@ def test_manual_dijkstra(nodes, edges, start='a', end='e'):
     path = restore_shortest_path(predecessors, start_vertex, end)
     print(f"Shortest path from '{start}' to '{end}':", path)
 
-    assert path == ['a', 'b', 'c', 'd', 'e']
\ No newline at end of file
+    assert path == ['a', 'b', 'c', 'd', 'e']
+
+def test_process_queries_stats(graph):
+    path_tree_cache.clear()
+    traced = []
+    queries = [{"paths": {"start": "a", "end": "e"}}, {"cheapest": {"start": "a", "end": "e"}}]
+
+    answers = process_queries(queries, graph, hook=lambda query, answer, stats: traced.append((query, stats)))["answers"]
+
+    paths_stats = answers[0]["paths"]["stats"]
+    # reverse BFS from e over a, b, c, d, e and 6 edges, then the DFS over a, b, c, d and 6 edges
+    assert (paths_stats["nodes_expanded"], paths_stats["edges_relaxed"]) == (9, 12)
+    assert (paths_stats["paths"], paths_stats["peak_path_length"]) == (2, 5)
+    cheapest_stats = answers[1]["cheapest"]["stats"]
+    assert cheapest_stats["paths"] == 1 and cheapest_stats["nodes_expanded"] > 0
+    assert cheapest_stats["wall_time"] >= 0
+    assert [query for query, _ in traced] == queries
+
+def test_process_queries_without_stats(graph):
+    answers = process_queries([{"paths": {"start": "a", "end": "e"}}], graph, collect_stats=False)["answers"]
+
+    assert "stats" not in answers[0]["paths"]
+
+def test_process_queries_metrics(graph):
+    metrics.clear()
+
+    process_queries([{"paths": {"start": "a", "end": "e"}}, {"paths": {"start": "a", "end": "n"}}], graph,
+                    collect_stats=True)
+
+    text = metrics.to_prometheus()
+    assert 'graph_queries_total{type="paths"} 2' in text
+    assert 'graph_query_paths_total{type="paths"} 3' in text
+    assert 'graph_query_duration_seconds_count{type="paths"} 2' in text
+
+def test_is_reachable(graph):
+    for index in (None, ReachabilityIndex.build(graph)):
+        if index is not None:
+            graph.graph["reachability"] = index
+        assert is_reachable(graph, 'c', 'j')
+        assert is_reachable(graph, 'g', 'g')
+        assert not is_reachable(graph, 'n', 'a')
+        assert not is_reachable(graph, 'a', 'x')
+
+def test_reachability_index_is_built_when_first_needed(graph):
+    # create_graph_from_database leaves None for the index to build
+    graph.graph["reachability"] = None
+    with patch('query_my_graph.ReachabilityIndex.build', wraps=ReachabilityIndex.build) as build:
+        process_queries([{"cheapest": {"start": "a", "end": "e", "algorithm": "alt"}}], graph)
+        build.assert_called_once()
+        answers = process_queries([{"paths": {"start": "h", "end": "a"}}, {"reachable": {"start": "a", "end": "n"}}],
+                                  graph)["answers"]
+        build.assert_called_once()
+
+    assert isinstance(graph.graph["reachability"], ReachabilityIndex)
+    assert answers == [{"paths": {"from": "h", "to": "a", "paths": []}},
+                       {"reachable": {"from": "a", "to": "n", "reachable": True}}]
+
+@pytest.mark.parametrize("content", [
+    pickle.dumps({"format": CH_FORMAT, "version": 0, "checksum": "1:2:3"}),
+    b"not an index",
+    b"",
+])
+def test_unreadable_hierarchy_is_skipped(nodes, edges, content, tmp_path, capsys):
+    path = tmp_path / "graph-{graph}.ch"
+    (tmp_path / "graph-g0.ch").write_bytes(content)
+    with patch('query_my_graph.DatabaseClient') as client, patch('query_my_graph.ch_index_path', str(path)):
+        client.return_value.get_sync_point.return_value = (7, '20:20:')
+        client.return_value.iter_nodes.return_value = nodes
+        client.return_value.iter_edges.return_value = edges
+        client.return_value.get_checksum.return_value = "1:2:3"
+        graph = create_graph_from_database('dummy_dsn', engine="networkx", snapshot_path=None)
+
+    assert graph is not None and "ch" not in graph.graph
+    assert "rebuild it with: python contraction_hierarchy.py g0" in capsys.readouterr().err
+
+def test_process_queries_reachable(graph):
+    graph.graph["reachability"] = ReachabilityIndex.build(graph)
+    queries = [{"reachable": {"start": "a", "end": "n"}}, {"reachable": {"start": "n", "end": "a"}}]
+
+    assert process_queries(queries, graph) == {"answers": [
+        {"reachable": {"from": "a", "to": "n", "reachable": True}},
+        {"reachable": {"from": "n", "to": "a", "reachable": False}},
+    ]}
+
+def test_process_queries_rejects_unreachable(graph):
+    graph.graph["reachability"] = ReachabilityIndex.build(graph)
+    queries = [{"paths": {"start": "h", "end": "a"}}, {"cheapest": {"start": "h", "end": "a", "algorithm": "alt"}}]
+
+    with patch('query_my_graph.find_all_paths') as paths, patch('query_my_graph.cheapest_path') as cheapest:
+        answers = process_queries(queries, graph)["answers"]
+    paths.assert_not_called()
+    cheapest.assert_not_called()
+
+    assert answers == [{"paths": {"from": "h", "to": "a", "paths": []}},
+                       {"cheapest": {"from": "h", "to": "a", "path": False}}]
+    # unknown nodes still fail like the searches do
+    assert process_queries([{"paths": {"start": "x", "end": "a"}}], graph) is None
+
+def test_graph_cache(graph):
+    loaded = []
+    def load(graph_id):
+        loaded.append(graph_id)
+        return graph.copy() if graph_id != 'sql' else Mock()
+    graphs = GraphCache(load, size=2)
+
+    first, trees = graphs.get('g0')
+    sql, _ = graphs.get('sql')
+    # g0 is used again, sql becomes the least recently used
+    assert graphs.get('g0') == (first, trees)
+    graphs.get('g1')
+
+    assert loaded == ['g0', 'sql', 'g1']
+    assert 'g0' in graphs and 'sql' not in graphs and len(graphs) == 2
+    sql.close.assert_called_once()
+    assert graphs.get('g1')[1] is not trees
+
+def test_graph_cache_rejects_unknown_graphs(graph):
+    loaded = []
+    graphs = GraphCache(lambda graph_id: loaded.append(graph_id) or graph, size=1, known=lambda: {'g0'})
+    graphs.get('g0')
+
+    assert process_queries([{"reachable": {"start": "a", "end": "e", "graph": "nope"}}], graphs) is None
+    assert loaded == ['g0'] and 'g0' in graphs
+
+def test_command_line_without_the_default_graph(graph, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["query_my_graph.py"])
+    queries = [{"paths": {"start": "a", "end": "b", "graph": "g1"}}]
+    monkeypatch.setattr(sys, "stdin", io.StringIO(json.dumps({"queries": queries})))
+    with patch('query_my_graph.create_graph_from_database', return_value=graph), \
+            patch('query_my_graph.graph_ids', return_value={'g1'}), patch('query_my_graph.output_format', "indent"):
+        runpy.run_path(query_my_graph.__file__, run_name="__main__")
+
+    out, err = capsys.readouterr()
+    assert "Graph g0 does not exist" in err
+    assert json.loads(out) == {"answers": [{"paths": {"from": "a", "to": "b", "paths": [['a', 'b']]}}]}
+
+def test_process_queries_picks_graph(graph):
+    other = nx.DiGraph([('a', 'z')])
+    other.graph["id"] = 'g1'
+    graphs = GraphCache(lambda graph_id: other if graph_id == 'g1' else graph)
+    queries = [{"cheapest": {"start": "a", "end": "e"}}, {"paths": {"start": "a", "end": "z", "graph": "g1"}}]
+
+    assert process_queries(queries, graphs)["answers"] == [
+        {"cheapest": {"from": "a", "to": "e", "path": ['a', 'b', 'c', 'd', 'e']}},
+        {"paths": {"from": "a", "to": "z", "paths": [['a', 'z']]}},
+    ]
+    # a single graph doesn't answer queries of other graphs
+    assert process_queries(queries, graph) is None
+    assert process_queries(queries[1:], other)["answers"][0]["paths"]["paths"] == [['a', 'z']]
+
+def test_process_queries_cheapest_k(graph):
+    graph.graph["reachability"] = ReachabilityIndex.build(graph)
+    queries = [{"cheapest_k": {"start": "a", "end": "e", "k": 3}}, {"cheapest_k": {"start": "h", "end": "a", "k": 3}}]
+
+    answers = process_queries(queries, graph, collect_stats=True)["answers"]
+
+    found = answers[0]["cheapest_k"]
+    expected = [path for path, _ in zip(nx.shortest_simple_paths(graph, 'a', 'e', 'weight'), range(3))]
+    assert [entry["path"] for entry in found["paths"]] == expected
+    assert [entry["cost"] for entry in found["paths"]] == sorted(entry["cost"] for entry in found["paths"])
+    assert found["stats"]["paths"] == len(expected) > 1
+    assert answers[1]["cheapest_k"]["paths"] == [] and answers[1]["cheapest_k"]["stats"]["nodes_expanded"] == 0
+
+def test_find_all_paths_from_matches_find_all_paths():
+    graph = nx.gnm_random_graph(12, 40, seed=3, directed=True)
+    targets = [(end, max_paths, max_depth) for end in (0, 4, 4, 9, 11, 'x')
+               for max_paths, max_depth in ((None, None), (3, None), (None, 3), (0, None))]
+
+    found = find_all_paths_from(graph, 0, targets)
+
+    for (end, max_paths, max_depth), paths in zip(targets, found):
+        assert paths == find_all_paths(graph, 0, end, max_paths, max_depth)
+
+def test_process_queries_planned_like_unplanned(graph):
+    graph.graph["reachability"] = ReachabilityIndex.build(graph)
+    queries = [{"cheapest": {"start": "a", "end": end}} for end in ('e', 'f', 'n', 'e', 'x')]
+    queries += [{"paths": {"start": "a", "end": end, "max_paths": 1}} for end in ('e', 'j', 'n', 'g')]
+    queries += [{"paths": {"start": "a", "end": "e"}, "reachable": {"start": "a", "end": "e"}},
+                {"cheapest": {"start": "a", "end": "f", "algorithm": "alt"}}, {"reachable": {"start": "a", "end": "e"}}]
+
+    assert process_queries(queries, graph) == process_queries(queries, graph, plan=False)
+
+def test_process_queries_plan_stats(graph, capsys):
+    traced = []
+    queries = [{"cheapest": {"start": "a", "end": "e"}}, {"cheapest": {"start": "a", "end": "f"}},
+               {"cheapest": {"start": "a", "end": "e"}}]
+
+    with patch('query_my_graph.query_plan_debug', True):
+        answers = process_queries(queries, graph, hook=lambda query, answer, stats: traced.append(stats))["answers"]
+
+    # one Dijkstra for both ends, counted for the first query, the duplicate shares its answer
+    assert answers[0]["cheapest"]["stats"]["nodes_expanded"] > 0
+    assert answers[1]["cheapest"]["stats"]["nodes_expanded"] == 0
+    assert answers[2] == answers[0]
+    assert len(traced) == 2
+    assert "1 copied from an identical query, 2 cheapest queries answered by 1 shortest path trees" in \
+        capsys.readouterr().err
+
@@ -0,0 +1,111 @@
+import io
+import json
+
+import networkx as nx
+import pytest
+
+from query_my_graph import iter_answers, process_queries
+from query_output import write_answers
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([('a', 'b', 0.5), ('b', 'c', 10.0), ('b', 'e', 42.0), ('c', 'd', 5.0),
+                                   ('d', 'e', 0.8), ('e', 'a', 0.42), ('e', 'f', 1.0)])
+    return graph
+
+
+@pytest.fixture
+def queries():
+    return [{"paths": {"start": "a", "end": "e"}}, {"cheapest": {"start": "a", "end": "e"}},
+            {"reachable": {"start": "f", "end": "a"}}]
+
+
+def test_json_is_the_process_queries_document(graph, queries):
+    out = io.StringIO()
+
+    assert write_answers(iter_answers(queries, graph, stream_paths=True), out, "json")
+
+    assert json.loads(out.getvalue()) == process_queries(queries, graph)
+    assert out.getvalue().count("\n") == 1
+
+
+def test_ndjson_writes_an_answer_per_line(graph, queries):
+    out = io.StringIO()
+
+    write_answers(iter_answers(queries, graph, stream_paths=True), out, "ndjson")
+
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == process_queries(queries, graph)["answers"]
+
+
+def test_paths_are_written_as_they_are_found(graph):
+    out = io.StringIO()
+    written = []
+
+    def paths():
+        for path in (['a', 'e'], ['a', 'b', 'e']):
+            written.append(out.getvalue())
+            yield path
+
+    write_answers([{"paths": {"from": "a", "to": "e", "paths": paths()}}], out)
+
+    assert written[1].endswith('"paths":[["a","e"]')
+    assert json.loads(out.getvalue())["answers"][0]["paths"]["paths"] == [['a', 'e'], ['a', 'b', 'e']]
+
+
+def test_streamed_stats_count_the_written_paths(graph):
+    answers = list(iter_answers([{"paths": {"start": "a", "end": "e"}}], graph, collect_stats=True,
+                                stream_paths=True))
+    out = io.StringIO()
+
+    write_answers(answers, out)
+
+    stats = json.loads(out.getvalue())["answers"][0]["paths"]["stats"]
+    collected = process_queries([{"paths": {"start": "a", "end": "e"}}], graph, collect_stats=True)
+    expected = collected["answers"][0]["paths"]["stats"]
+    for name in ("nodes_expanded", "edges_relaxed", "paths", "peak_path_length"):
+        assert stats[name] == expected[name]
+    assert (stats["paths"], stats["peak_path_length"]) == (2, 5)
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson"])
+def test_a_failing_query_keeps_the_output_valid(graph, output_format):
+    queries = [{"cheapest": {"start": "a", "end": "e"}}, {"paths": {"start": "x", "end": "e"}}]
+    out = io.StringIO()
+
+    assert not write_answers(iter_answers(queries, graph, stream_paths=True), out, output_format)
+
+    # the unknown start fails before its answer is started
+    if output_format == "json":
+        document = json.loads(out.getvalue())
+        assert len(document["answers"]) == 1 and "x" in document["error"]
+    else:
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(lines) == 2 and "cheapest" in lines[0] and "x" in lines[1]["error"]
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson"])
+def test_a_failing_stream_keeps_the_output_valid(graph, output_format):
+    def failing_paths():
+        yield ['a', 'b']
+        raise RuntimeError("connection lost")
+
+    out = io.StringIO()
+
+    answers = [{"paths": {"from": "a", "to": "e", "paths": failing_paths()}}]
+    assert not write_answers(iter(answers), out, output_format)
+
+    if output_format == "json":
+        document = json.loads(out.getvalue())
+        # the failing answer is cut off where it failed
+        assert document["answers"][0]["paths"]["paths"] == [['a', 'b']] and "lost" in document["error"]
+    else:
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert lines[0]["paths"]["paths"] == [['a', 'b']] and "lost" in lines[1]["error"]
+
+
+def test_unknown_output_format(graph):
+    with pytest.raises(ValueError):
+        write_answers([], io.StringIO(), "yaml")
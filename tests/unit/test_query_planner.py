@@ -0,0 +1,41 @@
+from query_planner import plan_queries, unplanned
+
+
+def test_steps_follow_the_blocks_of_each_query():
+    queries = [{"reachable": {"start": "a", "end": "b"}, "paths": {"start": "a", "end": "b"}},
+               {"cheapest": {"start": "a", "end": "b"}}]
+
+    assert [query_type for _, query_type, _ in plan_queries(queries).steps] == ["paths", "reachable", "cheapest"]
+    assert unplanned(queries).first == [0, 1, 2] and unplanned(queries).groups == {}
+
+
+def test_duplicates_and_groups():
+    queries = [
+        {"cheapest": {"start": "a", "end": "b"}},
+        {"cheapest": {"end": "c", "start": "a"}},
+        {"cheapest": {"start": "a", "end": "b"}},
+        {"cheapest": {"start": "a", "end": "d", "algorithm": "alt"}},
+        {"cheapest": {"start": "a", "end": "d", "graph": "g1"}},
+        {"paths": {"start": "a", "end": "b"}},
+        {"paths": {"start": "a", "end": "c", "max_depth": 2}},
+        {"paths": {"start": "b", "end": "c"}},
+    ]
+
+    plan = plan_queries(queries)
+
+    assert plan.first == [0, 1, 0, 3, 4, 5, 6, 7]
+    assert plan.groups == {0: [0, 1], 5: [5, 6]}
+    assert plan.summary() == ("query plan: 8 answers, 1 copied from an identical query, "
+                              "2 cheapest queries answered by 1 shortest path trees, "
+                              "2 paths queries answered by 1 path enumerations")
+
+
+def test_streamed_paths_are_not_shared():
+    queries = [{"paths": {"start": "a", "end": "b"}}, {"paths": {"start": "a", "end": "b"}},
+               {"paths": {"start": "a", "end": "c"}}, {"reachable": {"start": "a", "end": "b"}},
+               {"reachable": {"start": "a", "end": "b"}}]
+
+    plan = plan_queries(queries, share_paths=False)
+
+    assert plan.first == [0, 1, 2, 3, 3]
+    assert plan.groups == {}
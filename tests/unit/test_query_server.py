@@ -0,0 +1,71 @@
+import asyncio
+import json
+import runpy
+import sys
+from unittest.mock import patch
+
+import networkx as nx
+import pytest
+
+import query_my_graph
+from query_my_graph import process_queries
+from query_server import answer_line, start_server
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([('a', 'b', 0.5), ('b', 'c', 10.0), ('b', 'e', 42.0), ('c', 'd', 5.0),
+                                   ('d', 'e', 0.8), ('e', 'a', 0.42)])
+    return graph
+
+
+QUERIES = [{"paths": {"start": "a", "end": "e"}}, {"cheapest": {"start": "a", "end": "e"}}]
+
+
+def test_answer_line(graph):
+    response = answer_line(json.dumps({"queries": QUERIES}), graph)
+
+    assert json.loads(response) == process_queries(QUERIES, graph)
+    assert "\n" not in response
+
+
+def test_answer_line_invalid_json(graph):
+    assert answer_line("{not json", graph) == "Invalid JSON input."
+
+
+def test_server_answers_many_clients(graph):
+    async def client(port, queries):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for query in queries:
+            writer.write(json.dumps({"queries": [query]}).encode("utf-8") + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    async def run():
+        server = await start_server(graph, host="127.0.0.1", port=0, unix_path=None)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await asyncio.gather(*(client(port, QUERIES) for _ in range(5)))
+
+    for responses in asyncio.run(run()):
+        assert responses == [process_queries([query], graph) for query in QUERIES]
+
+
+def test_serve_from_the_command_line(graph):
+    served = []
+
+    async def serve(graphs):
+        served.append(answer_line(json.dumps({"queries": QUERIES}), graphs))
+
+    # python query_my_graph.py --serve, the server gets the GraphCache of __main__
+    with patch('query_my_graph.create_graph_from_database', return_value=graph), \
+            patch('query_my_graph.graph_ids', return_value={'g0'}), patch('query_server.serve', serve), patch.object(sys, 'argv', ['query_my_graph.py', '--serve']):
+        runpy.run_path(query_my_graph.__file__, run_name='__main__')
+
+    assert json.loads(served[0]) == process_queries(QUERIES, graph)
+
@@ -0,0 +1,51 @@
+import networkx as nx
+import pytest
+
+from csr_graph import CSRGraph
+from query_metrics import QueryStats
+from reachability import ReachabilityIndex
+
+
+@pytest.mark.parametrize("max_bytes", [None, 1 << 20])
+def test_reachable_matches_networkx_random(max_bytes):
+    for seed in range(30):
+        graph = nx.gnp_random_graph(25, 0.06, directed=True, seed=seed)
+        index = ReachabilityIndex.build(graph, max_bytes)
+        for start in graph:
+            for end in graph:
+                assert index.reachable(start, end) == nx.has_path(graph, start, end)
+
+
+def test_closure_within_max_bytes():
+    graph = nx.path_graph(100, create_using=nx.DiGraph)
+
+    assert ReachabilityIndex.build(graph, 1 << 20).closure is not None
+    assert ReachabilityIndex.build(graph, 100).closure is None
+    assert ReachabilityIndex.build(graph, 100).reachable(0, 99)
+
+
+def test_components_and_unknown_nodes():
+    graph = nx.DiGraph([('a', 'b'), ('b', 'a'), ('b', 'c'), ('d', 'd')])
+    index = ReachabilityIndex.build(graph)
+
+    assert index.reachable('b', 'a') and index.reachable('a', 'c')
+    assert not index.reachable('c', 'a')
+    assert index.reachable('d', 'd')
+    assert not index.reachable('a', 'x') and not index.reachable('x', 'x')
+
+
+def test_csr_graph():
+    edges = [('a', 'b', 1.0), ('b', 'c', 1.0), ('d', 'c', 1.0)]
+    index = ReachabilityIndex.build(CSRGraph.from_edges(['a', 'b', 'c', 'd'], edges))
+
+    assert index.reachable('a', 'c')
+    assert not index.reachable('a', 'd')
+
+
+def test_search_counts_components():
+    # diamonds chained, so the intervals of 0 contain every later component
+    graph = nx.DiGraph([(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (3, 5), (4, 6), (5, 6)])
+    stats = QueryStats()
+
+    assert ReachabilityIndex.build(graph).reachable(0, 6, stats)
+    assert stats.nodes_expanded > 0
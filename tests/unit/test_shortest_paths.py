@@ -0,0 +1,213 @@
+import networkx as nx
+import pytest
+
+from contraction_hierarchy import ContractionHierarchy
+from csr_graph import CSRGraph
+from query_metrics import QueryStats
+from shortest_paths import (
+    ALGORITHMS,
+    bidirectional_dijkstra,
+    cheapest_path,
+    dijkstra_path,
+    k_cheapest_paths,
+    single_source_dijkstra,
+    LandmarkIndex,
+    ShortestPathTreeCache,
+)
+
+
+@pytest.fixture
+def graph():
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([('a', 'b', 0.5), ('b', 'c', 10.0), ('b', 'e', 42.0), ('c', 'd', 5.0),
+                                   ('d', 'e', 0.8), ('e', 'a', 0.42), ('e', 'f', 1.0), ('g', 'g', 0.5)])
+    return graph
+
+
+def test_single_source_dijkstra(graph):
+    distances, predecessors = single_source_dijkstra(graph, 'a')
+
+    assert distances == nx.single_source_dijkstra_path_length(graph, 'a')
+    assert predecessors['e'] == 'd'
+    assert predecessors['a'] is None
+
+
+def test_dijkstra_path_errors(graph):
+    with pytest.raises(nx.NodeNotFound):
+        dijkstra_path(graph, 'z', 'a')
+    with pytest.raises(nx.NetworkXNoPath):
+        dijkstra_path(graph, 'a', 'g')
+
+
+def test_cache_paths_match_dijkstra(graph):
+    cache = ShortestPathTreeCache(maxsize=4)
+    for start in graph:
+        for end in graph:
+            if nx.has_path(graph, start, end):
+                assert cache.path(graph, start, end) == nx.dijkstra_path(graph, start, end)
+            else:
+                with pytest.raises(nx.NetworkXNoPath):
+                    cache.path(graph, start, end)
+
+
+def test_cache_hits_and_misses(graph):
+    cache = ShortestPathTreeCache(maxsize=2)
+
+    cache.path(graph, 'a', 'e')
+    cache.path(graph, 'a', 'f')
+    cache.path(graph, 'b', 'e')
+
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 2, "maxsize": 2}
+
+
+def test_cache_lru_eviction(graph):
+    cache = ShortestPathTreeCache(maxsize=2)
+
+    cache.tree(graph, 'a')
+    cache.tree(graph, 'b')
+    cache.tree(graph, 'a')  # 'b' is now the least recently used tree
+    cache.tree(graph, 'c')
+    cache.tree(graph, 'a')
+    cache.tree(graph, 'b')
+
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_cache_invalidated_by_another_graph(graph):
+    cache = ShortestPathTreeCache()
+    assert cache.path(graph, 'a', 'e') == ['a', 'b', 'c', 'd', 'e']
+
+    reloaded = graph.copy()
+    reloaded.add_edge('a', 'e', weight=1.0)
+
+    assert cache.path(reloaded, 'a', 'e') == ['a', 'e']
+    assert cache.misses == 2
+
+
+def test_cache_clear(graph):
+    cache = ShortestPathTreeCache()
+    cache.tree(graph, 'a')
+    cache.clear()
+
+    assert len(cache) == 0
+    cache.tree(graph, 'a')
+    assert cache.misses == 2
+
+
+def path_cost(graph, path):
+    return sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+
+
+@pytest.fixture
+def random_graph():
+    graph = nx.gnm_random_graph(80, 400, seed=11, directed=True)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = (u * 7 + v * 13) % 10 + 0.5
+    return graph
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_cheapest_path_costs_match_networkx(random_graph, algorithm):
+    random_graph.graph["landmarks"] = LandmarkIndex.build(random_graph, 4)
+    random_graph.graph["ch"] = ContractionHierarchy.build(
+        random_graph.nodes(), ((u, v, d['weight']) for u, v, d in random_graph.edges(data=True)))
+    lengths = dict(nx.all_pairs_dijkstra_path_length(random_graph))
+
+    for start in range(0, 80, 9):
+        for end in random_graph:
+            path, settled = cheapest_path(random_graph, start, end, algorithm)
+            if end in lengths[start]:
+                assert path[0] == start and path[-1] == end
+                assert path_cost(random_graph, path) == pytest.approx(lengths[start][end])
+            else:
+                assert path is None
+            assert settled > 0
+
+
+def test_alt_without_landmarks_is_dijkstra(graph):
+    assert cheapest_path(graph, 'a', 'e', "alt")[0] == ['a', 'b', 'c', 'd', 'e']
+    assert cheapest_path(graph, 'a', 'g', "alt")[0] is None
+
+
+def test_bidirectional_dijkstra_settles_fewer_nodes():
+    graph = nx.grid_2d_graph(30, 30).to_directed()
+    nx.set_edge_attributes(graph, 1.0, 'weight')
+
+    _, dijkstra_settled = cheapest_path(graph, (0, 0), (5, 5), "dijkstra")
+    path, settled = bidirectional_dijkstra(graph, (0, 0), (5, 5))
+
+    assert len(path) == 11
+    assert settled < dijkstra_settled
+
+
+def test_alt_settles_fewer_nodes():
+    graph = nx.grid_2d_graph(30, 30).to_directed()
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = 1.0 + (hash((u, v)) % 7) / 10
+    graph.graph["landmarks"] = LandmarkIndex.build(graph, 4)
+
+    dijkstra, dijkstra_settled = cheapest_path(graph, (0, 0), (12, 20), "dijkstra")
+    path, settled = cheapest_path(graph, (0, 0), (12, 20), "alt")
+
+    assert path_cost(graph, path) == pytest.approx(path_cost(graph, dijkstra))
+    assert settled < dijkstra_settled
+
+
+def test_landmark_index_covers_unreachable_parts():
+    graph = nx.DiGraph([('a', 'b'), ('c', 'd')])
+    nx.set_edge_attributes(graph, 1.0, 'weight')
+
+    index = LandmarkIndex.build(graph, 2)
+
+    assert index.landmarks == ['a', 'c']
+
+
+def test_cheapest_path_unknown_algorithm(graph):
+    with pytest.raises(ValueError):
+        cheapest_path(graph, 'a', 'e', "bellman-ford")
+
+
+def test_k_cheapest_paths_match_networkx(random_graph):
+    csr_graph = CSRGraph.from_edges(random_graph.nodes(),
+                                    ((u, v, d['weight']) for u, v, d in random_graph.edges(data=True)))
+    for start, end in ((0, 40), (9, 3), (27, 71), (55, 55)):
+        expected = [path_cost(random_graph, path) for path, _ in
+                    zip(nx.shortest_simple_paths(random_graph, start, end, 'weight'), range(12))]
+        for graph in (random_graph, csr_graph):
+            found = k_cheapest_paths(graph, start, end, 12)
+
+            assert [cost for cost, _ in found] == pytest.approx(expected)
+            assert len({tuple(path) for _, path in found}) == len(found)
+            for cost, path in found:
+                assert path[0] == start and path[-1] == end and len(set(path)) == len(path)
+                assert path_cost(random_graph, path) == pytest.approx(cost)
+
+
+def test_k_cheapest_paths_zero_cost_edges():
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([('a', 'b', 0), ('b', 'a', 0), ('a', 'c', 1), ('b', 'c', 1), ('c', 'b', 0),
+                                   ('c', 'd', 0), ('b', 'd', 2)])
+
+    assert k_cheapest_paths(graph, 'a', 'd', 10) == [
+        (1, ['a', 'c', 'd']), (1, ['a', 'b', 'c', 'd']), (2, ['a', 'b', 'd']), (3, ['a', 'c', 'b', 'd'])]
+
+
+def test_k_cheapest_paths_fewer_than_k(graph):
+    assert k_cheapest_paths(graph, 'a', 'e', 5) == [(16.3, ['a', 'b', 'c', 'd', 'e']), (42.5, ['a', 'b', 'e'])]
+    assert k_cheapest_paths(graph, 'a', 'a', 3) == [(0, ['a'])]
+    assert k_cheapest_paths(graph, 'a', 'g', 3) == []
+    assert k_cheapest_paths(graph, 'a', 'e', 0) == []
+    with pytest.raises(nx.NodeNotFound):
+        k_cheapest_paths(graph, 'z', 'e', 1)
+
+
+def test_k_cheapest_paths_reuse_the_reverse_tree(graph):
+    cache = ShortestPathTreeCache(maxsize=4)
+    stats = QueryStats()
+
+    first = k_cheapest_paths(graph, 'a', 'e', 2, cache, stats)
+    expanded = stats.nodes_expanded
+    assert k_cheapest_paths(graph, 'b', 'e', 2, cache, stats)[0] == (first[0][0] - 0.5, first[0][1][1:])
+
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert 0 < stats.nodes_expanded - expanded < expanded
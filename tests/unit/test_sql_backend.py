@@ -0,0 +1,152 @@
+import pytest
+from threading import Thread
+from unittest.mock import MagicMock, Mock, patch
+import networkx as nx
+
+import sql_backend
+from sql_backend import SqlQueryBackend
+from query_my_graph import process_queries
+
+
+@pytest.fixture
+def backend():
+    with patch('db_client.create_engine', MagicMock()):
+        backend = SqlQueryBackend('dummy_dsn')
+    engine = backend.db_client.engine
+    engine.begin.return_value = engine.connect.return_value
+    return backend
+
+
+def connection(backend):
+    """The connection every engine.connect() and engine.begin() of the backend hands out."""
+    return backend.db_client.engine.connect.return_value.__enter__.return_value
+
+
+def answer_with(backend, results):
+    """Let the connection return results[sql] for each of the queries of sql_backend, statements
+    without results change no rows."""
+    def execute(statement, parameters=None):
+        rows = results.get(statement.text, [])
+        return Mock(all=Mock(return_value=rows), first=Mock(return_value=rows[0] if rows else None),
+                    rowcount=len(rows))
+    connection(backend).execute.side_effect = execute
+
+
+def test_paths_unknown_start(backend):
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('e',)]})
+
+    with pytest.raises(nx.NodeNotFound):
+        backend.find_all_paths('x', 'e')
+
+
+def test_paths_unknown_end(backend):
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('a',)]})
+
+    assert backend.find_all_paths('a', 'x') == []
+
+
+def test_paths(backend):
+    answer_with(backend, {
+        sql_backend.NODES_PRESENT: [('a',), ('e',)],
+        sql_backend.PATHS: [(['a', 'b', 'c', 'd', 'e'],), (['a', 'b', 'e'],)],
+    })
+
+    assert backend.find_all_paths('a', 'e', max_paths=2, max_depth=4) == [['a', 'b', 'c', 'd', 'e'], ['a', 'b', 'e']]
+    parameters = connection(backend).execute.call_args[0][1]
+    assert parameters['max_paths'] == 2
+    assert parameters['max_depth'] == 4
+    assert parameters['graph'] == 'g0'
+
+
+def test_cheapest_breaks_ties_like_dijkstra(backend):
+    # two paths of cost 2 from a to d, as returned in edge id order
+    edges = [('a', 'c', 1.0), ('a', 'b', 1.0), ('b', 'd', 1.0), ('c', 'd', 1.0)]
+    answer_with(backend, {
+        sql_backend.NODES_PRESENT: [('a',), ('d',)],
+        sql_backend.END_COST: [(2.0,)],
+        sql_backend.CHEAPEST_EDGES: edges,
+    })
+
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from(edges)
+    assert backend.find_cheapest_path('a', 'd') == nx.dijkstra_path(graph, 'a', 'd')
+    parameters = connection(backend).execute.call_args[0][1]
+    assert parameters['max_cost'] == 2.0
+
+
+def test_cheapest_without_path(backend):
+    answer_with(backend, {
+        sql_backend.NODES_PRESENT: [('a',), ('d',)],
+    })
+
+    assert backend.find_cheapest_path('a', 'd') is None
+    assert backend.find_cheapest_path('a', 'a') == ['a']
+
+
+def test_cheapest_cost_relaxes_until_no_cost_changes(backend):
+    changed = iter([3, 1, 0])
+    answer_with(backend, {sql_backend.END_COST: [(4.5,)]})
+    execute = connection(backend).execute.side_effect
+
+    def relax(statement, parameters=None):
+        if statement.text == sql_backend.RELAX:
+            return Mock(rowcount=next(changed))
+        return execute(statement, parameters)
+    connection(backend).execute.side_effect = relax
+
+    assert backend._cheapest_cost('a', 'd') == 4.5
+    rounds = [call[0][1]['round'] for call in connection(backend).execute.call_args_list
+              if call[0][0].text == sql_backend.RELAX]
+    assert rounds == [0, 1, 2]
+
+
+def test_reachable(backend):
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('a',), ('e',)], sql_backend.REACHABLE: [(True,)]})
+    assert backend.reachable('a', 'e')
+
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('a',)]})
+    assert not backend.reachable('a', 'x')
+
+
+def test_cheapest_paths(backend):
+    answer_with(backend, {
+        sql_backend.NODES_PRESENT: [('a',), ('e',)],
+        sql_backend.REACHING_EDGES: [('a', 'b', 1.0), ('b', 'e', 1.0), ('a', 'e', 3.0), ('a', 'e', 2.5)],
+    })
+    assert backend.find_cheapest_paths('a', 'e', 3) == [(2.0, ['a', 'b', 'e']), (2.5, ['a', 'e'])]
+
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('a',), ('e',)], sql_backend.REACHING_EDGES: []})
+    assert backend.find_cheapest_paths('a', 'e', 3) == []
+
+
+def test_process_queries_with_sql_backend(backend):
+    backend.find_all_paths = Mock(return_value=[['a', 'b']])
+    backend.find_cheapest_path = Mock(return_value=None)
+    queries = [
+        {"paths": {"start": "a", "end": "b", "max_depth": 3}},
+        {"cheapest": {"start": "a", "end": "c"}},
+    ]
+
+    result = process_queries(queries, backend)
+
+    assert result == {"answers": [
+        {"paths": {"from": "a", "to": "b", "paths": [['a', 'b']]}},
+        {"cheapest": {"from": "a", "to": "c", "path": False}},
+    ]}
+    backend.find_all_paths.assert_called_once_with('a', 'b', None, 3)
+
+
+def test_queries_from_threads_use_their_own_connections(backend):
+    answer_with(backend, {sql_backend.NODES_PRESENT: [('a',), ('e',)], sql_backend.REACHABLE: [(True,)]})
+    answers = []
+    threads = [Thread(target=lambda: answers.append(backend.reachable('a', 'e'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert answers == [True] * 4
+    # a connection per statement, the session of the DatabaseClient isn't shared between threads
+    assert backend.db_client.engine.connect.call_count == 8
+    backend.close()
+    backend.db_client.engine.dispose.assert_called_once()
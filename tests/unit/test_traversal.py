@@ -0,0 +1,90 @@
+import networkx as nx
+import pytest
+
+from traversal import iter_dfs_paths, iter_bfs_paths, iter_dfs_paths_to_any
+
+
+def copying_dfs_stack(graph, start, end):
+    paths = []
+    stack = [(start, [start])]
+    while stack:
+        current_node, path = stack.pop()
+        if current_node == end:
+            paths.append(path)
+        else:
+            for neighbor in graph.successors(current_node):
+                if neighbor not in path:
+                    stack.append((neighbor, path + [neighbor]))
+    return paths
+
+
+def copying_bfs(graph, start, end):
+    paths = []
+    queue = [(start, [start])]
+    while queue:
+        current_node, path = queue.pop(0)
+        if current_node == end:
+            paths.append(path)
+        else:
+            for neighbor in graph.successors(current_node):
+                if neighbor not in path:
+                    queue.append((neighbor, path + [neighbor]))
+    return paths
+
+
+@pytest.fixture(params=[1, 2, 3])
+def graph(request):
+    return nx.gnm_random_graph(10, 30, seed=request.param, directed=True)
+
+
+def test_dfs_order_matches_recursive_dfs(graph):
+    for start in graph:
+        for end in graph:
+            assert list(iter_dfs_paths(graph, start, end)) == list(nx.all_simple_paths(graph, start, end))
+
+
+def test_reverse_dfs_order_matches_stack_dfs(graph):
+    for start in graph:
+        for end in graph:
+            assert list(iter_dfs_paths(graph, start, end, reverse=True)) == copying_dfs_stack(graph, start, end)
+
+
+def test_bfs_order_matches_queue_bfs(graph):
+    for start in graph:
+        for end in graph:
+            assert list(iter_bfs_paths(graph, start, end)) == copying_bfs(graph, start, end)
+
+
+def test_bfs_with_shared_bits(graph, monkeypatch):
+    # three bits for ten nodes, most on-path checks collide and follow the parents
+    monkeypatch.setattr("traversal._BFS_BITS", 3)
+    for start in graph:
+        for end in graph:
+            assert list(iter_bfs_paths(graph, start, end)) == copying_bfs(graph, start, end)
+
+
+def test_dfs_allowed_and_max_depth():
+    graph = nx.DiGraph([(0, 1), (1, 2), (0, 3), (3, 2), (0, 2)])
+
+    assert list(iter_dfs_paths(graph, 0, 2, allowed={0, 1, 2})) == [[0, 1, 2], [0, 2]]
+    assert list(iter_dfs_paths(graph, 0, 2, max_depth=1)) == [[0, 2]]
+
+
+def test_long_paths():
+    graph = nx.path_graph(200, create_using=nx.DiGraph)
+
+    assert list(iter_dfs_paths(graph, 0, 199)) == [list(range(200))]
+    assert list(iter_bfs_paths(graph, 0, 199)) == [list(range(200))]
+
+
+def test_dfs_to_any_keeps_the_order_of_each_end():
+    graph = nx.gnm_random_graph(10, 35, seed=5, directed=True)
+    ends = {2, 5, 7}
+
+    paths = list(iter_dfs_paths_to_any(graph, 0, ends, through=ends))
+
+    for end in ends:
+        assert [path for path in paths if path[-1] == end] == list(iter_dfs_paths(graph, 0, end))
+    # without through an end is never passed
+    assert all(not ends & set(path[:-1]) for path in iter_dfs_paths_to_any(graph, 0, ends))
+
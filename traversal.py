@@ -0,0 +1,126 @@
+from collections import deque
+
+from query_metrics import counting
+
+# Width of the on-path bitmaps of iter_bfs_paths, nodes discovered later share the bits
+_BFS_BITS = 256
+
+
+def iter_dfs_paths(graph, start, end, reverse=False, allowed=None, max_depth=None, stats=None):
+    """
+    Yield the simple paths from start to end depth-first.
+
+    A single path list is extended and truncated while backtracking and an on-path set
+    answers the "already on the path" check in O(1), so a path is only copied when it is
+    yielded. Successors are visited in graph order, the same as a recursive DFS, or in
+    reverse graph order with reverse=True, the order of a DFS that pushes whole paths on
+    a stack. Nodes outside allowed are never entered, max_depth caps the edges of a path.
+    The nodes expanded and their edges are counted in stats when a QueryStats is given.
+    """
+    if start == end:
+        yield [start]
+        return
+
+    def successors(node):
+        return reversed(list(graph.successors(node))) if reverse else graph.successors(node)
+    if stats is not None:
+        successors = counting(successors, stats)
+
+    path = [start]
+    on_path = {start}
+    stack = [successors(start)]
+    while stack:
+        for neighbor in stack[-1]:
+            if neighbor in on_path or (allowed is not None and neighbor not in allowed):
+                continue
+            if neighbor == end:
+                if max_depth is None or len(path) <= max_depth:
+                    yield path + [end]
+            elif max_depth is None or len(path) < max_depth:
+                path.append(neighbor)
+                on_path.add(neighbor)
+                stack.append(successors(neighbor))
+                break
+        else:
+            stack.pop()
+            on_path.discard(path.pop())
+
+
+def iter_dfs_paths_to_any(graph, start, ends, through=(), allowed=None, max_depth=None, stats=None):
+    """
+    Yield the simple paths from start to any node of ends depth-first, the paths to each end in the
+    order iter_dfs_paths yields them. An end is the last node of a path unless it is in through,
+    paths then also go on through it towards the other ends. Nodes outside allowed are never
+    entered, max_depth caps the edges of a path.
+    """
+    if start in ends:
+        yield [start]
+        if start not in through:
+            return
+
+    successors = graph.successors if stats is None else counting(graph.successors, stats)
+    path = [start]
+    on_path = {start}
+    stack = [successors(start)]
+    while stack:
+        for neighbor in stack[-1]:
+            if neighbor in on_path or (allowed is not None and neighbor not in allowed):
+                continue
+            if neighbor in ends:
+                if max_depth is None or len(path) <= max_depth:
+                    yield path + [neighbor]
+                if neighbor not in through:
+                    continue
+            if max_depth is None or len(path) < max_depth:
+                path.append(neighbor)
+                on_path.add(neighbor)
+                stack.append(successors(neighbor))
+                break
+        else:
+            stack.pop()
+            on_path.discard(path.pop())
+
+
+def iter_bfs_paths(graph, start, end, stats=None):
+    """
+    Yield the simple paths from start to end breadth-first, shortest (in edges) first.
+
+    Queue entries are (node, parent entry, on-path bitmap) so extending a path allocates
+    one tuple instead of copying the path. Nodes get bit (discovery order modulo _BFS_BITS)
+    in the bitmap, so it stays bounded however many nodes were discovered; a neighbor whose
+    bit is set is only skipped once following the parents finds it on the path.
+    Paths are only materialised by following the parents once end is reached.
+    The nodes expanded and their edges are counted in stats when a QueryStats is given.
+    """
+    successors = graph.successors if stats is None else counting(graph.successors, stats)
+    bits = {start: 1}
+    queue = deque([(start, None, 1)])
+    while queue:
+        entry = queue.popleft()
+        node, _, on_path = entry
+        if node == end:
+            yield _unwind(entry)
+            continue
+
+        for neighbor in successors(node):
+            bit = bits.get(neighbor)
+            if bit is None:
+                bit = bits[neighbor] = 1 << (len(bits) % _BFS_BITS)
+            if not on_path & bit or not _on_path(entry, neighbor):
+                queue.append((neighbor, entry, on_path | bit))
+
+
+def _on_path(entry, node):
+    while entry is not None:
+        if entry[0] == node:
+            return True
+        entry = entry[1]
+    return False
+
+def _unwind(entry):
+    path = []
+    while entry is not None:
+        node, entry, _ = entry
+        path.append(node)
+    path.reverse()
+    return path